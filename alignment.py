@@ -0,0 +1,230 @@
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from feature_store import default_store
+
+# Step codes of the traceback matrix, in librosa's tie-breaking order
+STEP_DIAGONAL, STEP_LEFT, STEP_UP, STEP_START = 0, 1, 2, 3
+
+
+def _unit_columns(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=0)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def windowed_dtw(X, Y, subseq=False, band_rad=None):
+    """
+    DTW with cosine cost that never builds the accumulated cost matrix.
+
+    The recursion runs along anti-diagonals, so only the last three
+    diagonals of the accumulated cost are kept (float32) and each diagonal is
+    computed with vector operations. Costs are computed on the fly from the
+    feature columns. Backtracking uses an int8 matrix of step codes, an
+    eighth of the size of librosa's float64 `D`.
+
+    It solves the same problem as librosa.sequence.dtw(X, Y, metric='cosine',
+    subseq=subseq) with global_constraints=True when band_rad is given: the
+    band is librosa's fill_off_diagonal band, and for subsequence DTW with
+    N > M, Y is matched inside X as librosa does. Paths and costs are equal
+    except where two steps tie within float32 rounding of the accumulated
+    cost, where the paths may take different but equally cheap steps.
+
+    Parameters:
+    -----------
+    X : np.ndarray
+        Query features (d x N), e.g. the chroma of song 1's outro
+    Y : np.ndarray
+        Reference features (d x M), e.g. the chroma of song 2's intro
+    subseq : bool
+        Subsequence DTW: the shorter sequence may start and end anywhere in the longer one
+    band_rad : float, optional
+        Band radius as a fraction of the shorter sequence, as in librosa (None: no band)
+
+    Returns:
+    --------
+    tuple
+        (wp, cost): warping path as an (L x 2) array of (x_frame, y_frame)
+        pairs in increasing order, and the accumulated cost at its end
+    """
+    n, m = np.shape(X)[1], np.shape(Y)[1]
+    if n == 0 or m == 0:
+        raise ValueError("Cannot align an empty feature sequence.")
+    if subseq and n > m:
+        # Y is the subsequence, like librosa's transposed cost matrix
+        wp, cost = windowed_dtw(Y, X, subseq=True, band_rad=band_rad)
+        return wp[:, ::-1].copy(), cost
+    X = _unit_columns(X)
+    Y = _unit_columns(Y)
+
+    steps = np.full((n, m), STEP_START, dtype=np.int8)
+    inf = np.float32(np.inf)
+
+    # Diagonals are indexed by row + 1, with an infinite border at index 0
+    previous_2 = np.full(n + 1, inf, dtype=np.float32)
+    previous_1 = np.full(n + 1, inf, dtype=np.float32)
+    last_row = np.full(m, inf, dtype=np.float32)
+    rows_all = np.arange(n)
+    if band_rad is not None:
+        # librosa.util.fill_off_diagonal: the band widens by |N - M| towards the longer axis
+        radius = int(np.round(band_rad * min(n, m)))
+        offset = abs(n - m)
+        low, high = (-radius, radius + offset) if n < m else (-radius - offset, radius)
+
+    for diagonal in range(n + m - 1):
+        rows = rows_all[max(0, diagonal - m + 1):min(diagonal, n - 1) + 1]
+        cols = diagonal - rows
+        if band_rad is not None:
+            inside = (cols - rows > low) & (cols - rows < high)
+            rows, cols = rows[inside], cols[inside]
+
+        current = np.full(n + 1, inf, dtype=np.float32)
+        if len(rows):
+            cost = 1.0 - np.einsum('ij,ij->j', X[:, rows], Y[:, cols])
+            options = np.stack([previous_2[rows], previous_1[rows + 1], previous_1[rows]])
+            best = np.argmin(options, axis=0)
+            accumulated = options[best, np.arange(len(rows))]
+
+            # Start cells: (0, 0), or anywhere in the first row for subsequence DTW
+            start = (rows == 0) & ((cols == 0) | subseq)
+            accumulated[start] = 0.0
+            best[start] = STEP_START
+
+            current[rows + 1] = cost + accumulated
+            steps[rows, cols] = best
+            if rows[-1] == n - 1:
+                last_row[cols[-1]] = current[n]
+
+        previous_2, previous_1 = previous_1, current
+
+    end = int(np.argmin(last_row)) if subseq else m - 1
+    if not np.isfinite(last_row[end]):
+        raise ValueError("No warping path fits inside the band; increase band_rad.")
+
+    # Backtrack from the end cell
+    path = []
+    i, j = n - 1, end
+    while True:
+        path.append((i, j))
+        step = steps[i, j]
+        if step == STEP_START:
+            break
+        if step == STEP_DIAGONAL:
+            i, j = i - 1, j - 1
+        elif step == STEP_UP:
+            i -= 1
+        else:
+            j -= 1
+    return np.array(path[::-1], dtype=int), float(last_row[end])
+
+
+def align_transition(chroma_1, chroma_2, outro_frames, intro_frames=None, subseq=True, band_rad=None):
+    """
+    Align the outro of song 1 with the intro of song 2.
+
+    Parameters:
+    -----------
+    chroma_1 : np.ndarray
+        Chroma of song 1 (12 x N), or just its outro
+    chroma_2 : np.ndarray
+        Chroma of song 2 (12 x M), or just its intro
+    outro_frames : int
+        Number of frames at the end of song 1 to align
+    intro_frames : int, optional
+        Number of frames at the start of song 2 to search (defaults to 2 * outro_frames)
+    subseq : bool
+        Let the outro match anywhere inside the intro window
+    band_rad : float, optional
+        Band radius as a fraction of the shorter window, see windowed_dtw
+
+    Returns:
+    --------
+    dict
+        'wp': path in frames of the full songs ((frame_1, frame_2) pairs, increasing),
+        'cost': accumulated cost, 'mean_cost': average cosine distance per step (0 is perfect)
+    """
+    intro_frames = 2 * outro_frames if intro_frames is None else intro_frames
+    offset_1 = max(chroma_1.shape[1] - outro_frames, 0)
+    outro = chroma_1[:, offset_1:]
+    intro = chroma_2[:, :intro_frames]
+
+    wp, cost = windowed_dtw(outro, intro, subseq=subseq, band_rad=band_rad)
+    wp[:, 0] += offset_1
+    return {"wp": wp, "cost": cost, "mean_cost": cost / len(wp)}
+
+
+def path_mean_cost(X, Y, wp):
+    """
+    Average cosine distance along a warping path (lower means a closer match).
+    """
+    X = _unit_columns(X)
+    Y = _unit_columns(Y)
+    return float(np.mean(1.0 - np.einsum('ij,ij->j', X[:, wp[:, 0]], Y[:, wp[:, 1]])))
+
+
+def compare_with_full_dtw(chroma_1, chroma_2, outro_frames, intro_frames=None, subseq=True, band_rad=None):
+    """
+    Time windowed alignment against librosa's full-song DTW and compare their quality.
+
+    Parameters:
+    -----------
+    chroma_1, chroma_2 : np.ndarray
+        Full-song chroma of both songs
+    outro_frames, intro_frames, subseq, band_rad
+        See align_transition
+
+    Returns:
+    --------
+    dict
+        Timings, speedup, size of the cost matrices and the mean per-step
+        cost of both paths (the full path is measured over the whole songs)
+    """
+    # Compile librosa's DTW kernel first so its JIT time isn't counted
+    librosa.sequence.dtw(X=chroma_1[:, :2], Y=chroma_2[:, :2], metric='cosine')
+
+    start = time.perf_counter()
+    D, wp_full = librosa.sequence.dtw(X=chroma_1, Y=chroma_2, metric='cosine')
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = align_transition(chroma_1, chroma_2, outro_frames, intro_frames, subseq, band_rad)
+    window_seconds = time.perf_counter() - start
+
+    intro_frames = 2 * outro_frames if intro_frames is None else intro_frames
+    window_cells = min(outro_frames, chroma_1.shape[1]) * min(intro_frames, chroma_2.shape[1])
+    return {
+        "full_seconds": full_seconds,
+        "window_seconds": window_seconds,
+        "speedup": full_seconds / window_seconds if window_seconds > 0 else float("inf"),
+        "full_matrix_bytes": D.nbytes,
+        "window_matrix_bytes": window_cells,  # int8 step codes
+        "full_mean_cost": path_mean_cost(chroma_1, chroma_2, wp_full[::-1]),
+        "window_mean_cost": result["mean_cost"],
+        "wp": result["wp"],
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python alignment.py first.mp3 second.mp3 [window_seconds]")
+        sys.exit(1)
+    window_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 30.0
+    hop_length = 1024
+
+    fs = 22050
+    x_1_chroma = default_store.get(sys.argv[1], "chroma", sr=fs, hop_length=hop_length)
+    x_2_chroma = default_store.get(sys.argv[2], "chroma", sr=fs, hop_length=hop_length)
+
+    frames = int(librosa.time_to_frames(window_seconds, sr=fs, hop_length=hop_length))
+    report = compare_with_full_dtw(x_1_chroma, x_2_chroma, frames)
+    print(f"Full DTW:     {report['full_seconds']:.3f}s, D = {report['full_matrix_bytes'] / 1e6:.1f} MB, "
+          f"mean cost {report['full_mean_cost']:.4f}")
+    print(f"Windowed DTW: {report['window_seconds']:.3f}s, steps = {report['window_matrix_bytes'] / 1e6:.1f} MB, "
+          f"mean cost {report['window_mean_cost']:.4f}")
+    print(f"Speedup: {report['speedup']:.1f}x")
+    entry_1, entry_2 = librosa.frames_to_time(report["wp"][0], sr=fs, hop_length=hop_length)
+    print(f"Outro at {entry_1:.2f}s in song 1 lines up with {entry_2:.2f}s in song 2")
@@ -0,0 +1,99 @@
+import os
+import threading
+
+import librosa as lb
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Effect name -> sample file, relative to the repository
+EFFECTS = {
+    "scratch": "disc.mp3",
+}
+
+
+class AssetBank:
+    """
+    Decode effect samples once and hand out cached, read-only copies.
+
+    Each sample is decoded at its native rate on first use. Resampled
+    versions are created on demand for every requested rate and memoised, so
+    rendering many transitions never decodes or resamples the same sample
+    twice. Returned arrays are read-only views; copy them before editing.
+    """
+
+    def __init__(self, assets=None, base_dir=REPO_DIR):
+        self.assets = dict(EFFECTS if assets is None else assets)
+        self.base_dir = base_dir
+        self._cache = {}
+        self._lock = threading.RLock()  # _load of a resampled entry loads the native one under the lock
+
+    def path(self, name):
+        """
+        Path of the sample file of an effect.
+        """
+        try:
+            return os.path.join(self.base_dir, self.assets[name])
+        except KeyError:
+            raise ValueError(f"Unknown effect '{name}', expected one of {sorted(self.assets)}") from None
+
+    def _load(self, name, sr):
+        key = (name, sr)
+        if key in self._cache:
+            return self._cache[key]
+        with self._lock:
+            if key not in self._cache:
+                if sr is None:
+                    y, native_sr = lb.load(self.path(name), sr=None)
+                else:
+                    native, native_sr = self._load(name, None)
+                    y = native if sr == native_sr else lb.resample(native, orig_sr=native_sr, target_sr=sr)
+                y = np.ascontiguousarray(y, dtype=np.float32)
+                y.setflags(write=False)
+                self._cache[key] = (y, native_sr if sr is None else sr)
+        return self._cache[key]
+
+    def native_rate(self, name):
+        """
+        Native sampling rate of an effect sample.
+        """
+        return self._load(name, None)[1]
+
+    def get(self, name, sr=None, duration=None):
+        """
+        Get an effect sample.
+
+        Parameters:
+        -----------
+        name : str
+            Effect name (e.g. 'scratch')
+        sr : int, optional
+            Sampling rate to resample to (None keeps the native rate)
+        duration : float, optional
+            Only return the first `duration` seconds
+
+        Returns:
+        --------
+        np.ndarray
+            Read-only mono float32 view of the sample
+        """
+        y, rate = self._load(name, sr)
+        return y if duration is None else y[:int(duration * rate)]
+
+    def clear(self):
+        """
+        Drop every decoded sample.
+        """
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared bank used by the transition engine
+default_bank = AssetBank()
+
+
+def get_effect(name, sr=None, duration=None):
+    """
+    Get an effect sample from the shared asset bank, see AssetBank.get.
+    """
+    return default_bank.get(name, sr=sr, duration=duration)
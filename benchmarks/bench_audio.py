@@ -0,0 +1,482 @@
+"""
+Benchmarks for the audio pipeline.
+
+Each stage runs on deterministic synthetic audio in a fresh process, so the
+peak RSS it reports belongs to that stage alone. Results are written as JSON
+and compared against a stored baseline.
+
+Usage:
+    python benchmarks/bench_audio.py --durations 30 120
+    python benchmarks/bench_audio.py --stages analyze_song reverb_tail --update-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from queue import Empty
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "spotifyAPI"))
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, "benchmarks", "results.json")
+SAMPLE_RATE = 22050
+
+# Seconds between checks that a stage process is still alive
+POLL_INTERVAL = 1.0
+
+
+def synth_audio(duration, sr=SAMPLE_RATE, tempo=120.0, seed=0):
+    """
+    Generate a deterministic, music-like test signal.
+
+    Parameters:
+    -----------
+    duration : float
+        Length in seconds
+    sr : int
+        Sampling rate
+    tempo : float
+        Tempo of the kick pattern in BPM
+    seed : int
+        Seed for the noise and the chord sequence
+
+    Returns:
+    --------
+    np.ndarray
+        Mono float32 signal in [-1, 1]
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    bar = 4 * 60.0 / tempo
+    roots = 220.0 * 2 ** (rng.integers(0, 12, size=int(duration / bar) + 1) / 12)
+
+    # Generated in chunks so the float64 temporaries don't dominate the stage's peak RSS
+    y = np.empty(n, dtype=np.float32)
+    chunk = 10 * sr
+    phase_offset = 0.0
+    for start in range(0, n, chunk):
+        t = np.arange(start, min(start + chunk, n)) / sr
+
+        # A chord that changes every bar, so chroma and DTW have something to track
+        root = roots[(t / bar).astype(int)]
+        phase = phase_offset + 2 * np.pi * np.cumsum(root) / sr
+        phase_offset = phase[-1]
+        block = 0.2 * (np.sin(phase) + np.sin(phase * 1.25) + np.sin(phase * 1.5))
+
+        # Decaying kick on every beat
+        beat_phase = (t * tempo / 60.0) % 1.0
+        block += 0.5 * np.exp(-beat_phase * 30) * np.sin(2 * np.pi * 60 * t)
+
+        block += 0.02 * rng.standard_normal(len(t))
+        y[start:start + len(t)] = block
+
+    y /= np.max(np.abs(y))
+    return y
+
+
+def _load_test():
+    import test
+    return test
+
+
+def _load_test2():
+    import test2
+    return test2
+
+
+def stage_analyze_song(x_1, x_2, sr, workdir):
+    import soundfile as sf
+    from partyscore import analyze_song
+
+    path = os.path.join(workdir, "song.wav")
+    sf.write(path, x_1, sr)
+    return lambda: analyze_song(path)
+
+
+def stage_reverb_tail(x_1, x_2, sr, workdir):
+    test2 = _load_test2()
+    return lambda: test2.create_reverb_tail(x_1)
+
+
+def stage_scratch_crossfade(x_1, x_2, sr, workdir):
+    test2 = _load_test2()
+    return lambda: test2.create_scratch_crossfade(x_1, x_2, sr)
+
+
+def stage_reverb_transition(x_1, x_2, sr, workdir):
+    # Full render: input gains, the mixed window and output normalisation
+    from transitions import ReverbTransition
+
+    transition = ReverbTransition()
+    return lambda: transition.render(x_1, x_2, sr)
+
+
+def stage_chroma_dtw(x_1, x_2, sr, workdir):
+    import librosa
+
+    # Same steps as test.main() up to the warping path
+    def run():
+        hop_length = 1024
+        x_1_chroma = librosa.feature.chroma_cqt(y=x_1, sr=sr, hop_length=hop_length)
+        x_2_chroma = librosa.feature.chroma_cqt(y=x_2, sr=sr, hop_length=hop_length)
+        return librosa.sequence.dtw(X=x_1_chroma, Y=x_2_chroma, metric='cosine')
+
+    return run
+
+
+def stage_window_dtw(x_1, x_2, sr, workdir):
+    import librosa
+    from alignment import align_transition
+
+    # Chroma and subsequence DTW on the last 30 s of song 1 and the first 60 s of song 2
+    def run():
+        hop_length = 1024
+        outro = x_1[-30 * sr:]
+        intro = x_2[:60 * sr]
+        outro_chroma = librosa.feature.chroma_cqt(y=outro, sr=sr, hop_length=hop_length)
+        intro_chroma = librosa.feature.chroma_cqt(y=intro, sr=sr, hop_length=hop_length)
+        return align_transition(outro_chroma, intro_chroma, outro_chroma.shape[1], intro_chroma.shape[1])
+
+    return run
+
+
+def stage_full_transition(x_1, x_2, sr, workdir):
+    test = _load_test()
+    return lambda: test.create_full_transition(x_1, x_2, None, sr, crossfade_duration=2.0)
+
+
+def _synth_warping_path(x_1, x_2, hop_length=1024, seed=0):
+    # Monotonic path with a slight tempo drift and jitter, end to start like librosa
+    frames_1 = len(x_1) // hop_length + 1
+    frames_2 = len(x_2) // hop_length + 1
+    jitter = np.random.RandomState(seed).randint(-2, 3, frames_1)
+    frames = np.clip(np.arange(frames_1) * (frames_2 - 1) / max(frames_1 - 1, 1) + jitter, 0, frames_2 - 1)
+    wp = np.stack([np.arange(frames_1), np.maximum.accumulate(frames.astype(int))], axis=1)
+    return wp[::-1]
+
+
+def stage_time_warp(x_1, x_2, sr, workdir):
+    from timewarp import warp_audio
+
+    hop_length = 1024
+    wp = _synth_warping_path(x_1, x_2, hop_length)
+    return lambda: warp_audio(x_2, wp, hop_length=hop_length)
+
+
+def stage_time_warp_interp(x_1, x_2, sr, workdir):
+    # The previous approach: full-length np.interp over the path, fixed to use it in increasing order
+    hop_length = 1024
+    wp = _synth_warping_path(x_1, x_2, hop_length)[::-1]
+
+    def run():
+        time_original = wp[:, 0] * hop_length
+        time_warped = wp[:, 1] * hop_length
+        positions = np.interp(np.arange(time_original[-1] + hop_length), time_original, time_warped)
+        return np.interp(positions, np.arange(len(x_2)), x_2)
+
+    return run
+
+
+def stage_stream_crossfade(x_1, x_2, sr, workdir):
+    import soundfile as sf
+    from stream_render import stream_crossfade
+
+    path_1 = os.path.join(workdir, "song1.wav")
+    path_2 = os.path.join(workdir, "song2.wav")
+    sf.write(path_1, x_1, sr)
+    sf.write(path_2, x_2, sr)
+    output_path = os.path.join(workdir, "transition.wav")
+    return lambda: stream_crossfade(path_1, path_2, output_path, crossfade_duration=2.0)
+
+
+def stage_set_render(x_1, x_2, sr, workdir):
+    import soundfile as sf
+    import pcm_cache
+    from set_renderer import render_set
+
+    # Decoded tracks are cached in the work directory, so timed runs map them like repeat renders do
+    pcm_cache.default_pcm_cache.cache_dir = os.path.join(workdir, "pcm")
+
+    # Four-track set, so the reported throughput is a quarter of the set's realtime factor
+    path_1 = os.path.join(workdir, "song1.wav")
+    path_2 = os.path.join(workdir, "song2.wav")
+    sf.write(path_1, x_1, sr)
+    sf.write(path_2, x_2, sr)
+    output_path = os.path.join(workdir, "set.wav")
+    return lambda: render_set([path_1, path_2, path_1, path_2], output_path, "crossfade", sr=sr)
+
+
+def stage_decode_mp3(x_1, x_2, sr, workdir):
+    import librosa
+    import soundfile as sf
+
+    path = os.path.join(workdir, "song1.mp3")
+    sf.write(path, x_1, sr)
+    return lambda: librosa.load(path, sr=sr)
+
+
+def stage_pcm_cache_load(x_1, x_2, sr, workdir):
+    # Same file as decode_mp3, served from the PCM cache after the warm-up run decoded it
+    import soundfile as sf
+    from pcm_cache import PCMCache
+
+    path = os.path.join(workdir, "song1.mp3")
+    sf.write(path, x_1, sr)
+    cache = PCMCache(os.path.join(workdir, "pcm"))
+
+    def run():
+        y, _ = cache.load(path, sr=sr)
+        return float(np.sum(y))  # Touch every page
+
+    return run
+
+
+def stage_transition_window(x_1, x_2, sr, workdir, whole_track=False):
+    # Time to the first mixed sample from files, cold: only the reverb window is decoded
+    import soundfile as sf
+    import segment_loader
+    from pcm_cache import PCMCache
+    from transitions import ReverbTransition
+
+    path_1 = os.path.join(workdir, "song1.mp3")
+    path_2 = os.path.join(workdir, "song2.mp3")
+    sf.write(path_1, x_1, sr)
+    sf.write(path_2, x_2, sr)
+    cache = PCMCache(os.path.join(workdir, "pcm"))  # Stays empty, so every run decodes
+    transition = ReverbTransition()
+
+    def run():
+        segment_loader._stats_memo.clear()  # Whole-track levels are measured again on every run
+        return segment_loader.transition_window(transition, path_1, path_2, sr, cache, whole_track=whole_track)
+    return run
+
+
+def stage_transition_window_whole_track(x_1, x_2, sr, workdir):
+    # Same, levelled over both whole songs: grows with song length
+    return stage_transition_window(x_1, x_2, sr, workdir, whole_track=True)
+
+
+def stage_mp3_export(x_1, x_2, sr, workdir):
+    import pydub as pd
+
+    path = os.path.join(workdir, "export.mp3")
+
+    def run():
+        segment = pd.AudioSegment(
+            (x_1 * 32767).astype(np.int16).tobytes(),
+            frame_rate=sr,
+            sample_width=2,
+            channels=1
+        )
+        segment.export(path, format="mp3")
+
+    return run
+
+
+# Stage name -> setup function returning a zero-argument callable to time
+STAGES = {
+    "analyze_song": stage_analyze_song,
+    "reverb_tail": stage_reverb_tail,
+    "scratch_crossfade": stage_scratch_crossfade,
+    "reverb_transition": stage_reverb_transition,
+    "chroma_dtw": stage_chroma_dtw,
+    "window_dtw": stage_window_dtw,
+    "full_transition": stage_full_transition,
+    "time_warp": stage_time_warp,
+    "time_warp_interp": stage_time_warp_interp,
+    "stream_crossfade": stage_stream_crossfade,
+    "set_render": stage_set_render,
+    "decode_mp3": stage_decode_mp3,
+    "pcm_cache_load": stage_pcm_cache_load,
+    "transition_window": stage_transition_window,
+    "transition_window_whole_track": stage_transition_window_whole_track,
+    "mp3_export": stage_mp3_export,
+}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_stage(stage, duration, repeat, queue):
+    try:
+        os.chdir(REPO_ROOT)  # Stages load effect samples such as disc.mp3 relative to the repo root
+        x_1 = synth_audio(duration, seed=1)
+        x_2 = synth_audio(duration, tempo=126.0, seed=2)
+        with tempfile.TemporaryDirectory() as workdir:
+            run = STAGES[stage](x_1, x_2, SAMPLE_RATE, workdir)
+            rss_before = _peak_rss_mb()
+            run()  # Warm-up run, so JIT compilation and caches aren't timed
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            rss_after = _peak_rss_mb()
+        wall = float(np.median(times))
+        queue.put({
+            "stage": stage,
+            "duration": duration,
+            "wall_s": wall,
+            "min_wall_s": float(np.min(times)),
+            "peak_rss_mb": rss_after,
+            "stage_rss_mb": rss_after - rss_before,
+            "throughput": duration / wall if wall > 0 else float("inf"),
+        })
+    except Exception as e:
+        queue.put({"stage": stage, "duration": duration, "error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmark(stage, duration, repeat=3, timeout=None):
+    """
+    Run one stage in a fresh process and return its measurements.
+
+    A stage process that dies without reporting (killed by the OOM killer,
+    a segfault) or runs past the timeout gives an error entry instead of
+    hanging the run.
+
+    Parameters:
+    -----------
+    stage : str
+        Name of the stage in STAGES
+    duration : float
+        Length of the synthetic input audio in seconds
+    repeat : int
+        Number of timed runs (the median is reported)
+    timeout : float, optional
+        Seconds after which the stage process is killed (None waits as long as it lives)
+
+    Returns:
+    --------
+    dict
+        Wall time, peak RSS and throughput (seconds of audio per second), or an error message
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, duration, repeat, queue))
+    process.start()
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                return queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                pass
+            if not process.is_alive():
+                # The result may have been queued just before the process exited
+                try:
+                    return queue.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    return {"stage": stage, "duration": duration,
+                            "error": f"stage process exited with code {process.exitcode}"}
+            if timeout is not None and time.monotonic() - started > timeout:
+                process.kill()
+                return {"stage": stage, "duration": duration, "error": f"timed out after {timeout:g}s"}
+    finally:
+        process.join()
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25, min_delta=0.01):
+    """
+    Flag results that are slower or use more memory than the baseline.
+
+    Parameters:
+    -----------
+    results : list
+        Benchmark results
+    baseline : list
+        Baseline results to compare against
+    tolerance : float
+        Allowed relative slowdown or memory growth before a result is flagged
+    min_delta : float
+        Absolute slowdown in seconds below which timing noise is ignored
+
+    Returns:
+    --------
+    list
+        Human-readable regression messages
+    """
+    reference = {(r["stage"], r["duration"]): r for r in baseline if "error" not in r}
+    regressions = []
+    for result in results:
+        base = reference.get((result["stage"], result["duration"]))
+        if base is None or "error" in result:
+            continue
+        for key, label in (("wall_s", "wall time"), ("peak_rss_mb", "peak RSS")):
+            if key == "wall_s" and result[key] - base[key] < min_delta:
+                continue
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(
+                    f"{result['stage']} @ {result['duration']:g}s: {label} {result[key]:.3f} "
+                    f"vs baseline {base[key]:.3f} (+{result[key] / base[key] - 1:.0%})"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the audio pipeline on synthetic audio.")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--durations", nargs="+", type=float, default=[30.0, 120.0],
+                        help="Input lengths in seconds (30 s to 10 min)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Seconds after which a stage process is killed and reported as failed")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Merge the results into the baseline file instead of comparing")
+    args = parser.parse_args(argv)
+
+    results = []
+    for stage in args.stages:
+        for duration in args.durations:
+            result = run_benchmark(stage, duration, args.repeat, args.timeout)
+            results.append(result)
+            if "error" in result:
+                print(f"{stage:<18} {duration:>6g}s  failed: {result['error']}")
+            else:
+                print(f"{stage:<18} {duration:>6g}s  {result['wall_s']:8.3f}s  "
+                      f"{result['peak_rss_mb']:8.1f} MB peak  {result['stage_rss_mb']:8.1f} MB stage  "
+                      f"{result['throughput']:8.1f}x realtime")
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    output = args.baseline if args.update_baseline else args.output
+    if args.update_baseline and os.path.exists(args.baseline):
+        # Only replace the baseline entries of the stages and durations that were run
+        with open(args.baseline, encoding="utf-8") as file_in:
+            previous = json.load(file_in)["results"]
+        measured = {(r["stage"], r["duration"]) for r in results}
+        report["results"] = [r for r in previous if (r["stage"], r["duration"]) not in measured] + results
+    with open(output, "w", encoding="utf-8") as file_out:
+        json.dump(report, file_out, indent=2)
+    print(f"Results written to {output}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as file_in:
+        baseline = json.load(file_in)["results"]
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION: {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import os
+import sys
+import tempfile
+
+import librosa
+import numpy as np
+
+from hashing import file_hash
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SPOTIFY_DIR = os.path.join(REPO_DIR, "spotifyAPI")
+
+DEFAULT_STORE_DIR = os.path.join(REPO_DIR, ".feature_store")
+
+
+def extract_chroma(y, sr, hop_length):
+    return librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop_length)
+
+
+def extract_onset(y, sr, hop_length):
+    return librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+
+
+def extract_beats(y, sr, hop_length):
+    # Same beat tracker the party score uses, imported on first use so the
+    # store doesn't pull in the spotifyAPI package for other features
+    if SPOTIFY_DIR not in sys.path:
+        sys.path.append(SPOTIFY_DIR)
+    from partyscore import compute_beats
+
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+    _, beat_frames = compute_beats(y, sr, onset_env=onset_env, hop_length=hop_length)
+    return np.asarray(beat_frames, dtype=np.int64)
+
+
+# Feature type -> function (y, sr, hop_length) -> np.ndarray
+EXTRACTORS = {
+    "chroma": extract_chroma,
+    "onset": extract_onset,
+    "beats": extract_beats,
+}
+
+
+class FeatureStore:
+    """
+    Per-track store of analysis features as memory-mapped .npy files.
+
+    Entries are keyed by (file content hash, sr, hop_length, feature type),
+    so renamed or copied files share entries and edited files get new ones.
+    Reading an entry maps it instead of loading it, and computing several
+    missing features of a track decodes the audio only once.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, extractors=None):
+        self.store_dir = store_dir
+        self.extractors = dict(EXTRACTORS if extractors is None else extractors)
+
+    def entry_path(self, path, kind, sr, hop_length):
+        """
+        Path of the .npy entry of one feature of a track.
+        """
+        if kind not in self.extractors:
+            raise ValueError(f"Unknown feature type '{kind}', expected one of {sorted(self.extractors)}")
+        return os.path.join(self.store_dir, f"{file_hash(path)}_{kind}_{sr}_{hop_length}.npy")
+
+    def _save(self, entry_path, value):
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file_out:
+                np.save(file_out, np.ascontiguousarray(value))
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_many(self, path, kinds, sr=22050, hop_length=1024, y=None):
+        """
+        Get several features of a track, computing the missing ones from one decode.
+
+        Parameters:
+        -----------
+        path : str
+            Audio file
+        kinds : list
+            Feature types, e.g. ['chroma', 'beats']
+        sr : int
+            Sampling rate the features are computed at
+        hop_length : int
+            Hop length of the feature frames
+        y : np.ndarray, optional
+            Already decoded audio at rate sr, to skip decoding
+
+        Returns:
+        --------
+        dict
+            Read-only memory-mapped array per feature type
+        """
+        entries = {kind: self.entry_path(path, kind, sr, hop_length) for kind in kinds}
+        missing = [kind for kind, entry in entries.items() if not os.path.exists(entry)]
+        if missing:
+            if y is None:
+                y, _ = librosa.load(path, sr=sr)
+            for kind in missing:
+                self._save(entries[kind], self.extractors[kind](y, sr, hop_length))
+        return {kind: np.load(entry, mmap_mode="r") for kind, entry in entries.items()}
+
+    def get(self, path, kind, sr=22050, hop_length=1024, y=None):
+        """
+        Get one feature of a track, see get_many.
+        """
+        return self.get_many(path, [kind], sr, hop_length, y)[kind]
+
+    def get_window(self, path, kind, offset=0.0, duration=None, sr=22050, hop_length=1024, y=None):
+        """
+        Get one feature of a time range of a track.
+
+        If the whole track's feature is stored, the frames of the range are
+        sliced from it. Otherwise only the range is decoded (see
+        segment_loader.load_segment) and its feature is computed without
+        being stored.
+
+        Parameters:
+        -----------
+        path : str
+            Audio file
+        kind : str
+            Framewise feature type, 'chroma' or 'onset'
+        offset : float
+            Start of the range in seconds
+        duration : float, optional
+            Length of the range in seconds (None runs to the end of the track)
+        sr : int
+            Sampling rate the feature is computed at
+        hop_length : int
+            Hop length of the feature frames
+        y : np.ndarray, optional
+            Already decoded audio of the range at rate sr, to skip decoding
+
+        Returns:
+        --------
+        np.ndarray
+            Feature frames of the range (frames on the last axis)
+        """
+        entry = self.entry_path(path, kind, sr, hop_length)
+        if os.path.exists(entry):
+            first = int(round(offset * sr)) // hop_length
+            stop = None if duration is None else first + 1 + int(round(duration * sr)) // hop_length
+            return np.load(entry, mmap_mode="r")[..., first:stop]
+        if y is None:
+            from segment_loader import load_segment
+
+            y, _ = load_segment(path, offset, duration, sr=sr)
+        return self.extractors[kind](y, sr, hop_length)
+
+
+# Shared store used by the scripts
+default_store = FeatureStore()
@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+# In-process memo of content hashes: (path, size, mtime) -> sha1
+_hash_memo = {}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-1 of a file's content, memoised per (path, size, mtime).
+
+    Parameters:
+    -----------
+    path : str
+        Path to the file
+    chunk_size : int
+        Bytes read at a time
+
+    Returns:
+    --------
+    str
+        Hex digest
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_memo:
+        digest = hashlib.sha1()
+        with open(path, "rb") as file_in:
+            for chunk in iter(lambda: file_in.read(chunk_size), b""):
+                digest.update(chunk)
+        _hash_memo[key] = digest.hexdigest()
+    return _hash_memo[key]
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Samples processed per block: small enough that a block and its scratch
+# buffer stay in cache between the steps fused on them
+BLOCK = 16384
+
+# Sample indices 0..BLOCK-1, the base of every fade curve block
+_INDICES = np.arange(BLOCK, dtype=np.float32)
+
+
+def ramp(length, fade_in, power=1.0, offset=0):
+    """
+    Describe a fade curve without building it.
+
+    The curve is the one `np.linspace(0, 1, length) ** power` (or 1 to 0 for
+    a fade out) gives, starting `offset` samples in, so a kernel can compute
+    it block by block.
+
+    Parameters:
+    -----------
+    length : int
+        Length of the whole fade in samples
+    fade_in : bool
+        Rise from 0 to 1 instead of falling from 1 to 0
+    power : float, optional
+        Exponent shaping the curve (1.0 is linear)
+    offset : int, optional
+        First sample of the fade to use
+
+    Returns:
+    --------
+    tuple
+        (start, step, power): sample i of the curve is (start + step * i) ** power
+    """
+    step = 1.0 / (length - 1) if length > 1 else 0.0
+    if not fade_in:
+        step = -step
+    start = (0.0 if fade_in else 1.0) + step * offset
+    return start, step, power
+
+
+def peak(x, blocksize=BLOCK):
+    """
+    Largest absolute sample value, without a full-size temporary.
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        Audio signal
+    blocksize : int, optional
+        Samples per block
+
+    Returns:
+    --------
+    float
+        Peak level (0.0 for an empty or silent signal)
+    """
+    x = np.asarray(x)
+    if x.ndim != 1:
+        x = x.reshape(-1)
+    scratch = np.empty(min(blocksize, len(x)), dtype=np.float32)
+    level = 0.0
+    for start in range(0, len(x), blocksize):
+        block = scratch[:min(blocksize, len(x) - start)]
+        np.abs(x[start:start + len(block)], out=block, casting='unsafe')
+        level = max(level, float(block.max()))
+    return level
+
+
+def mean_square(x, blocksize=BLOCK):
+    """
+    Mean of the squared samples, accumulated in float64 block by block.
+    """
+    x = np.asarray(x)
+    if len(x) == 0:
+        return 0.0
+    # np.dot accumulates in its input dtype, so each block is widened first
+    scratch = np.empty(min(blocksize, len(x)), dtype=np.float64)
+    total = 0.0
+    for start in range(0, len(x), blocksize):
+        block = scratch[:min(blocksize, len(x) - start)]
+        block[:] = x[start:start + len(block)]
+        total += float(np.dot(block, block))
+    return total / len(x)
+
+
+def mix_into(out, x, gain=1.0, fade=None, accumulate=True, blocksize=BLOCK):
+    """
+    Write or add x * gain * fade into a float32 buffer in one pass.
+
+    Gain, fade curve and sum are applied block by block through one small
+    scratch buffer, so no temporary the size of the signal is allocated, and
+    the peak of the written region is measured while each block is still
+    in cache.
+
+    Parameters:
+    -----------
+    out : np.ndarray
+        float32 destination, the same length as x (modified in place)
+    x : np.ndarray
+        Source signal
+    gain : float, optional
+        Gain applied to x
+    fade : tuple, optional
+        Fade curve from ramp() (None applies no fade)
+    accumulate : bool, optional
+        Add to out instead of overwriting it
+    blocksize : int, optional
+        Samples per block (at most BLOCK when fading)
+
+    Returns:
+    --------
+    float
+        Peak absolute value of out over the written region, after the write
+    """
+    if len(out) != len(x):
+        raise ValueError(f"Output and input lengths differ ({len(out)} vs {len(x)}).")
+    if fade is not None:
+        blocksize = min(blocksize, BLOCK)
+        start_value, step, power = fade
+        if power == 1.0:
+            # A linear curve absorbs the gain
+            start_value, step = start_value * gain, step * gain
+            gain = 1.0
+
+    scratch = np.empty(min(blocksize, len(x)), dtype=np.float32)
+    level = 0.0
+    for start in range(0, len(x), blocksize):
+        block = scratch[:min(blocksize, len(x) - start)]
+        source = x[start:start + len(block)]
+        target = out[start:start + len(block)]
+        if fade is None:
+            np.multiply(source, gain, out=block, casting='unsafe')
+        else:
+            np.multiply(_INDICES[:len(block)], step, out=block)
+            block += start_value + step * start
+            if power != 1.0:
+                # Rounding can leave the end of a fade just below zero
+                np.maximum(block, 0.0, out=block)
+                np.power(block, power, out=block)
+            np.multiply(block, source, out=block, casting='unsafe')
+            if gain != 1.0:
+                block *= gain
+        if accumulate:
+            target += block
+        else:
+            target[...] = block
+        np.abs(target, out=block)
+        level = max(level, float(block.max()))
+    return level
+
@@ -0,0 +1,197 @@
+import os
+import shutil
+import struct
+import tempfile
+
+import librosa
+import numpy as np
+
+from hashing import file_hash
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(REPO_DIR, ".pcm_cache")
+
+# Rate the scripts analyze at; rendering asks for its own rate
+DEFAULT_SR = 22050
+
+# Entry header: magic, format version, sample type code, sampling rate, channels, frames
+MAGIC = b"PCMC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHBxIIQ")
+HEADER_SIZE = 64  # Header padded so the samples start aligned
+
+# Sample type code <-> numpy dtype
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<i2")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+# Full scale of int16 entries
+INT16_SCALE = 32767.0
+
+
+def read_header(entry_path):
+    """
+    Read the header of a cache entry.
+
+    Parameters:
+    -----------
+    entry_path : str
+        Path to the .pcm entry
+
+    Returns:
+    --------
+    dict
+        'dtype', 'sr', 'channels' and 'frames' of the entry
+    """
+    with open(entry_path, "rb") as file_in:
+        raw = file_in.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"Truncated PCM cache entry '{entry_path}'")
+    magic, version, code, sr, channels, frames = HEADER.unpack(raw)
+    if magic != MAGIC or version != FORMAT_VERSION or code not in DTYPES:
+        raise ValueError(f"Not a version {FORMAT_VERSION} PCM cache entry: '{entry_path}'")
+    return {"dtype": DTYPES[code], "sr": sr, "channels": channels, "frames": frames}
+
+
+class PCMCache:
+    """
+    Decoded audio stored once per track as raw PCM and served as memory maps.
+
+    Entries are keyed by (file content hash, sampling rate, mono/stereo,
+    sample type). The first request decodes the file; later requests map the
+    entry, so the same track costs a page-cache read instead of a decode and
+    a window of it costs only the pages it touches. float32 entries are
+    returned as zero-copy read-only views; int16 entries take half the disk
+    space and are converted per request.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, dtype="float32"):
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        if self.dtype not in DTYPE_CODES:
+            raise ValueError(f"Unsupported sample type '{dtype}', expected float32 or int16")
+
+    def entry_path(self, path, sr, mono=True):
+        """
+        Path of the .pcm entry of a track at a sampling rate.
+        """
+        layout = "mono" if mono else "multi"
+        return os.path.join(self.cache_dir, f"{file_hash(path)}_{sr}_{layout}_{self.dtype.name}.pcm")
+
+    def _save(self, entry_path, y, sr):
+        # Frames are stored interleaved: shape (frames, channels)
+        frames = np.atleast_2d(y).T
+        if self.dtype == DTYPES[1]:
+            frames = np.round(np.clip(frames, -1.0, 1.0) * INT16_SCALE)
+        frames = np.ascontiguousarray(frames, dtype=self.dtype)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[self.dtype], sr, frames.shape[1], frames.shape[0])
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file_out:
+                file_out.write(header.ljust(HEADER_SIZE, b"\0"))
+                frames.tofile(file_out)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _entry(self, path, sr, mono):
+        # Entry path and header, decoding the track if it isn't cached yet
+        if sr is None:
+            sr = librosa.get_samplerate(path)
+        entry_path = self.entry_path(path, sr, mono)
+        try:
+            return entry_path, read_header(entry_path)
+        except (OSError, ValueError):
+            y, _ = librosa.load(path, sr=sr, mono=mono)
+            self._save(entry_path, y, sr)
+            return entry_path, read_header(entry_path)
+
+    def has(self, path, sr=DEFAULT_SR, mono=True):
+        """
+        Whether a track is already cached at a sampling rate, without decoding it.
+        """
+        if sr is None:
+            sr = librosa.get_samplerate(path)
+        try:
+            read_header(self.entry_path(path, sr, mono))
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def get(self, path, sr=DEFAULT_SR, mono=True):
+        """
+        Get a track's cached samples in their stored sample type.
+
+        Parameters:
+        -----------
+        path : str
+            Audio file
+        sr : int, optional
+            Sampling rate (None keeps the native rate)
+        mono : bool, optional
+            Mix down to mono
+
+        Returns:
+        --------
+        tuple
+            Read-only memory-mapped samples, shape (frames,) for mono or
+            (channels, frames) otherwise, and the sampling rate
+        """
+        entry_path, header = self._entry(path, sr, mono)
+        shape = (header["frames"], header["channels"])
+        if header["frames"] == 0:
+            frames = np.zeros(shape, dtype=header["dtype"])
+        else:
+            frames = np.memmap(entry_path, dtype=header["dtype"], mode="r", offset=HEADER_SIZE, shape=shape)
+            frames = np.asarray(frames)  # Plain ndarray view, so results aren't memmaps
+        return (frames[:, 0] if header["channels"] == 1 else frames.T), header["sr"]
+
+    def load(self, path, sr=DEFAULT_SR, mono=True, offset=0.0, duration=None):
+        """
+        Load a track (or a window of it) as float audio, like librosa.load.
+
+        Parameters:
+        -----------
+        path : str
+            Audio file
+        sr : int, optional
+            Sampling rate (None keeps the native rate)
+        mono : bool, optional
+            Mix down to mono
+        offset : float, optional
+            Start reading after this many seconds
+        duration : float, optional
+            Only load this many seconds (None loads to the end)
+
+        Returns:
+        --------
+        tuple
+            float32 audio (a zero-copy read-only view for float32 entries) and the sampling rate
+        """
+        y, sr = self.get(path, sr, mono)
+        start = int(round(offset * sr))
+        stop = None if duration is None else start + int(round(duration * sr))
+        y = y[..., start:stop]
+        if y.dtype != np.float32:
+            y = (y / INT16_SCALE).astype(np.float32)
+        return y, sr
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+# Shared cache used by the scripts
+default_pcm_cache = PCMCache()
+
+
+def load_pcm(path, sr=DEFAULT_SR, mono=True, offset=0.0, duration=None):
+    """
+    Load audio through the shared PCM cache, see PCMCache.load.
+    """
+    return default_pcm_cache.load(path, sr=sr, mono=mono, offset=offset, duration=duration)
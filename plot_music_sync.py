@@ -2,6 +2,13 @@ import numpy as np
 import librosa
 import soundfile as sf
 import matplotlib.pyplot as plt
+from feature_store import default_store
+from mixkernels import mix_into, ramp
+from segment_loader import native_rate, read_frames, stream_frames, track_frames
+from timewarp import warp_audio
+
+# Seconds at the end of the first song and the start of the second that are aligned and mixed
+TRANSITION_WINDOW = 30.0
 
 
 def align_audio_with_dtw(x, wp, fs, hop_length=512):
@@ -11,9 +18,9 @@ def align_audio_with_dtw(x, wp, fs, hop_length=512):
     Parameters:
     -----------
     x : np.ndarray
-        Audio signal to align
+        Audio signal to align (the second sequence of the DTW)
     wp : np.ndarray
-        Warping path (frames)
+        Warping path (frames), in either order
     fs : int
         Sampling rate
     hop_length : int, optional
@@ -22,22 +29,12 @@ def align_audio_with_dtw(x, wp, fs, hop_length=512):
     Returns:
     --------
     np.ndarray
-        Aligned audio signal
+        Aligned audio signal on the timeline of the first sequence
     """
-    # Map frames to samples
-    time_warped = librosa.frames_to_samples(wp[:, 1], hop_length=hop_length)
-    time_original = librosa.frames_to_samples(wp[:, 0], hop_length=hop_length)
+    return warp_audio(x, wp, hop_length=hop_length)
 
-    # Interpolate the audio signal based on the warping path
-    aligned_audio = np.interp(
-        np.arange(time_original[-1] + 1),
-        time_warped,
-        x[:min(len(x), len(time_warped))],
-    )
-    return aligned_audio
 
-
-def create_full_transition(x_1, x_2, wp, fs, crossfade_duration=1.0):
+def create_full_transition(x_1, x_2, wp, fs, crossfade_duration=1.0, hop_length=512):
     """
     Create a full audio file containing the entire first track that transitions into the second track.
 
@@ -53,17 +50,19 @@ def create_full_transition(x_1, x_2, wp, fs, crossfade_duration=1.0):
         Sampling rate
     crossfade_duration : float, optional
         Duration of the crossfade between tracks in seconds
+    hop_length : int, optional
+        Hop length the warping path was computed with
 
     Returns:
     --------
     np.ndarray
-        The complete audio signal with transition
+        The complete float32 audio signal with transition
     """
     # Convert crossfade duration to samples
     crossfade_samples = int(crossfade_duration * fs)
 
     # Align the second track using the warping path
-    aligned_x2 = align_audio_with_dtw(x_2, wp, fs)
+    aligned_x2 = align_audio_with_dtw(x_2, wp, fs, hop_length=hop_length)
 
     # Ensure the first track is long enough for the crossfade
     transition_start = len(x_1) - crossfade_samples
@@ -74,64 +73,59 @@ def create_full_transition(x_1, x_2, wp, fs, crossfade_duration=1.0):
     total_length = max(len(x_1), transition_start + len(aligned_x2))
 
     # Create the output array
-    output = np.zeros(total_length)
+    output = np.zeros(total_length, dtype=np.float32)
 
-    # Copy the first signal
-    output[:len(x_1)] = x_1
-
-    # Create crossfade weights
-    fade_out = np.linspace(1, 0, crossfade_samples)
-    fade_in = np.linspace(0, 1, crossfade_samples)
+    # Copy the first signal, fading out its last crossfade_samples
+    output[:transition_start] = x_1[:transition_start]
+    mix_into(output[transition_start:len(x_1)], x_1[transition_start:], 1.0, ramp(crossfade_samples, False),
+             accumulate=False)
 
     # Adjust lengths to match the transition region
     aligned_x2 = aligned_x2[:len(output) - transition_start]
+    faded = min(crossfade_samples, len(aligned_x2))
+    aligned_end = transition_start + len(aligned_x2)
 
-    # Debugging shape mismatches
-    print(f"Output shape: {output[transition_start:transition_start + crossfade_samples].shape}")
-    print(f"Fade out shape: {fade_out.shape}")
-    print(f"Aligned x2 fade in shape: {aligned_x2[:crossfade_samples].shape}")
-
-    # Apply the crossfade
-    output[transition_start:transition_start + crossfade_samples] *= fade_out
-    aligned_x2[:crossfade_samples] *= fade_in
-
-    # Add the second signal starting at the transition point
-    output[transition_start:transition_start + len(aligned_x2)] += aligned_x2
+    # Add the second signal starting at the transition point, fading in over the crossfade
+    mix_into(output[transition_start:transition_start + faded], aligned_x2[:faded], 1.0, ramp(crossfade_samples, True))
+    mix_into(output[transition_start + faded:aligned_end], aligned_x2[faded:])
 
     return output
 
 
-def main():
+def main(song_1="bunny.mp3", song_2="music.mp3", output="full_transition.wav", window=TRANSITION_WINDOW):
     try:
-        # Load audio files
-        print("Loading audio files...")
-        x_1, fs = librosa.load("bunny.mp3", sr=None)
-        x_2, fs = librosa.load("music.mp3", sr=None)
-
-        # Ensure mono audio
-        if x_1.ndim > 1:
-            x_1 = np.mean(x_1, axis=1)
-        if x_2.ndim > 1:
-            x_2 = np.mean(x_2, axis=1)
+        # Only the end of the first song and the start of the second are decoded for the transition
+        print("Loading transition windows...")
+        fs = native_rate(song_1)
+        frames_1, frames_2 = track_frames(song_1, fs), track_frames(song_2, fs)
+        tail_start = max(frames_1 - int(window * fs), 0)
+        head_end = min(int(window * fs), frames_2)
+        x_1, _ = read_frames(song_1, tail_start, frames_1, sr=fs)
+        x_2, _ = read_frames(song_2, 0, head_end, sr=fs)
 
         print("Calculating chroma features...")
-        # Calculate chroma features
+        # Calculate chroma features of the windows
         hop_length = 1024
-        x_1_chroma = librosa.feature.chroma_cqt(y=x_1, sr=fs, hop_length=hop_length)
-        x_2_chroma = librosa.feature.chroma_cqt(y=x_2, sr=fs, hop_length=hop_length)
+        x_1_chroma = default_store.get_window(song_1, "chroma", tail_start / fs, len(x_1) / fs, sr=fs,
+                                              hop_length=hop_length, y=x_1)
+        x_2_chroma = default_store.get_window(song_2, "chroma", 0.0, len(x_2) / fs, sr=fs,
+                                              hop_length=hop_length, y=x_2)
 
         print("Computing DTW...")
         # Compute DTW
         D, wp = librosa.sequence.dtw(X=x_1_chroma, Y=x_2_chroma, metric="cosine")
 
         print("Creating transition...")
-        # Create full audio with transition
-        full_audio = create_full_transition(x_1, x_2, wp, fs, crossfade_duration=2.0)
+        # Create the transition between the windows
+        transition_audio = create_full_transition(x_1, x_2, wp, fs, crossfade_duration=2.0, hop_length=hop_length)
 
         print("Saving output file...")
-        # Save the result
-        sf.write("full_transition.wav", full_audio, fs)
-        print("Done! Output saved as 'full_transition.wav'")
+        # Stream the rest of both songs around the transition
+        with sf.SoundFile(output, "w", samplerate=fs, channels=1) as sink:
+            stream_frames(sink, song_1, 0, tail_start, fs)
+            sink.write(transition_audio)
+            stream_frames(sink, song_2, head_end, frames_2, fs)
+        print(f"Done! Output saved as '{output}'")
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -0,0 +1,199 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=32)
+def impulse_response(room_size=0.8, damping=0.4, decay=3.0, sr=22050, seed=0):
+    """
+    Build the synthetic room impulse response used for reverb tails.
+
+    Responses are cached per (room_size, damping, decay, sr, seed). The noise
+    comes from np.random.RandomState(seed), so a response matches the one the
+    old create_reverb_tail drew after np.random.seed(seed).
+
+    Parameters:
+    -----------
+    room_size : float
+        Larger rooms decay more slowly
+    damping : float
+        How much the response is attenuated towards its end (0-1)
+    decay : float
+        Length of the response in seconds
+    sr : int
+        Sampling rate
+    seed : int
+        Seed of the noise
+
+    Returns:
+    --------
+    np.ndarray
+        Read-only float64 impulse response of decay * sr samples
+    """
+    # Create decay envelope with longer decay
+    tail_length = int(decay * sr)
+    decay_envelope = np.exp(-np.linspace(0, decay, tail_length) / (room_size * 1.5))
+
+    # Create room impulse response with less damping for more echo
+    impulse = np.random.RandomState(seed).randn(tail_length) * decay_envelope
+    impulse *= 1 - damping * np.linspace(0, 1, tail_length)
+
+    # Normalize impulse response with stronger presence
+    impulse *= 1.2 / np.sum(np.abs(impulse))
+    impulse.setflags(write=False)
+    return impulse
+
+
+class PartitionedConvolver:
+    """
+    Uniformly partitioned overlap-add convolution.
+
+    The impulse response is split into partitions of `block_size` samples
+    whose spectra are computed once. Each input block is transformed once,
+    kept in a frequency-domain delay line and multiplied with every partition
+    spectrum, so a block of output is available as soon as its block of input
+    arrives: latency is one block, independent of the response length.
+    """
+
+    def __init__(self, impulse, block_size=1024):
+        self.block_size = block_size
+        self.fft_size = 2 * block_size
+        self.impulse_length = len(impulse)
+
+        partitions = max(1, -(-len(impulse) // block_size))
+        padded = np.zeros(partitions * block_size)
+        padded[:len(impulse)] = impulse
+        self.partitions = np.fft.rfft(padded.reshape(partitions, block_size), n=self.fft_size, axis=1)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the delay line and the overlap buffer.
+        """
+        self._delay_line = np.zeros_like(self.partitions)
+        self._write_index = len(self.partitions) - 1  # Slot of the newest block spectrum
+        self._overlap = np.zeros(self.block_size)
+
+    def process_block(self, block):
+        """
+        Convolve the next block of a stream.
+
+        Parameters:
+        -----------
+        block : np.ndarray
+            Up to block_size input samples (shorter blocks are zero-padded)
+
+        Returns:
+        --------
+        np.ndarray
+            block_size output samples
+        """
+        # Circular delay line: the newest spectrum overwrites the oldest slot, and
+        # slot s holds the block that is (write_index - s) mod partitions blocks old
+        index = (self._write_index + 1) % len(self.partitions)
+        self._write_index = index
+        self._delay_line[index] = np.fft.rfft(block, n=self.fft_size)
+        spectrum = np.einsum('ij,ij->j', self._delay_line[:index + 1], self.partitions[index::-1])
+        if index + 1 < len(self.partitions):
+            spectrum += np.einsum('ij,ij->j', self._delay_line[index + 1:], self.partitions[:index:-1])
+        output = np.fft.irfft(spectrum, n=self.fft_size)
+
+        result = output[:self.block_size] + self._overlap
+        self._overlap = output[self.block_size:]
+        return result
+
+    def convolve(self, x):
+        """
+        Full linear convolution of a finite signal, same as np.convolve(x, impulse).
+
+        Input blocks are transformed in chunks and the partitions are
+        accumulated with one vectorised multiply-add per partition and chunk.
+
+        Parameters:
+        -----------
+        x : np.ndarray
+            Input signal
+
+        Returns:
+        --------
+        np.ndarray
+            len(x) + len(impulse) - 1 output samples
+        """
+        output_length = len(x) + self.impulse_length - 1
+        block_count = -(-output_length // self.block_size)
+        partition_count = len(self.partitions)
+        output = np.empty(block_count * self.block_size + self.block_size)
+        output[:self.block_size] = 0.0
+
+        # Input spectra are kept for the last partition_count blocks only, so
+        # memory stays bounded by chunk_blocks + partition_count blocks
+        chunk_blocks = max(64, partition_count)
+        history = np.zeros((partition_count - 1, self.block_size + 1), dtype=complex)
+        for first in range(0, block_count, chunk_blocks):
+            count = min(chunk_blocks, block_count - first)
+            chunk = np.zeros(count * self.block_size)
+            samples = x[first * self.block_size:(first + count) * self.block_size]
+            chunk[:len(samples)] = samples
+            blocks = np.concatenate([
+                history,
+                np.fft.rfft(chunk.reshape(count, self.block_size), n=self.fft_size, axis=1),
+            ])
+
+            spectra = np.zeros((count, self.block_size + 1), dtype=complex)
+            for index, partition in enumerate(self.partitions):
+                start = partition_count - 1 - index
+                spectra += blocks[start:start + count] * partition
+            history = blocks[count:]
+
+            # Overlap-add the second half of every block onto the next one
+            output_blocks = np.fft.irfft(spectra, n=self.fft_size, axis=1)
+            start = first * self.block_size
+            chunk_out = output[start:start + (count + 1) * self.block_size]
+            chunk_out[self.block_size:] = output_blocks[:, self.block_size:].reshape(-1)
+            chunk_out[:-self.block_size] += output_blocks[:, :self.block_size].reshape(-1)
+        return output[:output_length]
+
+
+@lru_cache(maxsize=32)
+def get_convolver(room_size=0.8, damping=0.4, decay=3.0, sr=22050, seed=0, block_size=1024):
+    """
+    Cached PartitionedConvolver for a cached impulse response, see impulse_response.
+
+    The instance is shared, so only use its stateless convolve method; create
+    a PartitionedConvolver of your own for streaming with process_block.
+    """
+    return PartitionedConvolver(impulse_response(room_size, damping, decay, sr, seed), block_size)
+
+
+def reverb_tail(audio, sr=22050, room_size=0.8, damping=0.4, decay=3.0, seed=0, block_size=4096):
+    """
+    Reverberate a segment and return it with its tail, RMS-matched to the input.
+
+    Parameters:
+    -----------
+    audio : np.ndarray
+        Segment to reverberate
+    sr : int
+        Sampling rate
+    room_size, damping, decay : float
+        Room settings, see impulse_response
+    seed : int
+        Seed of the impulse response noise
+    block_size : int
+        Partition size of the convolution. Offline rendering favours large
+        partitions; use a PartitionedConvolver with small blocks for streaming.
+
+    Returns:
+    --------
+    np.ndarray
+        len(audio) + decay * sr - 1 samples
+    """
+    convolver = get_convolver(room_size, damping, decay, sr, seed, block_size)
+    tail = convolver.convolve(audio)
+
+    # Normalize reverb tail while keeping it more prominent
+    input_rms = np.sqrt(np.mean(np.square(audio, dtype=np.float64)))
+    reverb_rms = np.sqrt(np.mean(tail ** 2))
+    if reverb_rms > 0:
+        tail *= (input_rms / reverb_rms) * 1.1
+    return tail
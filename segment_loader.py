@@ -0,0 +1,361 @@
+import math
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from hashing import file_hash
+from mixkernels import mean_square, peak
+from pcm_cache import DEFAULT_SR, default_pcm_cache
+
+# Extra audio decoded on each side of a resampled segment, so the resampling
+# filter sees the same neighbourhood as in a full decode
+RESAMPLE_PAD = 0.05
+
+# Frames per block when streaming the untouched parts of a song
+STREAM_BLOCK = 1 << 20
+
+# In-process memo of track levels: (content hash, sr) -> (peak, rms)
+_stats_memo = {}
+
+
+def native_rate(path):
+    """
+    Sampling rate a file is stored at, read from its header.
+    """
+    try:
+        return sf.info(path).samplerate
+    except RuntimeError:
+        return librosa.get_samplerate(path)
+
+
+def track_frames(path, sr=None):
+    """
+    Length of a track in samples at a sampling rate, read from its header.
+
+    Parameters:
+    -----------
+    path : str
+        Audio file
+    sr : int, optional
+        Sampling rate (None keeps the native rate)
+
+    Returns:
+    --------
+    int
+        Number of samples, matching the length of a full decode at rate sr
+    """
+    try:
+        info = sf.info(path)
+        native, frames = info.samplerate, info.frames
+    except RuntimeError:
+        native = librosa.get_samplerate(path)
+        frames = int(round(librosa.get_duration(path=path) * native))
+    if sr is None or sr == native:
+        return frames
+    return int(math.ceil(frames * sr / native))
+
+
+def track_duration(path):
+    """
+    Length of a track in seconds, read from its header.
+    """
+    try:
+        return sf.info(path).duration
+    except RuntimeError:
+        return librosa.get_duration(path=path)
+
+
+def _decode_frames(path, start, stop, sr, mono):
+    # Seek to the segment and decode only it, resampling from sample-aligned boundaries
+    with sf.SoundFile(path) as source:
+        native = source.samplerate
+        if sr == native:
+            first, last = start, stop
+        else:
+            # Segment edges rounded out to where both rates have a sample, plus padding
+            step = sr // math.gcd(sr, native)
+            pad = int(math.ceil(RESAMPLE_PAD * sr / step)) * step
+            first = max(start - pad, 0) // step * step
+            last = int(math.ceil((stop + pad) / step)) * step
+
+        native_first = first * native // sr
+        native_last = min(last * native // sr, source.frames)
+        source.seek(min(native_first, source.frames))
+        frames = source.read(max(native_last - native_first, 0), dtype='float32', always_2d=True)
+
+    y = frames.mean(axis=1) if mono else frames.T
+    if sr != native:
+        y = librosa.resample(np.ascontiguousarray(y), orig_sr=native, target_sr=sr)
+    return np.ascontiguousarray(y[..., start - first:stop - first])
+
+
+def read_frames(path, start=0, stop=None, sr=DEFAULT_SR, mono=True, cache=None):
+    """
+    Decode samples [start, stop) of a track without decoding the rest.
+
+    A track already in the PCM cache at this rate is served from its memory
+    map. Otherwise the decoder seeks straight to the segment; when resampling,
+    a little audio around it is decoded too, so the result matches the same
+    samples of a full decode. Files soundfile can't open fall back to
+    librosa.load with an offset.
+
+    Parameters:
+    -----------
+    path : str
+        Audio file
+    start : int
+        First sample, at rate sr
+    stop : int, optional
+        Sample after the last one (None reads to the end)
+    sr : int, optional
+        Sampling rate (None keeps the native rate)
+    mono : bool, optional
+        Mix down to mono
+    cache : PCMCache, optional
+        Cache to look the track up in (defaults to the shared PCM cache)
+
+    Returns:
+    --------
+    tuple
+        float32 audio, shape (samples,) for mono or (channels, samples) otherwise, and the sampling rate
+    """
+    cache = default_pcm_cache if cache is None else cache
+    if sr is None:
+        sr = native_rate(path)
+    if stop is None:
+        stop = track_frames(path, sr)
+    stop = max(stop, start)
+
+    if cache.has(path, sr, mono):
+        return cache.load(path, sr=sr, mono=mono, offset=start / sr, duration=(stop - start) / sr)
+    try:
+        return _decode_frames(path, start, stop, sr, mono), sr
+    except RuntimeError:
+        return librosa.load(path, sr=sr, mono=mono, offset=start / sr, duration=(stop - start) / sr)
+
+
+def load_segment(path, offset=0.0, duration=None, sr=DEFAULT_SR, mono=True, cache=None):
+    """
+    Decode a time range of a track, like librosa.load with offset and duration.
+
+    Parameters:
+    -----------
+    path : str
+        Audio file
+    offset : float, optional
+        Start reading after this many seconds
+    duration : float, optional
+        Only load this many seconds (None loads to the end)
+    sr : int, optional
+        Sampling rate (None keeps the native rate)
+    mono : bool, optional
+        Mix down to mono
+    cache : PCMCache, optional
+        Cache to look the track up in (defaults to the shared PCM cache)
+
+    Returns:
+    --------
+    tuple
+        float32 audio and the sampling rate
+    """
+    if sr is None:
+        sr = native_rate(path)
+    start = int(round(offset * sr))
+    stop = None if duration is None else start + int(round(duration * sr))
+    return read_frames(path, start, stop, sr, mono, cache)
+
+
+def stream_frames(sink, path, start, stop, sr, gain=1.0, blocksize=STREAM_BLOCK, cache=None):
+    """
+    Copy samples [start, stop) of a track to an open mono sound file, block by block.
+
+    Parameters:
+    -----------
+    sink : sf.SoundFile
+        Mono file to write to, at rate sr
+    path : str
+        Audio file to read
+    start, stop : int
+        Sample range at rate sr
+    sr : int
+        Sampling rate
+    gain : float, optional
+        Gain applied before the samples are clipped to the valid range
+    blocksize : int, optional
+        Samples decoded and written at a time
+    cache : PCMCache, optional
+        Cache to look the track up in (defaults to the shared PCM cache)
+
+    Returns:
+    --------
+    int
+        Number of samples written
+    """
+    written = 0
+    for block_start in range(start, stop, blocksize):
+        block, _ = read_frames(path, block_start, min(block_start + blocksize, stop), sr, True, cache)
+        block = np.multiply(block, gain, dtype=np.float32)
+        np.clip(block, -1.0, 1.0, out=block)
+        sink.write(block)
+        written += len(block)
+    return written
+
+
+def track_stats(path, sr=DEFAULT_SR, blocksize=STREAM_BLOCK, cache=None):
+    """
+    Peak and RMS level of a whole track, measured block by block.
+
+    Only one block is decoded at a time (served from the PCM cache when the
+    track is in it), and results are memoised per file content and rate.
+
+    Parameters:
+    -----------
+    path : str
+        Audio file
+    sr : int, optional
+        Sampling rate the levels are measured at (None keeps the native rate)
+    blocksize : int, optional
+        Samples decoded at a time
+    cache : PCMCache, optional
+        Cache to look the track up in (defaults to the shared PCM cache)
+
+    Returns:
+    --------
+    tuple
+        (peak, rms) of the mono mixdown
+    """
+    if sr is None:
+        sr = native_rate(path)
+    key = (file_hash(path), sr)
+    if key not in _stats_memo:
+        frames = track_frames(path, sr)
+        level, total, count = 0.0, 0.0, 0
+        for start in range(0, frames, blocksize):
+            block, _ = read_frames(path, start, min(start + blocksize, frames), sr, True, cache)
+            level = max(level, peak(block))
+            total += mean_square(block) * len(block)
+            count += len(block)
+        _stats_memo[key] = (level, float(np.sqrt(total / count)) if count else 0.0)
+    return _stats_memo[key]
+
+
+def transition_window(transition, path_1, path_2, sr=DEFAULT_SR, cache=None, levels=None, whole_track=False):
+    """
+    Mix a transition between two files, decoding only the parts it mixes.
+
+    The transition point is placed from song 1's length in its header, and
+    only the samples the strategy's window reads (see Transition.span) are
+    decoded, so the time to the first mixed sample doesn't depend on how long
+    the songs are. By default the strategy's input gains and the output level
+    come from the peak and RMS of those decoded parts. They can't account for
+    louder passages elsewhere, so when the rest of the songs is rendered too,
+    pass levels measured ahead of time or ask for whole-track levels.
+
+    Parameters:
+    -----------
+    transition : Transition
+        Transition strategy
+    path_1 : str
+        First audio file
+    path_2 : str
+        Second audio file
+    sr : int, optional
+        Sampling rate of the mix (None uses song 1's native rate)
+    cache : PCMCache, optional
+        Cache to look the tracks up in (defaults to the shared PCM cache)
+    levels : tuple, optional
+        Precomputed ((peak_1, rms_1), (peak_2, rms_2)) of the whole songs at rate sr
+    whole_track : bool, optional
+        Measure the whole songs with track_stats when no levels are given,
+        as Transition.render does (decodes both songs once, block by block)
+
+    Returns:
+    --------
+    dict
+        'mix_start' (sample in song 1 where the mixed block starts), 'mixed'
+        (float32 block), 'consumed' (samples of song 2 it contains), 'gain_1'
+        and 'gain_2' (levels for the rest of each song), 'frames_1' and
+        'frames_2' (song lengths) and 'sr'
+    """
+    if sr is None:
+        sr = native_rate(path_1)
+    frames_1, frames_2 = track_frames(path_1, sr), track_frames(path_2, sr)
+    transition_point = transition.transition_sample(frames_1, sr)
+    before, after, intro = transition.span(sr)
+
+    start_1 = max(transition_point - before, 0)
+    x_1, _ = read_frames(path_1, start_1, min(transition_point + after, frames_1), sr, True, cache)
+    x_2, _ = read_frames(path_2, 0, min(intro, frames_2), sr, True, cache)
+
+    if levels is None and whole_track:
+        levels = track_stats(path_1, sr, cache=cache), track_stats(path_2, sr, cache=cache)
+    if levels is None:
+        levels = (peak(x_1), float(np.sqrt(mean_square(x_1)))), (peak(x_2), float(np.sqrt(mean_square(x_2))))
+    (peak_1, _), (peak_2, _) = levels
+    gain_1, gain_2 = transition.track_gains(*levels)
+    mix_start, mixed, consumed = transition.window(x_1, x_2, sr, transition_point - start_1, gain_1, gain_2)
+
+    level = 1.0
+    if transition.output_peak is not None:
+        level = max(peak(mixed), peak_1 * gain_1, peak_2 * gain_2)
+        level = transition.output_peak / level if level > 0 else 1.0
+        mixed *= level
+
+    return {
+        "mix_start": start_1 + mix_start,
+        "mixed": mixed,
+        "consumed": consumed,
+        "gain_1": gain_1 * level,
+        "gain_2": gain_2 * level,
+        "frames_1": frames_1,
+        "frames_2": frames_2,
+        "sr": sr,
+    }
+
+
+def render_transition_file(transition, path_1, path_2, output_path, sr=None, blocksize=STREAM_BLOCK, cache=None,
+                           levels=None, whole_track=False):
+    """
+    Render two files joined by a transition into one file without decoding either one whole.
+
+    The transition is mixed first (see transition_window); song 1 up to it
+    and the rest of song 2 are then decoded and written block by block,
+    clipped to the valid range like set_renderer.
+
+    Parameters:
+    -----------
+    transition : Transition
+        Transition strategy
+    path_1 : str
+        First audio file
+    path_2 : str
+        Second audio file
+    output_path : str
+        Output file; the format follows the extension (wav, flac, ogg, mp3)
+    sr : int, optional
+        Sampling rate of the output (None uses song 1's native rate)
+    blocksize : int, optional
+        Samples decoded and written at a time
+    cache : PCMCache, optional
+        Cache to look the tracks up in (defaults to the shared PCM cache)
+    levels, whole_track
+        How the songs are levelled, see transition_window. Levels from the
+        transition window alone may clip louder parts of the streamed songs.
+
+    Returns:
+    --------
+    int
+        Number of samples written
+    """
+    window = transition_window(transition, path_1, path_2, sr, cache, levels, whole_track)
+    sr = window["sr"]
+    mixed = np.clip(window["mixed"], -1.0, 1.0)
+
+    with sf.SoundFile(output_path, 'w', samplerate=sr, channels=1) as output:
+        written = stream_frames(output, path_1, 0, window["mix_start"], sr, window["gain_1"], blocksize, cache)
+        output.write(mixed)
+        written += len(mixed)
+        written += stream_frames(output, path_2, window["consumed"], window["frames_2"], sr, window["gain_2"],
+                                 blocksize, cache)
+    return written
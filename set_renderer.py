@@ -0,0 +1,177 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from mixkernels import peak
+from pcm_cache import load_pcm
+from transitions import Transition, get_transition
+
+# Peak level of every track in the mix
+HEADROOM = 0.95
+
+
+def read_party_ranks(ranks_path, folder_path=None):
+    """
+    Read the play order from a party_ranks.txt file (ascending party score).
+
+    Parameters:
+    -----------
+    ranks_path : str
+        Path to party_ranks.txt
+    folder_path : str, optional
+        Folder of the songs; defaults to the 'playlist' folder next to the ranks file
+
+    Returns:
+    --------
+    list
+        Paths of the songs, least to most party-ready
+    """
+    if folder_path is None:
+        folder_path = os.path.join(os.path.dirname(ranks_path), "playlist")
+    paths = []
+    with open(ranks_path, encoding="utf-8") as file_in:
+        lines = file_in.read().splitlines()
+    # Song lines sit between the dashed rule and the blank line before the average
+    for line in lines[2:]:
+        if not line.strip():
+            break
+        name, _ = line.rsplit(": ", 1)
+        paths.append(os.path.join(folder_path, name))
+    return paths
+
+
+def decode_track(path, sr):
+    """
+    Decode a track as mono float32 audio at the mix sampling rate.
+
+    Tracks come from the PCM cache, so a track that was already decoded at
+    this rate is mapped instead of decoded again.
+    """
+    y, _ = load_pcm(path, sr=sr, mono=True)
+    return y
+
+
+def _track_gain(x):
+    level = peak(x)
+    return HEADROOM / level if level > 0 else 1.0
+
+
+def _resolve_transitions(transitions, paths):
+    # One strategy per boundary from a name, a Transition, or a list of either
+    boundaries = max(len(paths) - 1, 0)
+    if isinstance(transitions, (str, Transition)):
+        transitions = [transitions] * boundaries
+    if len(transitions) != boundaries:
+        raise ValueError(f"Expected {boundaries} transitions for {len(paths)} tracks, got {len(transitions)}.")
+
+    strategies = []
+    for index, transition in enumerate(transitions):
+        if transition == "beatmatch":
+            from transition_planner import beat_grid, plan_transition, plan_to_transition
+
+            plan = plan_transition(beat_grid(paths[index]), beat_grid(paths[index + 1]))
+            transition = plan_to_transition(plan)
+        elif isinstance(transition, str):
+            transition = get_transition(transition)
+        strategies.append(transition)
+    return strategies
+
+
+def _write_scaled(sink, x, gain, blocksize):
+    # Write gain * x in blocks, clipped to the valid range
+    buffer = np.empty(min(blocksize, len(x)), dtype=np.float32)
+    for start in range(0, len(x), blocksize):
+        block = buffer[:min(blocksize, len(x) - start)]
+        np.multiply(x[start:start + len(block)], gain, out=block, casting='unsafe')
+        np.clip(block, -1.0, 1.0, out=block)
+        sink.write(block)
+    return len(x)
+
+
+def render_set(paths, output_path, transitions="crossfade", sr=44100, blocksize=65536, progress=None):
+    """
+    Render a whole set of tracks with transitions into one file in a single pass.
+
+    Each track is decoded once, in a background thread that runs one track
+    ahead of the boundary being mixed and encoded. Audio is streamed into one
+    encoder, so at most three decoded tracks are held in memory whatever the
+    length of the set. Every track is peak-normalized to HEADROOM and the
+    mixed transitions are clipped to the valid range.
+
+    Parameters:
+    -----------
+    paths : list
+        Audio files in play order
+    output_path : str
+        Output file; the format follows the extension (wav, flac, ogg, mp3)
+    transitions : str, Transition or list, optional
+        Transition for every boundary, or one per boundary: a name from
+        transitions.TRANSITIONS, 'beatmatch' to plan it from the beat grids,
+        or a Transition instance
+    sr : int, optional
+        Sampling rate of the mix
+    blocksize : int, optional
+        Samples per write
+    progress : callable, optional
+        Called as progress(index, path) when a track starts playing
+
+    Returns:
+    --------
+    int
+        Number of samples written
+    """
+    if not paths:
+        raise ValueError("Cannot render an empty set.")
+    strategies = _resolve_transitions(transitions, paths)
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=1) as decoder, \
+            sf.SoundFile(output_path, 'w', samplerate=sr, channels=1) as output:
+        # The track after the next one decodes while the current boundary is mixed and encoded
+        x_next = decode_track(paths[0], sr)
+        gain_next = _track_gain(x_next)
+        upcoming = decoder.submit(decode_track, paths[1], sr) if len(paths) > 1 else None
+        start = 0  # First sample of the current track not yet written
+        for index, path in enumerate(paths):
+            x_current, gain_current = x_next, gain_next
+            if progress is not None:
+                progress(index, path)
+            if index + 1 == len(paths):
+                written += _write_scaled(output, x_current[start:], gain_current, blocksize)
+                break
+
+            x_next = upcoming.result()
+            gain_next = _track_gain(x_next)
+            if index + 2 < len(paths):
+                upcoming = decoder.submit(decode_track, paths[index + 2], sr)
+
+            strategy = strategies[index]
+            transition_point = max(strategy.transition_point(x_current, sr), start)
+            mix_start, mixed, consumed = strategy.window(x_current, x_next, sr, transition_point,
+                                                         gain_current, gain_next)
+            # Part of the window already played in the previous transition (very short tracks)
+            if mix_start < start:
+                mixed = mixed[start - mix_start:]
+                mix_start = start
+
+            written += _write_scaled(output, x_current[start:mix_start], gain_current, blocksize)
+            written += _write_scaled(output, mixed, 1.0, blocksize)
+            start = consumed
+            del x_current, mixed
+
+    return written
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python set_renderer.py party_ranks.txt output.mp3 [transition] [playlist_folder]")
+        sys.exit(1)
+    kind = sys.argv[3] if len(sys.argv) > 3 else "crossfade"
+    folder = sys.argv[4] if len(sys.argv) > 4 else None
+    set_paths = [path for path in read_party_ranks(sys.argv[1], folder) if os.path.exists(path)]
+    samples = render_set(set_paths, sys.argv[2], kind,
+                         progress=lambda index, path: print(f"[{index + 1}/{len(set_paths)}] {os.path.basename(path)}"))
+    print(f"Done! Wrote {samples / 44100:.1f}s of audio to '{sys.argv[2]}'")
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+from partyscore import ANALYSIS_SR, compute_features, compute_windowed_features, load_audio, score_from_features
+
+# Analysis settings compared against full decoding
+ANALYSIS_SETTINGS = [
+    {"sr": 22050, "window_duration": None},
+    {"sr": ANALYSIS_SR, "window_duration": None},
+    {"sr": ANALYSIS_SR, "window_duration": 60.0, "positions": (0.5, 0.7)},
+    {"sr": ANALYSIS_SR, "window_duration": 30.0, "positions": (0.5, 0.7)},
+    {"sr": ANALYSIS_SR, "window_duration": 15.0, "positions": (0.5, 0.7)},
+    {"sr": 8000, "window_duration": 30.0, "positions": (0.5,)},
+]
+
+
+# Rank correlation between two lists of scores
+def spearman_correlation(a, b):
+    """
+    Compute Spearman's rank correlation coefficient.
+
+    Args:
+        a (list): First list of values.
+        b (list): Second list of values.
+
+    Returns:
+        float: Correlation between -1 and 1 (nan for fewer than two values).
+    """
+    if len(a) < 2:
+        return float("nan")
+    rank_a = np.argsort(np.argsort(a))
+    rank_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+# Describe a settings dict in one short label
+def settings_label(settings):
+    window = settings.get("window_duration")
+    windows = "full" if window is None else f"{len(settings.get('positions', ()))}x{window:g}s"
+    return f"{settings['sr']} Hz, {windows}"
+
+
+# Compare the accuracy and speed of analysis settings against full decoding
+def accuracy_report(file_paths, settings_list=ANALYSIS_SETTINGS):
+    """
+    Measure how much each analysis setting speeds up scoring and how far it drifts.
+
+    The reference is load_audio + compute_features on the whole song at 22050 Hz.
+
+    Args:
+        file_paths (list): Audio files to analyze.
+        settings_list (list): Keyword arguments for compute_windowed_features.
+
+    Returns:
+        list: One dict per setting with the label, speedup, tempo error,
+        relative energy error, score error and rank correlation.
+    """
+    # Warm up librosa's JIT-compiled kernels so they don't count against the reference
+    if file_paths:
+        compute_features(*load_audio(file_paths[0], duration=5.0))
+
+    reference = []
+    reference_time = 0.0
+    for file_path in file_paths:
+        start = time.perf_counter()
+        y, sr = load_audio(file_path)
+        reference.append(compute_features(y, sr))
+        reference_time += time.perf_counter() - start
+
+    reference_scores = [score_from_features(f["tempo"], f["energy"]) for f in reference]
+    rows = []
+    for settings in settings_list:
+        elapsed = 0.0
+        features = []
+        for file_path in file_paths:
+            start = time.perf_counter()
+            features.append(compute_windowed_features(file_path, **settings))
+            elapsed += time.perf_counter() - start
+
+        scores = [score_from_features(f["tempo"], f["energy"]) for f in features]
+        rows.append({
+            "label": settings_label(settings),
+            "seconds": elapsed,
+            "speedup": reference_time / elapsed if elapsed > 0 else float("inf"),
+            "tempo_error": float(np.mean([abs(f["tempo"] - r["tempo"]) for f, r in zip(features, reference)])),
+            "energy_error": float(np.mean([abs(f["energy"] - r["energy"]) / r["energy"] if r["energy"] > 0 else 0.0
+                                           for f, r in zip(features, reference)])),
+            "score_error": float(np.mean(np.abs(np.subtract(scores, reference_scores)))),
+            "rank_correlation": spearman_correlation(scores, reference_scores),
+        })
+    return rows
+
+
+# Print a report table
+def print_report(rows):
+    print(f"{'Setting':<22}{'Time (s)':>10}{'Speedup':>9}{'Tempo err':>11}{'Energy err':>12}"
+          f"{'Score err':>11}{'Rank corr':>11}")
+    print("-" * 86)
+    for row in rows:
+        print(f"{row['label']:<22}{row['seconds']:>10.2f}{row['speedup']:>8.1f}x{row['tempo_error']:>10.2f} "
+              f"{row['energy_error']:>11.1%}{row['score_error']:>11.4f}{row['rank_correlation']:>11.3f}")
+
+
+if __name__ == "__main__":
+    playlist_folder = sys.argv[1] if len(sys.argv) > 1 else "./playlist"
+    mp3_files = sorted(f for f in os.listdir(playlist_folder) if f.lower().endswith('.mp3'))
+    if not mp3_files:
+        print(f"No MP3 files found in folder '{playlist_folder}'!")
+    else:
+        print(f"Comparing analysis settings on {len(mp3_files)} files...\n")
+        print_report(accuracy_report([os.path.join(playlist_folder, f) for f in mp3_files]))
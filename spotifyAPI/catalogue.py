@@ -0,0 +1,471 @@
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+# Default location of the catalogue, next to the playlist folder
+DEFAULT_CATALOGUE_PATH = "catalogue.db"
+
+# States of a track, in the order the download queue moves it through them
+STATUSES = ("pending", "searched", "downloaded", "tagged", "scored", "failed")
+
+# States in which the track's audio file is on disk
+LOCAL_STATUSES = ("downloaded", "tagged", "scored")
+
+# Columns filled from Spotify metadata; upserts only ever overwrite these
+METADATA_COLUMNS = ("name", "artist", "album", "duration_ms", "spotify_url", "album_art_url", "playlist")
+
+# Columns filled by the scorer
+FEATURE_COLUMNS = ("tempo", "energy", "centroid", "chroma", "features_version")
+
+# Columns filled from Spotify's audio features
+SPOTIFY_FEATURE_COLUMNS = ("danceability", "spotify_energy", "spotify_tempo")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    track_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    album TEXT,
+    duration_ms INTEGER,
+    spotify_url TEXT,
+    album_art_url TEXT,
+    playlist TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    source_url TEXT,
+    local_path TEXT,
+    error TEXT,
+    tempo REAL,
+    energy REAL,
+    centroid REAL,
+    chroma BLOB,
+    features_version TEXT,
+    danceability REAL,
+    spotify_energy REAL,
+    spotify_tempo REAL,
+    spotify_features_at REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist TEXT NOT NULL,
+    track_id TEXT NOT NULL,
+    PRIMARY KEY (playlist, track_id)
+);
+CREATE INDEX IF NOT EXISTS tracks_status ON tracks (status);
+CREATE INDEX IF NOT EXISTS tracks_playlist ON tracks (playlist);
+CREATE INDEX IF NOT EXISTS tracks_local_path ON tracks (local_path);
+"""
+
+# Columns added after the first release, created on catalogues that predate them
+MIGRATIONS = {
+    "source_url": "TEXT",
+    "error": "TEXT",
+    "danceability": "REAL",
+    "spotify_energy": "REAL",
+    "spotify_tempo": "REAL",
+    "spotify_features_at": "REAL",
+}
+
+
+# Get the Spotify track ID from a track URL
+def track_id_from_url(url):
+    """
+    Extract the track ID from a Spotify track URL.
+
+    Args:
+        url (str): URL such as https://open.spotify.com/track/<id>?si=...
+
+    Returns:
+        str: The track ID.
+    """
+    return url.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0]
+
+
+# Convert a Spotify API track object into a catalogue row
+def track_row(track, playlist=None):
+    """
+    Pick the catalogue metadata out of a Spotify track object.
+
+    Args:
+        track (dict): Track object from the Spotify API (or a playlist item holding one).
+        playlist (str): Name of the playlist the track came from (optional).
+
+    Returns:
+        dict: Row with track_id and the metadata columns, or None for local-only tracks.
+    """
+    track = track.get("track", track)
+    try:
+        images = track["album"].get("images") or [{}]
+        return {
+            "track_id": track["id"] or track_id_from_url(track["external_urls"]["spotify"]),
+            "name": track["name"],
+            "artist": track["artists"][0]["name"],
+            "album": track["album"].get("name"),
+            "duration_ms": track.get("duration_ms"),
+            "spotify_url": track["external_urls"]["spotify"],
+            "album_art_url": images[0].get("url"),
+            "playlist": playlist,
+        }
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class Catalogue:
+    """
+    SQLite store of every known track, indexed by Spotify track ID.
+
+    One row holds a track's metadata, its download status and local file,
+    and the audio features the scorer computed for it, so the downloader and
+    the scorer share one store instead of reparsing playlist text files.
+    A catalogue can be shared between threads; its calls are serialised.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOGUE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Add the columns older catalogues are missing
+        existing = {row["name"] for row in self.connection.execute("PRAGMA table_info(tracks)")}
+        with self._lock, self.connection:
+            for column, kind in MIGRATIONS.items():
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE tracks ADD COLUMN {column} {kind}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self.connection.close()
+
+    def upsert_tracks(self, rows):
+        """
+        Insert tracks, or refresh the metadata of tracks that are already known.
+
+        Download status, local path and features of existing tracks are kept, as
+        are stored metadata values the new row leaves out. A track that appears
+        in several playlists is stored once and listed under each of them.
+
+        Args:
+            rows (iterable): Rows as returned by track_row (None entries are skipped).
+
+        Returns:
+            int: Number of rows written.
+        """
+        rows = [row for row in rows if row is not None]
+        columns = ("track_id",) + METADATA_COLUMNS
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in METADATA_COLUMNS)
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO tracks ({', '.join(columns)}, updated_at) "
+                f"VALUES ({', '.join('?' * len(columns))}, ?) "
+                f"ON CONFLICT (track_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                [tuple(row.get(column) for column in columns) + (time.time(),) for row in rows],
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO playlist_tracks (playlist, track_id) VALUES (?, ?)",
+                [(row["playlist"], row["track_id"]) for row in rows if row.get("playlist")],
+            )
+        return len(rows)
+
+    def set_status(self, track_id, status, local_path=None, source_url=None, error=None):
+        """
+        Record the download status (and file) of a track.
+
+        Args:
+            track_id (str): Spotify track ID.
+            status (str): One of STATUSES.
+            local_path (str): Path of the downloaded file (optional, kept if None).
+            source_url (str): URL the audio is downloaded from (optional, kept if None).
+            error (str): Why the track failed (optional, cleared if None).
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status '{status}', expected one of {STATUSES}")
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE tracks SET status = ?, local_path = COALESCE(?, local_path), "
+                "source_url = COALESCE(?, source_url), error = ?, updated_at = ? WHERE track_id = ?",
+                (status, local_path, source_url, error, time.time(), track_id),
+            )
+
+    def upsert_features(self, rows, version=""):
+        """
+        Store the audio features of many tracks at once.
+
+        Tracks whose audio is on disk move to the 'scored' status.
+
+        Args:
+            rows (iterable): (track_id, features) pairs, features as returned by get_song_features.
+            version (str): Feature extractor version the features were computed with.
+
+        Returns:
+            int: Number of rows written.
+        """
+        values = []
+        for track_id, features in rows:
+            chroma = features.get("chroma")
+            values.append((
+                float(features["tempo"]),
+                float(features["energy"]),
+                float(features["centroid"]) if "centroid" in features else None,
+                None if chroma is None else np.asarray(chroma, dtype=np.float32).tobytes(),
+                version,
+                time.time(),
+                track_id,
+            ))
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "UPDATE tracks SET tempo = ?, energy = ?, centroid = ?, chroma = ?, features_version = ?, "
+                "status = CASE WHEN status IN ('downloaded', 'tagged') THEN 'scored' ELSE status END, "
+                "updated_at = ? WHERE track_id = ?",
+                values,
+            )
+        return len(values)
+
+    def upsert_spotify_features(self, audio_features):
+        """
+        Store Spotify's audio features of many tracks at once.
+
+        Args:
+            audio_features (iterable): Audio feature objects from the Spotify API (None entries are skipped).
+
+        Returns:
+            int: Number of rows written.
+        """
+        now = time.time()
+        values = [
+            (features["danceability"], features["energy"], features["tempo"], now, now, features["id"])
+            for features in audio_features if features is not None
+        ]
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "UPDATE tracks SET danceability = ?, spotify_energy = ?, spotify_tempo = ?, "
+                "spotify_features_at = ?, updated_at = ? WHERE track_id = ?",
+                values,
+            )
+        return len(values)
+
+    def mark_spotify_features_fetched(self, track_ids):
+        """
+        Record that Spotify was asked for the audio features of these tracks.
+
+        Tracks Spotify has no features for keep NULL features, and the mark
+        keeps missing_spotify_features from asking for them on every sync.
+
+        Args:
+            track_ids (iterable): Spotify track IDs.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "UPDATE tracks SET spotify_features_at = ? WHERE track_id = ?",
+                [(now, track_id) for track_id in track_ids],
+            )
+
+    def get(self, track_id):
+        """
+        Get one track.
+
+        Args:
+            track_id (str): Spotify track ID.
+
+        Returns:
+            dict: The track's row, or None if it is unknown.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT * FROM tracks WHERE track_id = ?", (track_id,)).fetchone()
+        return None if row is None else _row_dict(row)
+
+    def tracks(self, status=None, playlist=None):
+        """
+        List tracks, optionally filtered by status and playlist.
+
+        Args:
+            status (str): Only tracks with this status (optional).
+            playlist (str): Only tracks of this playlist (optional).
+
+        Returns:
+            list: Track rows as dictionaries, in insertion order.
+        """
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if playlist is not None:
+            conditions.append("track_id IN (SELECT track_id FROM playlist_tracks WHERE playlist = ?)")
+            params.append(playlist)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self.connection.execute(f"SELECT * FROM tracks{where} ORDER BY rowid", params).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def missing_features(self, version=""):
+        """
+        Downloaded tracks whose features are missing or from another extractor version.
+
+        Args:
+            version (str): Current feature extractor version.
+
+        Returns:
+            list: Track rows as dictionaries.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT * FROM tracks WHERE status IN ({', '.join('?' * len(LOCAL_STATUSES))}) "
+                "AND local_path IS NOT NULL AND (features_version IS NULL OR features_version != ?) ORDER BY rowid",
+                LOCAL_STATUSES + (version,),
+            ).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def missing_spotify_features(self, retry_after=None):
+        """
+        IDs of the tracks that have no Spotify audio features yet.
+
+        Tracks Spotify already returned no features for are left out.
+
+        Args:
+            retry_after (float): Ask again for tracks that had no features this many seconds ago
+                (optional, None never asks again).
+
+        Returns:
+            list: Spotify track IDs.
+        """
+        query = "SELECT track_id FROM tracks WHERE danceability IS NULL AND (spotify_features_at IS NULL"
+        params = ()
+        if retry_after is not None:
+            query += " OR spotify_features_at < ?"
+            params = (time.time() - retry_after,)
+        with self._lock:
+            rows = self.connection.execute(query + ") ORDER BY rowid", params).fetchall()
+        return [row["track_id"] for row in rows]
+
+    def feature_columns(self, version=None):
+        """
+        Tempo and energy of every scored track as NumPy columns.
+
+        Args:
+            version (str): Only features from this extractor version (optional).
+
+        Returns:
+            tuple: (track IDs, names as "artist - name", tempo array, energy array).
+        """
+        query = "SELECT track_id, artist, name, tempo, energy FROM tracks WHERE tempo IS NOT NULL"
+        params = ()
+        if version is not None:
+            query += " AND features_version = ?"
+            params = (version,)
+        with self._lock:
+            rows = self.connection.execute(query + " ORDER BY rowid", params).fetchall()
+        return (
+            [row["track_id"] for row in rows],
+            [f"{row['artist']} - {row['name']}" for row in rows],
+            np.array([row["tempo"] for row in rows], dtype=np.float64),
+            np.array([row["energy"] for row in rows], dtype=np.float64),
+        )
+
+    def ranking_columns(self, version=None):
+        """
+        Everything the hybrid ranking needs, as NumPy columns with NaN for missing values.
+
+        Args:
+            version (str): Audio features from another extractor version count as missing (optional).
+
+        Returns:
+            dict: 'track_ids', 'names' ("artist - name") and 'local_paths' lists, and 'tempo',
+                'energy', 'duration_ms', 'danceability', 'spotify_energy' and 'spotify_tempo' arrays.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT track_id, artist, name, local_path, tempo, energy, features_version, duration_ms, "
+                "danceability, spotify_energy, spotify_tempo FROM tracks ORDER BY rowid"
+            ).fetchall()
+        current = [version is None or row["features_version"] == version for row in rows]
+
+        def column(name, keep=None):
+            return np.array([
+                np.nan if row[name] is None or (keep is not None and not keep[i]) else row[name]
+                for i, row in enumerate(rows)
+            ], dtype=np.float64)
+
+        return {
+            "track_ids": [row["track_id"] for row in rows],
+            "names": [f"{row['artist']} - {row['name']}" for row in rows],
+            "local_paths": [row["local_path"] for row in rows],
+            "tempo": column("tempo", current),
+            "energy": column("energy", current),
+            "duration_ms": column("duration_ms"),
+            "danceability": column("danceability"),
+            "spotify_energy": column("spotify_energy"),
+            "spotify_tempo": column("spotify_tempo"),
+        }
+
+
+def _row_dict(row):
+    track = dict(row)
+    if track.get("chroma") is not None:
+        track["chroma"] = np.frombuffer(track["chroma"], dtype=np.float32)
+    return track
+
+
+# Score every downloaded track whose features are missing or outdated
+def sync_features(catalogue, cache=None, analysis=None):
+    """
+    Compute and store features for downloaded tracks that don't have current ones.
+
+    Args:
+        catalogue (Catalogue): The track catalogue.
+        cache (FeatureCache): Feature cache used to skip decoding unchanged files (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
+
+    Returns:
+        int: Number of tracks whose features were stored.
+    """
+    from partyscore import FEATURE_EXTRACTOR_VERSION, get_song_features
+
+    rows = []
+    for track in catalogue.missing_features(FEATURE_EXTRACTOR_VERSION):
+        if not os.path.exists(track["local_path"]):
+            print(f"Missing file for {track['artist']} - {track['name']}: {track['local_path']}")
+            continue
+        try:
+            rows.append((track["track_id"], get_song_features(track["local_path"], cache, analysis)))
+        except Exception as e:
+            print(f"Error processing {track['local_path']}: {e}")
+    return catalogue.upsert_features(rows, FEATURE_EXTRACTOR_VERSION)
+
+
+# Fetch Spotify's audio features for every track that doesn't have them yet
+def sync_spotify_features(catalogue, client, retry_after=None):
+    """
+    Store Spotify's danceability, energy and tempo for tracks that are missing them.
+
+    Args:
+        catalogue (Catalogue): The track catalogue.
+        client (SpotifyClient): Client used to fetch the audio features (in batches of 100).
+        retry_after (float): Ask again for tracks Spotify had no features for this many
+            seconds ago, see Catalogue.missing_spotify_features (optional).
+
+    Returns:
+        int: Number of tracks whose features were stored.
+    """
+    track_ids = catalogue.missing_spotify_features(retry_after)
+    audio_features = client.audio_features(track_ids)
+    catalogue.mark_spotify_features_fetched(track_ids)
+    return catalogue.upsert_spotify_features(audio_features)
@@ -0,0 +1,278 @@
+import os
+import re
+from catalogue import LOCAL_STATUSES
+
+
+# Characters that are not allowed in file names on common filesystems
+UNSAFE_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+# Number of YouTube searches before a track is given up on
+SEARCH_ATTEMPTS = 10
+
+
+# File name of a track's audio, stable across runs so partial downloads can be resumed
+def track_filename(track, extension=".mp3"):
+    """
+    Build the file name of a track from its artist and name.
+
+    Args:
+        track (dict): Catalogue row with 'artist' and 'name'.
+        extension (str): File extension, including the dot.
+
+    Returns:
+        str: File name such as "Artist - Name.mp3".
+    """
+    name = UNSAFE_CHARACTERS.sub("_", f"{track['artist']} - {track['name']}").strip(" .")
+    return (name or track["track_id"]) + extension
+
+
+# Default search backend: first YouTube result for the query
+def youtube_search(query, attempts=SEARCH_ATTEMPTS):
+    """
+    Search YouTube for a track.
+
+    Args:
+        query (str): Search text, e.g. "artist - name".
+        attempts (int): Number of searches before giving up.
+
+    Returns:
+        str: URL of the best result, or None if nothing was found.
+    """
+    from youtube_search import YoutubeSearch
+
+    attempts_left = attempts
+    while attempts_left > 0:
+        try:
+            results_list = YoutubeSearch(query, max_results=1).to_dict()
+            return "https://www.youtube.com{}".format(results_list[0]['url_suffix'])
+        except IndexError:
+            attempts_left -= 1
+            print("No valid URLs found for {}, trying again ({} attempts left).".format(query, attempts_left))
+    return None
+
+
+# Default download backend: yt-dlp, converted to mp3
+def yt_dlp_download(url, output_path):
+    """
+    Download the audio of a video as an mp3 file.
+
+    The output template has no extension of its own, so the mp3 converter
+    writes exactly output_path (no more "*.mp3.mp3" files). yt-dlp keeps
+    unfinished downloads as ".part" files next to it and continues them when
+    the same track is downloaded again.
+
+    Args:
+        url (str): Video URL.
+        output_path (str): Path of the mp3 file to write.
+
+    Returns:
+        str: Path of the downloaded file.
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.splitext(output_path)[0] + '.%(ext)s',
+        'continuedl': True,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }, {
+            'key': 'FFmpegMetadata',
+        }]
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    return output_path
+
+
+# Default tag backend: ID3 title, artist and album
+def id3_tag(path, track):
+    """
+    Write the track's metadata into the ID3 tags of an mp3 file.
+
+    Args:
+        path (str): Path of the mp3 file.
+        track (dict): Catalogue row with 'name', 'artist' and 'album'.
+    """
+    from mutagen.mp3 import MP3
+    from mutagen.id3 import ID3, TIT2, TPE1, TALB, error
+
+    audio = MP3(path, ID3=ID3)
+    try:
+        audio.add_tags()
+    except error:
+        pass
+    audio.tags.add(TIT2(encoding=3, text=track["name"]))
+    audio.tags.add(TPE1(encoding=3, text=track["artist"]))
+    if track.get("album"):
+        audio.tags.add(TALB(encoding=3, text=track["album"]))
+    audio.save()
+
+
+class DownloadQueue:
+    """
+    Persistent, resumable download queue on top of the track catalogue.
+
+    Each track moves through pending -> searched -> downloaded -> tagged
+    (-> scored, if a scorer is given), and every step is recorded in the
+    catalogue as soon as it is done. A later run picks each track up where
+    it stopped: found URLs are not searched again, audio that is already on
+    disk is not downloaded again, and tracks are keyed by Spotify track ID,
+    so a song shared by several playlists is fetched once.
+
+    The search, download, tag and score steps are plain callables, so they
+    can be replaced (e.g. by stubs that never touch the network).
+    """
+
+    def __init__(self, catalogue, folder=".", search=youtube_search, download=yt_dlp_download, tag=id3_tag,
+                 score=None, feature_version=""):
+        """
+        Args:
+            catalogue (Catalogue): Catalogue holding the tracks and their states.
+            folder (str): Folder the audio files are written to.
+            search (callable): search(query) -> source URL, or None if nothing was found.
+            download (callable): download(url, output_path) -> path of the written file.
+            tag (callable): tag(path, track) writes the track's metadata (None skips tagging).
+            score (callable): score(path) -> features dict (None stops at 'tagged').
+            feature_version (str): Version stored with the features from score.
+        """
+        self.catalogue = catalogue
+        self.folder = folder
+        self.search = search
+        self.download = download
+        self.tag = tag
+        self.score = score
+        self.feature_version = feature_version
+
+    # Add tracks to the queue
+    def enqueue(self, rows):
+        """
+        Add tracks (or refresh their metadata), keeping the state of known tracks.
+
+        Args:
+            rows (iterable): Rows as returned by track_row.
+
+        Returns:
+            int: Number of rows written.
+        """
+        return self.catalogue.upsert_tracks(rows)
+
+    def output_path(self, track):
+        """
+        Path the audio of a track is downloaded to.
+        """
+        return os.path.abspath(os.path.join(self.folder, track_filename(track)))
+
+    # Tracks that still have a step to run
+    def pending(self, playlist=None, track_ids=None, retry_failed=True):
+        """
+        List the tracks the queue still has work for.
+
+        Args:
+            playlist (str): Only tracks of this playlist (optional).
+            track_ids (iterable): Only these tracks (optional).
+            retry_failed (bool): Include tracks that failed before.
+
+        Returns:
+            list: Track rows as dictionaries.
+        """
+        done = "scored" if self.score is not None else "tagged"
+        tracks = self.catalogue.tracks(playlist=playlist)
+        if track_ids is not None:
+            track_ids = set(track_ids)
+            tracks = [track for track in tracks if track["track_id"] in track_ids]
+        return [
+            track for track in tracks
+            if (track["status"] != "failed" or retry_failed) and not (
+                track["status"] in (done, "scored") and track["local_path"] and os.path.exists(track["local_path"])
+            )
+        ]
+
+    def _stage(self, track):
+        # Step the track is really at given what is on disk, and the path of its audio
+        status, local_path = track["status"], track["local_path"]
+        if status in LOCAL_STATUSES and local_path and os.path.exists(local_path):
+            return status, local_path
+        path = self.output_path(track)
+        if os.path.exists(path):
+            return "downloaded", path
+        return ("searched" if track["source_url"] else "pending"), path
+
+    # Run the remaining steps of one track
+    def process(self, track, counts=None):
+        """
+        Move one track through its remaining steps, recording each one.
+
+        Args:
+            track (dict): Catalogue row of the track.
+            counts (dict): Number of times each step ran, updated in place (optional).
+
+        Returns:
+            str: The track's final status.
+        """
+        counts = {} if counts is None else counts
+        track_id = track["track_id"]
+        query = f"{track['artist']} - {track['name']}"
+        stage, path = self._stage(track)
+        try:
+            if stage == "pending":
+                url = self.search(query)
+                counts["searched"] = counts.get("searched", 0) + 1
+                if url is None:
+                    print("No valid URLs found for {}, skipping track.".format(query))
+                    self.catalogue.set_status(track_id, "failed", error="no search results")
+                    return "failed"
+                track["source_url"] = url
+                stage = "searched"
+                self.catalogue.set_status(track_id, stage, source_url=url)
+
+            if stage == "searched":
+                print("Initiating download for {}.".format(query))
+                path = self.download(track["source_url"], path) or path
+                counts["downloaded"] = counts.get("downloaded", 0) + 1
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"download did not produce {path}")
+                stage = "downloaded"
+                self.catalogue.set_status(track_id, stage, local_path=path)
+            elif stage == "downloaded" and track["local_path"] != path:
+                # Audio that was already on disk
+                self.catalogue.set_status(track_id, stage, local_path=path)
+
+            if stage == "downloaded":
+                if self.tag is not None:
+                    self.tag(path, track)
+                    counts["tagged"] = counts.get("tagged", 0) + 1
+                stage = "tagged"
+                self.catalogue.set_status(track_id, stage)
+
+            if stage == "tagged" and self.score is not None:
+                features = self.score(path)
+                counts["scored"] = counts.get("scored", 0) + 1
+                self.catalogue.upsert_features([(track_id, features)], self.feature_version)
+                stage = "scored"
+        except Exception as e:
+            print(f"Error processing {query}: {e}")
+            self.catalogue.set_status(track_id, "failed", error=str(e))
+            return "failed"
+        return stage
+
+    # Work through the queue
+    def run(self, playlist=None, track_ids=None, retry_failed=True):
+        """
+        Process every track that still has a step to run.
+
+        Args:
+            playlist (str): Only tracks of this playlist (optional).
+            track_ids (iterable): Only these tracks (optional).
+            retry_failed (bool): Retry tracks that failed before.
+
+        Returns:
+            dict: Number of searches, downloads, taggings and scorings done, and of failed tracks.
+        """
+        counts = {"searched": 0, "downloaded": 0, "tagged": 0, "scored": 0, "failed": 0}
+        for track in self.pending(playlist, track_ids, retry_failed):
+            if self.process(track, counts) == "failed":
+                counts["failed"] += 1
+        return counts
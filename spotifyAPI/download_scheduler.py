@@ -0,0 +1,227 @@
+import copy
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+
+# Threads searching and downloading, and concurrent requests allowed per host
+DEFAULT_WORKERS = 8
+DEFAULT_HOST_LIMIT = 4
+
+# Host the search backend talks to
+SEARCH_HOST = "www.youtube.com"
+
+# Bytes copied at a time by http_fetch
+CHUNK_SIZE = 1 << 16
+
+
+# Fetch backend: download the best audio stream as-is, leaving transcoding to the scheduler
+def yt_dlp_fetch(url, output_path):
+    """
+    Download the best audio stream of a video without converting it.
+
+    yt-dlp keeps unfinished downloads as ".part" files and continues them
+    when the same track is fetched again.
+
+    Args:
+        url (str): Video URL.
+        output_path (str): Path of the final mp3; the stream is written next to it with its own extension.
+
+    Returns:
+        str: Path of the downloaded stream.
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.splitext(output_path)[0] + '.%(ext)s',
+        'continuedl': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info_dict = ydl.extract_info(url, download=True)
+        return ydl.prepare_filename(info_dict)
+
+
+# Fetch backend for plain HTTP sources
+def http_fetch(url, output_path):
+    """
+    Download a file over HTTP, resuming an unfinished ".part" file with a Range request.
+
+    Args:
+        url (str): File URL.
+        output_path (str): Path to write.
+
+    Returns:
+        str: output_path.
+    """
+    part_path = output_path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    request = urllib.request.Request(url, headers={"Range": f"bytes={offset}-"} if offset else {})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            # A server that ignores the range sends the whole file again
+            with open(part_path, "ab" if response.status == 206 else "wb") as file_out:
+                shutil.copyfileobj(response, file_out, CHUNK_SIZE)
+    except urllib.error.HTTPError as e:
+        # 416: the part file already holds the whole file
+        if e.code != 416:
+            raise
+    os.replace(part_path, output_path)
+    return output_path
+
+
+# Transcode backend, run in the scheduler's process pool
+def ffmpeg_transcode(source_path, output_path, bitrate="192k"):
+    """
+    Convert an audio file to mp3 with ffmpeg.
+
+    Args:
+        source_path (str): Downloaded audio stream.
+        output_path (str): Path of the mp3 file to write.
+        bitrate (str): mp3 bitrate.
+
+    Returns:
+        str: output_path.
+    """
+    temporary_path = output_path + ".transcoding"
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", source_path, "-vn",
+         "-codec:a", "libmp3lame", "-b:a", bitrate, "-f", "mp3", temporary_path],
+        check=True,
+    )
+    os.replace(temporary_path, output_path)
+    return output_path
+
+
+# Print one line per finished track
+def print_progress(done, total, track, status):
+    print(f"[{done}/{total}] {track['artist']} - {track['name']}: {status}")
+
+
+class DownloadScheduler:
+    """
+    Run a DownloadQueue with many tracks in flight at once.
+
+    Searching and downloading wait on the network, so they run on a thread
+    pool; every idle thread takes the next track from one shared queue, so
+    a slow track never holds up a fixed share of the playlist. Requests are
+    also capped per host, so one site sees at most its limit of concurrent
+    connections however many threads there are. Transcoding is the only
+    CPU-bound step and runs on a separate, small process pool.
+
+    The queue still records every step in the catalogue, so an interrupted
+    run resumes where it stopped.
+    """
+
+    def __init__(self, queue, workers=DEFAULT_WORKERS, host_limits=None, default_host_limit=DEFAULT_HOST_LIMIT,
+                 search_host=SEARCH_HOST, fetch=yt_dlp_fetch, transcode=ffmpeg_transcode, transcode_workers=2,
+                 progress=None):
+        """
+        Args:
+            queue (DownloadQueue): Queue whose search, tag and score backends are used.
+            workers (int): Number of threads searching and downloading.
+            host_limits (dict): Maximum concurrent requests per host name.
+            default_host_limit (int): Maximum concurrent requests to any other host.
+            search_host (str): Host the search backend talks to.
+            fetch (callable): fetch(url, output_path) -> path of the downloaded stream.
+                None downloads with the queue's own download backend instead.
+            transcode (callable): transcode(source_path, output_path) converting the stream
+                to mp3 in a worker process; must be picklable. None keeps the stream as-is.
+            transcode_workers (int): Number of transcoding processes.
+            progress (callable): Called as progress(done, total, track, status) when a track finishes.
+        """
+        self.queue = queue
+        self.workers = workers
+        self.host_limits = dict(host_limits or {})
+        self.default_host_limit = default_host_limit
+        self.search_host = search_host
+        self.fetch = fetch
+        self.transcode = transcode
+        self.transcode_workers = transcode_workers
+        self.progress = progress
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        self._transcoder = None
+
+        # The queue's steps, with searching and downloading routed through the scheduler
+        self._queue = copy.copy(queue)
+        self._queue.search = self._search
+        self._queue.download = self._download
+
+    def _host_slot(self, host):
+        # Semaphore limiting concurrent requests to one host
+        with self._slots_lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.host_limits.get(host, self.default_host_limit))
+            return self._slots[host]
+
+    def _search(self, query):
+        with self._host_slot(self.search_host):
+            return self.queue.search(query)
+
+    def _download(self, url, output_path):
+        host = urlparse(url).netloc
+        if self.fetch is None:
+            with self._host_slot(host):
+                return self.queue.download(url, output_path)
+
+        with self._host_slot(host):
+            source_path = self.fetch(url, output_path)
+        if source_path == output_path:
+            return output_path
+        if self.transcode is None:
+            os.replace(source_path, output_path)
+        else:
+            self._transcoder.submit(self.transcode, source_path, output_path).result()
+            os.remove(source_path)
+        return output_path
+
+    def _process(self, track):
+        # Per-track counts, merged on the calling thread
+        counts = {}
+        return self._queue.process(track, counts), counts
+
+    # Work through the queue
+    def run(self, playlist=None, track_ids=None, retry_failed=True):
+        """
+        Process every track that still has a step to run, many at a time.
+
+        Args:
+            playlist (str): Only tracks of this playlist (optional).
+            track_ids (iterable): Only these tracks (optional).
+            retry_failed (bool): Retry tracks that failed before.
+
+        Returns:
+            dict: Number of searches, downloads, taggings and scorings done, and of failed tracks.
+        """
+        counts = {"searched": 0, "downloaded": 0, "tagged": 0, "scored": 0, "failed": 0}
+        tracks = self.queue.pending(playlist, track_ids, retry_failed)
+        if not tracks:
+            return counts
+
+        # Spawned rather than forked: the pool starts while download threads are running
+        if self.fetch is not None and self.transcode is not None:
+            context = multiprocessing.get_context("spawn")
+            self._transcoder = ProcessPoolExecutor(self.transcode_workers, mp_context=context)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as threads:
+                futures = {threads.submit(self._process, track): track for track in tracks}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    status, track_counts = future.result()
+                    for step, count in track_counts.items():
+                        counts[step] = counts.get(step, 0) + count
+                    if status == "failed":
+                        counts["failed"] += 1
+                    if self.progress is not None:
+                        self.progress(done, len(tracks), futures[future], status)
+        finally:
+            if self._transcoder is not None:
+                self._transcoder.shutdown()
+                self._transcoder = None
+        return counts
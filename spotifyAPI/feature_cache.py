@@ -0,0 +1,199 @@
+import hashlib
+import inspect
+import os
+import tempfile
+
+import numpy as np
+
+# Default location of the on-disk cache, next to the playlist folder
+DEFAULT_CACHE_DIR = ".feature_cache"
+
+# Default size budget for the cache (256 MB)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Build a version stamp for a set of feature extractor functions
+def source_fingerprint(*functions, version=1):
+    """
+    Hash the source code of the feature extractor functions.
+
+    Any edit to one of the functions changes the fingerprint, so cached
+    features computed by an older implementation are never reused.
+
+    Args:
+        *functions (callable): Functions whose source determines the features.
+        version (int): Manual version number, bump it to force invalidation.
+
+    Returns:
+        str: Hex digest identifying the extractor version.
+    """
+    digest = hashlib.sha1(str(version).encode("utf-8"))
+    for function in functions:
+        try:
+            digest.update(inspect.getsource(function).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(function.__qualname__.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    On-disk cache of per-track audio features.
+
+    Entries are keyed by (absolute path, size, mtime) and the extractor
+    version, and stored as one ``.npz`` file per track. When the total size
+    goes over ``max_bytes`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, version=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = version
+        self._total_bytes = None
+
+    # Compute the cache key of an audio file
+    def key(self, filename, **params):
+        """
+        Build the cache key for an audio file.
+
+        Args:
+            filename (str): Path to the audio file.
+            **params: Extra settings that change the features (e.g. sample rate).
+
+        Returns:
+            str: Hex digest used as the entry file name.
+        """
+        stat = os.stat(filename)
+        parts = [self.version, os.path.abspath(filename), str(stat.st_size), str(stat.st_mtime_ns)]
+        parts += [f"{name}={params[name]}" for name in sorted(params)]
+        return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    # Look up cached features
+    def get(self, filename, **params):
+        """
+        Return the cached features of an audio file.
+
+        Args:
+            filename (str): Path to the audio file.
+            **params: Extra settings that were used to compute the features.
+
+        Returns:
+            dict: Feature values by name, or None if the file is not cached.
+        """
+        try:
+            entry_path = self._entry_path(self.key(filename, **params))
+            with np.load(entry_path) as entry:
+                # Scalars were saved as 0-d arrays, hand them back as plain numbers
+                features = {name: entry[name].item() if entry[name].ndim == 0 else entry[name]
+                            for name in entry.files}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark the entry as recently used for eviction
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return features
+
+    # Store features in the cache
+    def put(self, filename, features, **params):
+        """
+        Store the features of an audio file.
+
+        Args:
+            filename (str): Path to the audio file.
+            features (dict): Feature values by name (scalars or arrays).
+            **params: Extra settings that were used to compute the features.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(self.key(filename, **params))
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file_out:
+                np.savez(file_out, **{name: np.asarray(value) for name, value in features.items()})
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if self._total_bytes is not None:
+            self._total_bytes += os.path.getsize(entry_path)
+        if self.total_bytes() > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    # Total size of the cache on disk
+    def total_bytes(self):
+        """
+        Return the total size of the cache entries in bytes.
+
+        Returns:
+            int: Size in bytes.
+        """
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    # Drop least recently used entries until the cache fits its budget
+    def evict(self, max_bytes=None):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+
+        Args:
+            max_bytes (int): Size budget, defaults to the cache's max_bytes.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, name in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        return removed
+
+    # Remove every entry
+    def clear(self):
+        """
+        Remove every entry from the cache.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        return self.evict(max_bytes=0)
+
+
+if __name__ == "__main__":
+    removed = FeatureCache().clear()
+    print(f"Removed {removed} cached feature entries.")
@@ -0,0 +1,266 @@
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from catalogue import Catalogue, DEFAULT_CATALOGUE_PATH
+from partyscore import FEATURE_EXTRACTOR_VERSION, get_song_features, default_feature_cache
+from ranking import TrackTable, top_k
+
+
+# Multiple of the calibration's residual standard deviation a metadata estimate may be off by
+DEFAULT_MARGIN_SCALE = 3.0
+
+# Tracks with both audio and Spotify features needed to calibrate the metadata estimate
+DEFAULT_CALIBRATION_SIZE = 16
+
+
+# Regressors of the metadata estimate
+def metadata_design(danceability, spotify_energy, spotify_tempo, duration_ms):
+    """
+    Build the design matrix of the metadata estimate.
+
+    Our energy feature is summed over frames, so it grows with the track's
+    length: the duration enters on its own and scaled by Spotify's energy.
+
+    Args:
+        danceability (ndarray): Spotify danceability per track (0-1).
+        spotify_energy (ndarray): Spotify energy per track (0-1).
+        spotify_tempo (ndarray): Spotify tempo per track in beats per minute.
+        duration_ms (ndarray): Track length in milliseconds.
+
+    Returns:
+        ndarray: Matrix of shape (N, 6): a constant, danceability, energy, the tempo
+            scaled like score_from_features, the duration in minutes and the duration
+            times energy. Rows of tracks without metadata hold NaN.
+    """
+    danceability = np.asarray(danceability, dtype=np.float64)
+    spotify_energy = np.asarray(spotify_energy, dtype=np.float64)
+    minutes = np.asarray(duration_ms, dtype=np.float64) / 60000.0
+    return np.column_stack([
+        np.ones(len(danceability)),
+        danceability,
+        spotify_energy,
+        (np.asarray(spotify_tempo, dtype=np.float64) - 60.0) / 140.0,
+        minutes,
+        minutes * spotify_energy,
+    ])
+
+
+# Least-squares fit of audio scores on metadata
+def fit_calibration(design, scores):
+    """
+    Fit the metadata estimate to tracks whose audio scores are known.
+
+    Args:
+        design (ndarray): Metadata design matrix of those tracks.
+        scores (ndarray): Their party scores from audio.
+
+    Returns:
+        tuple: (coefficients, residual standard deviation).
+    """
+    coefficients, *_ = np.linalg.lstsq(design, scores, rcond=None)
+    residuals = scores - design @ coefficients
+    degrees_of_freedom = max(len(scores) - design.shape[1], 1)
+    return coefficients, float(np.sqrt(residuals @ residuals / degrees_of_freedom))
+
+
+# Estimated tracks whose position relative to the top-k cut isn't settled
+def boundary_tracks(lower, upper, estimated, k, exact_top=True):
+    """
+    Find the estimated tracks that need an exact score to settle the top k.
+
+    Args:
+        lower (ndarray): Lowest possible score per track (higher is better).
+        upper (ndarray): Highest possible score per track.
+        estimated (ndarray): Whether each track's score is only an estimate.
+        k (int): Size of the top.
+        exact_top (bool): Also refine estimated tracks that are certainly in the top k,
+            so the top is reported with exact scores and in exact order.
+
+    Returns:
+        ndarray: Boolean mask of the tracks to score exactly.
+    """
+    count = len(lower)
+    if count <= k:
+        return estimated if exact_top else np.zeros(count, dtype=bool)
+
+    # Tracks that can't reach the k-th best lower bound are certainly out
+    cut_in = np.partition(lower, count - k)[count - k]
+    candidates = estimated & (upper >= cut_in)
+    if exact_top:
+        return candidates
+
+    # Tracks beating the (k+1)-th best upper bound are certainly in
+    cut_out = np.partition(upper, count - k - 1)[count - k - 1]
+    return candidates & (lower < cut_out)
+
+
+# Top k from a mix of exact scores and calibrated metadata estimates
+def hybrid_top_k(exact_scores, design, k, refine, largest=True, margin_scale=DEFAULT_MARGIN_SCALE,
+                 calibration_size=DEFAULT_CALIBRATION_SIZE, exact_top=True):
+    """
+    Rank tracks, computing exact scores only where they can change the top k.
+
+    Tracks without metadata are always scored exactly. The rest get a
+    metadata estimate calibrated on tracks that have both; if too few do, a
+    spread of tracks is scored exactly first. Each estimate is trusted to
+    within margin_scale residual standard deviations, and only the estimated
+    tracks whose interval reaches the top-k cut are scored exactly, round by
+    round, until the top k is settled.
+
+    Args:
+        exact_scores (ndarray): Known party score per track, NaN where it isn't known.
+        design (ndarray): Metadata design matrix, see metadata_design.
+        k (int): Size of the top.
+        refine (callable): refine(indices) -> exact scores of those tracks (NaN if they can't be scored).
+        largest (bool): Rank the highest scores first instead of the lowest.
+        margin_scale (float): Width of the uncertainty interval of estimates.
+        calibration_size (int): Number of calibration tracks to aim for.
+        exact_top (bool): Score the whole top k exactly, see boundary_tracks.
+
+    Returns:
+        tuple: (indices of the top k, best first; their scores; whether each score is
+            an estimate; number of tracks scored exactly).
+    """
+    scores = np.array(exact_scores, dtype=np.float64)
+    design = np.asarray(design, dtype=np.float64)
+    failed = np.zeros(len(scores), dtype=bool)
+    refined = 0
+
+    def score(indices):
+        nonlocal refined
+        if len(indices):
+            values = np.asarray(refine(indices), dtype=np.float64)
+            scores[indices] = values
+            failed[indices] = np.isnan(values)
+            refined += len(indices)
+
+    # Tracks without metadata can only be ranked from their audio
+    has_metadata = np.all(np.isfinite(design), axis=1)
+    score(np.flatnonzero(np.isnan(scores) & ~has_metadata))
+
+    # Calibration set, topped up with tracks spread over the metadata's range
+    paired = ~np.isnan(scores) & has_metadata
+    missing = calibration_size - int(paired.sum())
+    unpaired = np.flatnonzero(np.isnan(scores) & has_metadata)
+    if missing > 0 and len(unpaired):
+        spread = unpaired[np.argsort(design[unpaired, 1:].mean(axis=1), kind="stable")]
+        positions = np.unique(np.round(np.linspace(0, len(spread) - 1, min(missing, len(spread)))).astype(np.int64))
+        score(spread[positions])
+        paired = ~np.isnan(scores) & has_metadata
+
+    estimated = np.isnan(scores) & ~failed
+    if estimated.any() and paired.sum() <= design.shape[1]:
+        # Too few tracks to fit the estimate
+        score(np.flatnonzero(estimated))
+        estimated = np.isnan(scores) & ~failed
+    if estimated.any():
+        coefficients, sigma = fit_calibration(design[paired], scores[paired])
+        estimates = design @ coefficients
+        margin = margin_scale * sigma
+    else:
+        estimates, margin = np.full(len(scores), np.nan), 0.0
+
+    sign = 1.0 if largest else -1.0
+    while True:
+        estimated = np.isnan(scores) & ~failed
+        centre = sign * np.where(estimated, estimates, scores)
+        centre[failed] = -np.inf
+        lower = np.where(estimated, centre - margin, centre)
+        upper = np.where(estimated, centre + margin, centre)
+        todo = boundary_tracks(lower, upper, estimated, k, exact_top)
+        if not todo.any():
+            break
+        score(np.flatnonzero(todo))
+
+    best = top_k(centre, min(k, int((~failed).sum())), largest=True)
+    return best, sign * centre[best], estimated[best], refined
+
+
+def _track_features(file_path, cache, analysis):
+    # Features of one song without the onset envelope, or None if it can't be analyzed
+    try:
+        features = get_song_features(file_path, cache, analysis)
+        return {name: value for name, value in features.items() if name != "onset_env"}
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+
+# Top k of the catalogue's downloaded tracks, decoding only where it matters
+def hybrid_top(catalogue, k, cache=None, analysis=None, weights=None, workers=1, largest=True,
+               margin_scale=DEFAULT_MARGIN_SCALE, calibration_size=DEFAULT_CALIBRATION_SIZE, exact_top=True):
+    """
+    Rank the catalogue's downloaded tracks by party score with as little decoding as possible.
+
+    Audio features stored in the catalogue or the feature cache are used as
+    they are. Spotify's danceability, energy and tempo stand in for the
+    rest, and audio is only decoded for tracks without them or near the
+    top-k cut (see hybrid_top_k). Decoded features are stored in the
+    catalogue, so later rankings reuse them.
+
+    Args:
+        catalogue (Catalogue): The track catalogue.
+        k (int): Number of tracks.
+        cache (FeatureCache): Feature cache to read from and write to (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
+        weights (dict): Weight per feature, see TrackTable.scores.
+        workers (int): Number of decoding processes. 1 decodes in-process, None uses every CPU.
+        largest (bool): Return the highest scores instead of the lowest.
+        margin_scale (float): Width of the uncertainty interval of estimates.
+        calibration_size (int): Number of calibration tracks to aim for.
+        exact_top (bool): Score the whole top k exactly.
+
+    Returns:
+        tuple: (list of (name, party score) pairs, best first; number of tracks decoded;
+            number of tracks ranked).
+    """
+    columns = catalogue.ranking_columns(FEATURE_EXTRACTOR_VERSION)
+    keep = [i for i, path in enumerate(columns["local_paths"]) if path and os.path.exists(path)]
+    track_ids = [columns["track_ids"][i] for i in keep]
+    names = [columns["names"][i] for i in keep]
+    paths = [columns["local_paths"][i] for i in keep]
+    tempo = columns["tempo"][keep]
+    energy = columns["energy"][keep]
+
+    # Features already in the feature cache count as known
+    if cache is not None:
+        params = {} if analysis is None else dict(analysis)
+        for i in np.flatnonzero(np.isnan(tempo)):
+            features = cache.get(paths[i], **params)
+            if features is not None:
+                tempo[i], energy[i] = float(features["tempo"]), float(features["energy"])
+
+    decoded = 0
+
+    def refine(indices):
+        nonlocal decoded
+        file_paths = [paths[i] for i in indices]
+        caches, analyses = [cache] * len(file_paths), [analysis] * len(file_paths)
+        if workers == 1:
+            results = list(map(_track_features, file_paths, caches, analyses))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_track_features, file_paths, caches, analyses))
+        decoded += len(file_paths)
+        stored = [(track_ids[i], features) for i, features in zip(indices, results) if features is not None]
+        catalogue.upsert_features(stored, FEATURE_EXTRACTOR_VERSION)
+        refined_tempo = np.array([np.nan if f is None else float(f["tempo"]) for f in results])
+        refined_energy = np.array([np.nan if f is None else float(f["energy"]) for f in results])
+        return TrackTable([names[i] for i in indices], refined_tempo, refined_energy).scores(weights)
+
+    exact_scores = TrackTable(names, tempo, energy).scores(weights)
+    design = metadata_design(columns["danceability"][keep], columns["spotify_energy"][keep],
+                             columns["spotify_tempo"][keep], columns["duration_ms"][keep])
+    best, scores, _, _ = hybrid_top_k(exact_scores, design, k, refine, largest, margin_scale, calibration_size,
+                                      exact_top)
+    return [(names[i], float(score)) for i, score in zip(best, scores)], decoded, len(names)
+
+
+if __name__ == "__main__":
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with Catalogue(DEFAULT_CATALOGUE_PATH) as catalogue:
+        top, decoded, ranked = hybrid_top(catalogue, k, cache=default_feature_cache(), workers=None)
+    print(f"\nTop {len(top)} Party Scores ({decoded} of {ranked} tracks decoded):")
+    for song, score in top:
+        print(f"{song}: {score:.2f}")
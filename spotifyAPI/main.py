@@ -1,19 +1,26 @@
 # Code snippet that Christopher copies and pastes
-from partyscore import append_song_scores_to_dict
-
-# Initialize an empty dictionary for storing results
-party_scores = {}
+from partyscore import default_feature_cache
+from ranking import TrackTable
+from set_order import order_folder
 
 # Define the folder containing the MP3 files
 playlist_folder = "./playlist"
 
-# Call the function
-append_song_scores_to_dict(playlist_folder, party_scores)
+# Load every song's features, reusing cached features for files that haven't changed
+feature_cache = default_feature_cache()
+table = TrackTable.from_folder(playlist_folder, cache=feature_cache)
 
-# Print the results
-if party_scores:
-    print("\nParty Scores Dictionary:")
-    for song, score in sorted(party_scores.items(), key=lambda x: x[1]):
+# Print the results, least party-ready first
+if len(table):
+    print("\nParty Scores:")
+    for song, score in table.top(len(table), largest=False, normalized=False):
         print(f"{song}: {score:.2f}")
 else:
     print("No scores were calculated.")
+
+# Suggest a set order from the same cached features
+set_order = order_folder(playlist_folder, cache=feature_cache)
+if set_order:
+    print("\nSuggested Set Order:")
+    for position, song in enumerate(set_order, start=1):
+        print(f"{position:3d}. {song}")
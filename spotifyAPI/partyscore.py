@@ -1,36 +1,118 @@
 import librosa
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from feature_cache import FeatureCache, source_fingerprint
 
 
 # Load the audio file
-def load_audio(filename):
+def load_audio(filename, sr=22050, offset=0.0, duration=None):
     """
     Load an audio file using librosa.
 
     Args:
         filename (str): Path to the audio file.
+        sr (int): Target sampling rate.
+        offset (float): Start reading after this many seconds.
+        duration (float): Only load this many seconds (None loads to the end).
 
     Returns:
         tuple: Audio time series and sampling rate.
     """
-    return librosa.load(filename)
+    return librosa.load(filename, sr=sr, offset=offset, duration=duration)
+
+
+# Sampling rate used by the fast analysis mode
+ANALYSIS_SR = 11025
+
+
+# Load only the parts of a song needed for analysis, at a low sampling rate
+def load_analysis_windows(filename, sr=ANALYSIS_SR, window_duration=30.0, positions=(0.5, 0.7)):
+    """
+    Decode selected windows of a song as mono audio at a low sampling rate.
+
+    Each window is ``window_duration`` seconds long and centred at a fraction
+    of the track length (0.5 is the middle, 0.7 usually lands in a late
+    chorus). Only the requested windows are decoded, since the decoder seeks to
+    each offset. Windows are merged if they overlap, and the whole song is
+    loaded when it is shorter than the windows combined.
+
+    Args:
+        filename (str): Path to the audio file.
+        sr (int): Target sampling rate.
+        window_duration (float): Length of each window in seconds (None loads the whole song).
+        positions (tuple): Centre of each window as a fraction of the track length.
+
+    Returns:
+        tuple: (list of audio windows, sampling rate, total track duration in seconds).
+    """
+    total_duration = librosa.get_duration(path=filename)
+    if window_duration is None or total_duration <= window_duration * len(positions):
+        y, sr = load_audio(filename, sr=sr)
+        return [y], sr, total_duration
+
+    # Window start times, clipped to the track and merged where they overlap
+    spans = []
+    for position in sorted(positions):
+        start = min(max(position * total_duration - window_duration / 2, 0.0), total_duration - window_duration)
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = start + window_duration
+        else:
+            spans.append([start, start + window_duration])
+
+    windows = [load_audio(filename, sr=sr, offset=start, duration=end - start)[0] for start, end in spans]
+    return windows, sr, total_duration
+
+
+# Compute the onset strength envelope
+def compute_onset_envelope(y, sr):
+    """
+    Calculate the onset strength envelope of an audio signal.
+
+    Args:
+        y (ndarray): Audio time series.
+        sr (int): Sampling rate.
+
+    Returns:
+        ndarray: Onset strength per frame.
+    """
+    return librosa.onset.onset_strength(y=y, sr=sr)
+
+
+# Track beats using onset strength
+def compute_beats(y, sr, onset_env=None, hop_length=512):
+    """
+    Track the beats of an audio signal.
+
+    Args:
+        y (ndarray): Audio time series.
+        sr (int): Sampling rate.
+        onset_env (ndarray): Precomputed onset strength envelope (optional).
+        hop_length (int): Hop length of the onset envelope frames.
+
+    Returns:
+        tuple: Tempo in beats per minute and beat positions in frames.
+    """
+    if onset_env is None:
+        onset_env = compute_onset_envelope(y, sr)
+    return librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
 
 
 # Compute tempo using onset strength
-def compute_tempo(y, sr):
+def compute_tempo(y, sr, onset_env=None, hop_length=512):
     """
     Calculate the tempo of an audio signal.
 
     Args:
         y (ndarray): Audio time series.
         sr (int): Sampling rate.
+        onset_env (ndarray): Precomputed onset strength envelope (optional).
+        hop_length (int): Hop length of the onset envelope frames.
 
     Returns:
         float: Tempo in beats per minute.
     """
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    tempo, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+    tempo, _ = compute_beats(y, sr, onset_env=onset_env, hop_length=hop_length)
     return tempo
 
 
@@ -64,6 +146,175 @@ def normalize(value, min_value, max_value):
     return (value - min_value) / (max_value - min_value) if max_value > min_value else 0
 
 
+# Frame settings shared by onset_strength and feature.rms, at the default 22050 Hz
+REFERENCE_SR = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+
+
+# Compute all spectral features from a single STFT pass
+def extract_features(y, sr, extra=()):
+    """
+    Compute the onset envelope, tempo and energy from one shared STFT magnitude.
+
+    The onset envelope matches compute_onset_envelope exactly (same mel
+    spectrogram, built from the shared power spectrum). The energy is derived
+    from the same frames via Parseval's theorem and corrected for the Hann
+    window, so it agrees with compute_energy to a small fraction of a percent
+    without a second framing pass over the signal (see check_feature_agreement).
+    For tempo and energy alone this saves little, as beat tracking dominates;
+    sharing the STFT mainly makes the extras cheap.
+
+    At other sampling rates the frame and hop lengths are scaled so frames
+    still cover the same duration as at 22050 Hz.
+
+    Args:
+        y (ndarray): Audio time series.
+        sr (int): Sampling rate.
+        extra (tuple): Optional extra features: 'centroid' (mean spectral centroid in Hz)
+            and 'chroma' (mean chroma vector, 12 pitch classes starting at C).
+
+    Returns:
+        dict: Features with keys 'tempo', 'energy', 'onset_env' and any requested extras.
+    """
+    n_fft = N_FFT * sr // REFERENCE_SR
+    hop_length = HOP_LENGTH * sr // REFERENCE_SR
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+
+    # Onset envelope from the mel spectrogram of the shared power spectrum
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, n_fft=n_fft, hop_length=hop_length)
+    tempo = compute_tempo(y, sr, onset_env=onset_env, hop_length=hop_length)
+
+    # RMS of the windowed frames, rescaled to the rectangular frames feature.rms uses
+    window_power = np.mean(librosa.filters.get_window("hann", n_fft) ** 2)
+    energy = np.sum(librosa.feature.rms(S=S, frame_length=n_fft) ** 2) / window_power
+
+    features = {"tempo": float(np.squeeze(tempo)), "energy": float(energy), "onset_env": onset_env}
+    if "centroid" in extra:
+        features["centroid"] = float(np.mean(librosa.feature.spectral_centroid(S=S, sr=sr)))
+    if "chroma" in extra:
+        features["chroma"] = np.mean(librosa.feature.chroma_stft(S=S ** 2, sr=sr, n_fft=n_fft), axis=1)
+    return features
+
+
+# Check the fused extractor against the separate reference functions
+def check_feature_agreement(y, sr):
+    """
+    Compare extract_features with compute_onset_envelope, compute_tempo and compute_energy.
+
+    Args:
+        y (ndarray): Audio time series.
+        sr (int): Sampling rate.
+
+    Returns:
+        dict: Maximum onset envelope difference, tempo difference and relative energy error.
+    """
+    fused = extract_features(y, sr)
+    onset_env = compute_onset_envelope(y, sr)
+    tempo = float(np.squeeze(compute_tempo(y, sr, onset_env=onset_env)))
+    energy = float(compute_energy(y))
+    return {
+        "onset_env_max_abs_diff": float(np.max(np.abs(fused["onset_env"] - onset_env))),
+        "tempo_abs_diff": abs(fused["tempo"] - tempo),
+        "energy_rel_diff": abs(fused["energy"] - energy) / energy if energy > 0 else abs(fused["energy"]),
+    }
+
+
+# Compute every feature the party score needs
+def compute_features(y, sr, extra=()):
+    """
+    Compute the tempo, energy and onset envelope of an audio signal.
+
+    Args:
+        y (ndarray): Audio time series.
+        sr (int): Sampling rate.
+        extra (tuple): Extra features for other consumers, see extract_features (optional).
+
+    Returns:
+        dict: Features with keys 'tempo', 'energy', 'onset_env' and any requested extras.
+    """
+    return extract_features(y, sr, extra)
+
+
+# Compute features from a few low-rate windows instead of the whole song
+def compute_windowed_features(filename, sr=ANALYSIS_SR, window_duration=30.0, positions=(0.5, 0.7), extra=()):
+    """
+    Estimate the full-song features of a song from selected windows.
+
+    The tempo is the median over the windows. The energy is the mean frame
+    energy of the windows scaled to the number of frames the whole song has at
+    22050 Hz, so it stays comparable with compute_energy on the full signal.
+    The onset envelope is that of the longest window; extra features are
+    averaged over all frames.
+
+    Args:
+        filename (str): Path to the audio file.
+        sr (int): Sampling rate to decode at.
+        window_duration (float): Length of each window in seconds (None analyses the whole song).
+        positions (tuple): Centre of each window as a fraction of the track length.
+        extra (tuple): Extra features, see extract_features (optional).
+
+    Returns:
+        dict: Features with keys 'tempo', 'energy', 'onset_env' and any requested extras.
+    """
+    windows, sr, total_duration = load_analysis_windows(filename, sr, window_duration, positions)
+    per_window = [compute_features(y, sr, extra) for y in windows]
+    frame_counts = [len(features["onset_env"]) for features in per_window]
+
+    mean_frame_energy = sum(features["energy"] for features in per_window) / sum(frame_counts)
+    reference_frames = 1 + int(total_duration * REFERENCE_SR) // HOP_LENGTH
+    features = {
+        "tempo": float(np.median([features["tempo"] for features in per_window])),
+        "energy": float(mean_frame_energy * reference_frames),
+        "onset_env": per_window[int(np.argmax(frame_counts))]["onset_env"],
+    }
+    for name in extra:
+        features[name] = np.average([window[name] for window in per_window], axis=0, weights=frame_counts)
+    return features
+
+
+# Version stamp of the feature extractor, bump FEATURE_VERSION to invalidate cached features
+FEATURE_VERSION = 2
+FEATURE_EXTRACTOR_VERSION = source_fingerprint(
+    load_audio, load_analysis_windows, compute_beats, compute_tempo, extract_features, compute_features,
+    compute_windowed_features,
+    version=FEATURE_VERSION,
+)
+
+
+# Create the default on-disk feature cache
+def default_feature_cache(cache_dir=".feature_cache"):
+    """
+    Create a feature cache stamped with the current extractor version.
+
+    Args:
+        cache_dir (str): Directory holding the cache entries.
+
+    Returns:
+        FeatureCache: The feature cache.
+    """
+    return FeatureCache(cache_dir, version=FEATURE_EXTRACTOR_VERSION)
+
+
+# Combine tempo and energy into a party score
+def score_from_features(tempo, energy):
+    """
+    Calculate the party score from precomputed tempo and energy.
+
+    Args:
+        tempo (float): Tempo in beats per minute.
+        energy (float): Energy value.
+
+    Returns:
+        float: Party score.
+    """
+    normalized_tempo = normalize(tempo, 60, 200)  # Expected tempo range: 60-200 BPM
+    normalized_energy = normalize(energy, 0, 1)  # Expected energy range: 0-1
+
+    return (normalized_tempo + normalized_energy) / 2
+
+
 # Calculate the "party score" for a song
 def calculate_party_score(y, sr):
     """
@@ -76,42 +327,156 @@ def calculate_party_score(y, sr):
     Returns:
         float: Party score.
     """
-    tempo = compute_tempo(y, sr)
-    energy = compute_energy(y)
+    features = extract_features(y, sr)
+    return score_from_features(features["tempo"], features["energy"])
 
-    normalized_tempo = normalize(tempo, 60, 200)  # Expected tempo range: 60-200 BPM
-    normalized_energy = normalize(energy, 0, 1)  # Expected energy range: 0-1
 
-    return (normalized_tempo + normalized_energy) / 2
+# Settings for the fast analysis mode: two 30 s windows decoded at 11025 Hz
+FAST_ANALYSIS = {"sr": ANALYSIS_SR, "window_duration": 30.0, "positions": (0.5, 0.7)}
+
+
+# Load a song's features from the cache, or decode and analyze it
+def get_song_features(filename, cache=None, analysis=None, extra=()):
+    """
+    Get the features of a song, decoding it only if they are not cached.
+
+    Extra features are cached in an entry of their own, so scoring never
+    pays for them and asking for them reuses the scoring entry's settings.
+
+    Args:
+        filename (str): Path to the audio file.
+        cache (FeatureCache): Feature cache to read from and write to (optional).
+        analysis (dict): Keyword arguments for compute_windowed_features (e.g.
+            FAST_ANALYSIS). None decodes and analyzes the whole song at 22050 Hz.
+        extra (tuple): Extra features, e.g. ('chroma',) for set ordering, see extract_features.
+
+    Returns:
+        dict: Features with keys 'tempo', 'energy', 'onset_env' and any requested extras.
+    """
+    params = {} if analysis is None else dict(analysis)
+    extra_params = dict(params, extra=",".join(sorted(extra)))
+    if cache is not None:
+        features = cache.get(filename, **params)
+        if features is not None and extra:
+            extras = cache.get(filename, **extra_params)
+            features = None if extras is None else dict(features, **extras)
+        if features is not None:
+            return features
+
+    if analysis is None:
+        y, sr = load_audio(filename)
+        features = compute_features(y, sr, extra)
+    else:
+        features = compute_windowed_features(filename, extra=extra, **analysis)
+    if cache is not None:
+        cache.put(filename, {name: value for name, value in features.items() if name not in extra}, **params)
+        if extra:
+            cache.put(filename, {name: features[name] for name in extra}, **extra_params)
+    return features
 
 
 # Analyze a single song and return its party score
-def analyze_song(filename):
+def analyze_song(filename, cache=None, analysis=None):
     """
     Analyze a song to compute its party score.
 
     Args:
         filename (str): Path to the audio file.
+        cache (FeatureCache): Feature cache used to skip decoding unchanged files (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
 
     Returns:
         float: Party score or None in case of an error.
     """
     try:
-        y, sr = load_audio(filename)
-        return calculate_party_score(y, sr)
+        features = get_song_features(filename, cache, analysis)
+        return score_from_features(float(features["tempo"]), float(features["energy"]))
     except Exception as e:
         print(f"Error processing {filename}: {e}")
         return None
 
 
+# Score many songs across a process pool, streaming results back
+def iter_song_scores(file_paths, workers=None, max_in_flight=None, ordered=True, cache=None, analysis=None,
+                     analyze=analyze_song):
+    """
+    Analyze songs in a pool of worker processes and yield scores as they finish.
+
+    At most ``max_in_flight`` files are submitted to the pool at once, so memory
+    stays bounded no matter how many files are queued. With ``ordered=True`` the
+    results are yielded in the same order as ``file_paths`` (each one as soon as
+    every file before it has finished); otherwise they are yielded in completion
+    order. With one worker the songs are analyzed in-process, in order.
+
+    Args:
+        file_paths (list): Paths of the audio files to analyze.
+        workers (int): Number of worker processes (defaults to the CPU count).
+        max_in_flight (int): Maximum number of pending files (defaults to 2 * workers).
+        ordered (bool): Yield results in input order instead of completion order.
+        cache (FeatureCache): Feature cache shared by the workers (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
+        analyze (callable): Picklable function (file_path, cache, analysis) run per song,
+            returning None on error (defaults to analyze_song).
+
+    Yields:
+        tuple: (index, file_path, party_score), where party_score is None on error.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or 2 * workers, 1)
+    if workers == 1:
+        for index, file_path in enumerate(file_paths):
+            yield index, file_path, analyze(file_path, cache, analysis)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        finished = {}
+        next_to_submit = 0
+        next_to_yield = 0
+
+        while next_to_yield < len(file_paths):
+            # Keep the pool fed without queueing the whole folder at once
+            while next_to_submit < len(file_paths) and len(pending) < max_in_flight:
+                future = pool.submit(analyze, file_paths[next_to_submit], cache, analysis)
+                pending[future] = next_to_submit
+                next_to_submit += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    party_score = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. a decoder crash), report it like analyze_song does
+                    print(f"Error processing {file_paths[index]}: {e}")
+                    party_score = None
+
+                if not ordered:
+                    next_to_yield += 1
+                    yield index, file_paths[index], party_score
+                else:
+                    finished[index] = party_score
+
+            # Release every result whose predecessors have all finished
+            while ordered and next_to_yield in finished:
+                party_score = finished.pop(next_to_yield)
+                yield next_to_yield, file_paths[next_to_yield], party_score
+                next_to_yield += 1
+
+
 # Append song scores to an external dictionary
-def append_song_scores_to_dict(folder_path, results_dict):
+def append_song_scores_to_dict(folder_path, results_dict, workers=1, max_in_flight=None, cache=None,
+                               analysis=None):
     """
     Process all MP3 files in the specified folder and append their scores to a dictionary.
 
     Args:
         folder_path (str): Path to the folder containing MP3 files.
         results_dict (dict): Dictionary to append results to.
+        workers (int): Number of worker processes. 1 scores in-process, None uses every CPU.
+        max_in_flight (int): Maximum number of files queued in the pool at once.
+        cache (FeatureCache): Feature cache used to skip decoding unchanged files (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
 
     Returns:
         None
@@ -120,44 +485,67 @@ def append_song_scores_to_dict(folder_path, results_dict):
         print(f"Error: Folder '{folder_path}' does not exist!")
         return
 
-    # Get all MP3 files in the folder
-    mp3_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.mp3')]
+    # Get all MP3 files in the folder, sorted so results always come back in the same order
+    mp3_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith('.mp3'))
 
     if not mp3_files:
         print(f"No MP3 files found in folder '{folder_path}'!")
         return
 
+    file_paths = [os.path.join(folder_path, mp3_file) for mp3_file in mp3_files]
+
     # Process each MP3 file
-    for mp3_file in mp3_files:
-        file_path = os.path.join(folder_path, mp3_file)
-        party_score = analyze_song(file_path)
+    scores = iter_song_scores(file_paths, workers=workers, max_in_flight=max_in_flight, cache=cache,
+                              analysis=analysis)
 
+    for index, file_path, party_score in scores:
         if party_score is not None:
             # Ensure scalar values are stored
             score_value = party_score.item() if isinstance(party_score, np.ndarray) else party_score
-            results_dict[mp3_file] = score_value
+            results_dict[mp3_files[index]] = score_value
 
     print(f"Processed {len(mp3_files)} files and updated the results dictionary.")
 
 
-if __name__ == "__main__":
-    # Define the folder containing the playlist
-    playlist_folder = os.path.join(os.getcwd(), "playlist")
+# Write normalized scores in the party_ranks.txt format
+def write_party_ranks(file_path, normalized_scores):
+    """
+    Write normalized party scores to a text file in ascending order.
+
+    Args:
+        file_path (str): Path of the output file (e.g. party_ranks.txt).
+        normalized_scores (dict): Normalized party score per song.
 
-    # Initialize an empty dictionary to hold results
-    party_scores = {}
+    Returns:
+        None
+    """
+    lines = ["Normalized Party Scores for all songs (ascending order):", "-" * 50]
+    for song, score in sorted(normalized_scores.items(), key=lambda x: x[1]):
+        lines.append(f"{song}: {score:.2f}")
+    if normalized_scores:
+        average = sum(normalized_scores.values()) / len(normalized_scores)
+        lines += ["", f"Average normalized party score: {average:.4f}"]
+
+    # Replace the file in one step so readers never see a half-written ranking
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file_out:
+        file_out.write("\n".join(lines))
+    os.replace(temp_path, file_path)
 
-    # Append scores to the dictionary
-    append_song_scores_to_dict(playlist_folder, party_scores)
 
-    # Normalize the scores and print results
-    if party_scores:
-        min_score = min(party_scores.values())
-        max_score = max(party_scores.values())
+if __name__ == "__main__":
+    from ranking import TrackTable
+
+    # Define the folder containing the playlist
+    playlist_folder = os.path.join(os.getcwd(), "playlist")
 
-        for song in party_scores:
-            party_scores[song] = normalize(party_scores[song], min_score, max_score)
+    # Load every song's features, using every core for large folders
+    table = TrackTable.from_folder(playlist_folder, cache=default_feature_cache(), workers=None)
 
+    # Normalize the scores, print them and write the ranking
+    if len(table):
+        scores = table.normalized_scores()
         print("\nNormalized Party Scores:")
-        for song, score in sorted(party_scores.items(), key=lambda x: x[1]):
-            print(f"{song}: {score:.2f}")
+        for index in np.argsort(scores, kind="stable"):
+            print(f"{table.names[index]}: {scores[index]:.2f}")
+        table.write_party_ranks("party_ranks.txt")
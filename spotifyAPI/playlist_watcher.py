@@ -0,0 +1,133 @@
+import os
+import time
+
+from partyscore import analyze_song, default_feature_cache, iter_song_scores, write_party_ranks
+from ranking import minmax_normalize
+
+# Suffixes of files that are still being written by yt-dlp / ffmpeg
+IN_PROGRESS_SUFFIXES = ('.part', '.ytdl', '.temp.mp3')
+
+
+# List the finished MP3 files of a folder with their size and modification time
+def scan_folder(folder_path):
+    """
+    Find the finished MP3 files in a folder.
+
+    Args:
+        folder_path (str): Path to the folder containing MP3 files.
+
+    Returns:
+        dict: (size, mtime) per MP3 file name.
+    """
+    snapshot = {}
+    for entry in os.scandir(folder_path):
+        name = entry.name.lower()
+        if not entry.is_file() or not name.endswith('.mp3') or name.endswith(IN_PROGRESS_SUFFIXES):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue  # Removed between listdir and stat
+        snapshot[entry.name] = (stat.st_size, stat.st_mtime)
+    return snapshot
+
+
+class PlaylistWatcher:
+    """
+    Keep party scores for a playlist folder up to date as files appear.
+
+    Only new or changed MP3 files are scored. A file is considered finished
+    once it has not been modified for ``settle_time`` seconds, so tracks that
+    are still downloading are picked up on a later poll.
+    """
+
+    def __init__(self, folder_path, ranks_path="party_ranks.txt", cache=None, workers=1, settle_time=2.0):
+        self.folder_path = folder_path
+        self.ranks_path = ranks_path
+        self.cache = cache
+        self.workers = workers
+        self.settle_time = settle_time
+        self.raw_scores = {}
+        self.seen = {}
+
+    # Renormalize the raw scores to 0-1
+    def normalized_scores(self):
+        """
+        Normalize the raw party scores between the current minimum and maximum.
+
+        Returns:
+            dict: Normalized party score per song.
+        """
+        scores = minmax_normalize(list(self.raw_scores.values()))
+        return dict(zip(self.raw_scores, scores.tolist()))
+
+    def _score(self, names):
+        file_paths = [os.path.join(self.folder_path, name) for name in names]
+        if self.workers == 1 or len(file_paths) == 1:
+            for index, file_path in enumerate(file_paths):
+                yield index, analyze_song(file_path, self.cache)
+        else:
+            for index, _, party_score in iter_song_scores(file_paths, workers=self.workers, cache=self.cache):
+                yield index, party_score
+
+    # Score whatever changed since the last poll
+    def poll(self):
+        """
+        Score new or changed files, forget deleted ones and rewrite the ranks file.
+
+        Returns:
+            bool: True if the scores changed.
+        """
+        snapshot = scan_folder(self.folder_path)
+        now = time.time()
+
+        removed = [name for name in self.seen if name not in snapshot]
+        for name in removed:
+            del self.seen[name]
+            self.raw_scores.pop(name, None)
+
+        changed = sorted(
+            name for name, (size, mtime) in snapshot.items()
+            if self.seen.get(name) != (size, mtime) and now - mtime >= self.settle_time
+        )
+        for index, party_score in self._score(changed):
+            name = changed[index]
+            self.seen[name] = snapshot[name]
+            if party_score is not None:
+                self.raw_scores[name] = float(party_score)
+            else:
+                # Leave broken files out until they change again
+                self.raw_scores.pop(name, None)
+
+        if not removed and not changed:
+            return False
+
+        write_party_ranks(self.ranks_path, self.normalized_scores())
+        print(f"Scored {len(changed)} new or changed files, removed {len(removed)}; "
+              f"{len(self.raw_scores)} songs ranked.")
+        return True
+
+    # Poll the folder until interrupted
+    def run(self, interval=5.0):
+        """
+        Watch the folder, polling every ``interval`` seconds until interrupted.
+
+        Args:
+            interval (float): Seconds between polls.
+
+        Returns:
+            None
+        """
+        print(f"Watching '{self.folder_path}' for new songs (Ctrl+C to stop)...")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+
+
+if __name__ == "__main__":
+    watcher = PlaylistWatcher("./playlist", ranks_path="party_ranks.txt",
+                              cache=default_feature_cache(), workers=None)
+    watcher.run()
@@ -0,0 +1,248 @@
+import os
+import numpy as np
+from partyscore import get_song_features, iter_song_scores, write_party_ranks
+
+
+# Expected feature ranges of the fixed scaling, as in score_from_features
+FIXED_BOUNDS = {"tempo": (60.0, 200.0), "energy": (0.0, 1.0)}
+
+# Weight of each feature in the party score
+DEFAULT_WEIGHTS = {"tempo": 0.5, "energy": 0.5}
+
+SCALINGS = ("fixed", "minmax", "percentile", "zscore")
+
+
+# Scale a whole column of values at once
+def scale_column(values, method="fixed", bounds=None):
+    """
+    Scale feature values with one of the supported scalings.
+
+    Args:
+        values (ndarray): Feature values, one per track.
+        method (str): 'fixed' maps bounds to 0-1 like normalize(), 'minmax' maps the
+            observed range to 0-1, 'percentile' uses the rank (ties share their
+            average rank) and 'zscore' centres on the mean in units of standard deviation.
+        bounds (tuple): (min, max) of the fixed scaling.
+
+    Returns:
+        ndarray: Scaled values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if method == "fixed":
+        low, high = bounds
+        return (values - low) / (high - low) if high > low else np.zeros_like(values)
+    if method == "minmax":
+        return minmax_normalize(values)
+    if method == "percentile":
+        if len(values) < 2:
+            return np.zeros_like(values)
+        ordered = np.sort(values)
+        lowest = np.searchsorted(ordered, values, side="left")
+        highest = np.searchsorted(ordered, values, side="right") - 1
+        return (lowest + highest) / (2.0 * (len(values) - 1))
+    if method == "zscore":
+        std = values.std()
+        return (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+    raise ValueError(f"Unknown scaling '{method}', expected one of {SCALINGS}")
+
+
+# Normalize all scores to 0-1 between their minimum and maximum
+def minmax_normalize(values):
+    """
+    Vectorised normalize(value, min(values), max(values)) over every value.
+
+    Args:
+        values (ndarray): Values to normalize.
+
+    Returns:
+        ndarray: Values scaled to 0-1 (all zeros when they are all equal).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values
+    low, high = values.min(), values.max()
+    return (values - low) / (high - low) if high > low else np.zeros_like(values)
+
+
+# Indices of the k largest (or smallest) values without sorting everything
+def top_k(values, k, largest=True):
+    """
+    Find the k best values with a partial sort.
+
+    Args:
+        values (ndarray): Values to rank.
+        k (int): Number of indices to return.
+        largest (bool): Return the largest values instead of the smallest.
+
+    Returns:
+        ndarray: Indices of the k best values, best first.
+    """
+    values = np.asarray(values)
+    k = min(k, len(values))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = -values if largest else values
+    best = np.argpartition(keys, k - 1)[:k]
+    return best[np.argsort(keys[best], kind="stable")]
+
+
+def _track_row(file_path, cache, analysis):
+    # Tempo and energy of one song, or None if it can't be analyzed
+    try:
+        features = get_song_features(file_path, cache, analysis)
+        return float(features["tempo"]), float(features["energy"])
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+
+
+class TrackTable:
+    """
+    Per-track features stored as columns, one NumPy array per feature.
+
+    Scores, scalings and rankings are computed as whole-array operations, so
+    rescoring a large library costs a few vector operations instead of a
+    Python call per song.
+    """
+
+    def __init__(self, names, tempo, energy):
+        self.names = list(names)
+        self.tempo = np.asarray(tempo, dtype=np.float64)
+        self.energy = np.asarray(energy, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Build a table from a dictionary of feature dictionaries
+    @classmethod
+    def from_features(cls, features_by_name):
+        """
+        Create a table from per-song feature dictionaries.
+
+        Args:
+            features_by_name (dict): Features (with 'tempo' and 'energy') per song name.
+
+        Returns:
+            TrackTable: The table.
+        """
+        names = list(features_by_name)
+        return cls(
+            names,
+            [float(features_by_name[name]["tempo"]) for name in names],
+            [float(features_by_name[name]["energy"]) for name in names],
+        )
+
+    # Build a table from every MP3 file in a folder
+    @classmethod
+    def from_folder(cls, folder_path, cache=None, analysis=None, workers=1, max_in_flight=None):
+        """
+        Load or compute the features of every MP3 file in a folder.
+
+        Songs are analyzed through iter_song_scores, so at most max_in_flight
+        files are queued in the pool at once.
+
+        Args:
+            folder_path (str): Path to the folder containing MP3 files.
+            cache (FeatureCache): Feature cache used to skip decoding unchanged files (optional).
+            analysis (dict): Windowed analysis settings, see get_song_features (optional).
+            workers (int): Number of worker processes. 1 loads in-process, None uses every CPU.
+            max_in_flight (int): Maximum number of files queued in the pool at once.
+
+        Returns:
+            TrackTable: The table, without songs that could not be analyzed.
+        """
+        if not os.path.exists(folder_path):
+            print(f"Error: Folder '{folder_path}' does not exist!")
+            return cls([], [], [])
+
+        mp3_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith('.mp3'))
+        file_paths = [os.path.join(folder_path, mp3_file) for mp3_file in mp3_files]
+        rows = iter_song_scores(file_paths, workers=workers, max_in_flight=max_in_flight, cache=cache,
+                                analysis=analysis, analyze=_track_row)
+
+        kept = [(mp3_files[index], row) for index, _, row in rows if row is not None]
+        return cls([name for name, _ in kept], [row[0] for _, row in kept], [row[1] for _, row in kept])
+
+    # Build a table from the scored tracks of the catalogue
+    @classmethod
+    def from_catalogue(cls, catalogue, version=None):
+        """
+        Create a table from the features stored in the track catalogue.
+
+        Args:
+            catalogue (Catalogue): The track catalogue.
+            version (str): Only features from this extractor version (optional).
+
+        Returns:
+            TrackTable: The table, named "artist - name" per track.
+        """
+        _, names, tempo, energy = catalogue.feature_columns(version)
+        return cls(names, tempo, energy)
+
+    # Party score of every track
+    def scores(self, weights=None, scaling="fixed"):
+        """
+        Compute the party score of every track as a weighted sum of scaled features.
+
+        With the default weights and fixed scaling this matches score_from_features.
+
+        Args:
+            weights (dict): Weight per feature ('tempo', 'energy').
+            scaling (str): Scaling applied to each feature, see scale_column.
+
+        Returns:
+            ndarray: Party score per track.
+        """
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        total = np.zeros(len(self))
+        for feature, weight in weights.items():
+            if weight:
+                total += weight * scale_column(getattr(self, feature), scaling, FIXED_BOUNDS.get(feature))
+        return total
+
+    # Party scores normalized to 0-1 across the library
+    def normalized_scores(self, weights=None, scaling="fixed"):
+        """
+        Party scores normalized between the lowest and highest score.
+
+        Args:
+            weights (dict): Weight per feature, see scores.
+            scaling (str): Scaling applied to each feature, see scale_column.
+
+        Returns:
+            ndarray: Normalized party score per track.
+        """
+        return minmax_normalize(self.scores(weights, scaling))
+
+    # The k most (or least) party-ready tracks
+    def top(self, k, weights=None, scaling="fixed", largest=True, normalized=True):
+        """
+        Get the k best tracks without sorting the whole library.
+
+        Args:
+            k (int): Number of tracks.
+            weights (dict): Weight per feature, see scores.
+            scaling (str): Scaling applied to each feature, see scale_column.
+            largest (bool): Return the highest scores instead of the lowest.
+            normalized (bool): Report normalized scores instead of raw party scores.
+
+        Returns:
+            list: (name, score) pairs, best first.
+        """
+        scores = self.normalized_scores(weights, scaling) if normalized else self.scores(weights, scaling)
+        return [(self.names[index], float(scores[index])) for index in top_k(scores, k, largest)]
+
+    # Write the ranking in the party_ranks.txt format
+    def write_party_ranks(self, file_path, weights=None, scaling="fixed"):
+        """
+        Write the normalized party scores to a text file in ascending order.
+
+        Args:
+            file_path (str): Path of the output file (e.g. party_ranks.txt).
+            weights (dict): Weight per feature, see scores.
+            scaling (str): Scaling applied to each feature, see scale_column.
+
+        Returns:
+            None
+        """
+        write_party_ranks(file_path, dict(zip(self.names, self.normalized_scores(weights, scaling).tolist())))
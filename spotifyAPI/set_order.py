@@ -0,0 +1,246 @@
+import os
+import numpy as np
+from partyscore import get_song_features, score_from_features, default_feature_cache
+
+
+# Krumhansl-Schmuckler key profiles, starting at the tonic
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Weights of the transition cost terms
+DEFAULT_WEIGHTS = {"tempo": 1.0, "key": 1.0, "energy": 1.0, "arc": 2.0}
+
+# Relative tempo difference (in octaves) that costs as much as the farthest key
+TEMPO_SCALE = np.log2(1.08)
+
+
+# Estimate the key of every track from its mean chroma
+def estimate_keys(chroma):
+    """
+    Estimate keys by correlating mean chroma with the 24 rotated key profiles.
+
+    Args:
+        chroma (ndarray): Mean chroma per track, shape (N, 12), starting at C.
+
+    Returns:
+        tuple: Tonic pitch classes (0 = C) and modes (1 = major, 0 = minor), each of shape (N,).
+    """
+    chroma = np.asarray(chroma, dtype=np.float64)
+    profiles = np.array(
+        [np.roll(MAJOR_PROFILE, tonic) for tonic in range(12)]
+        + [np.roll(MINOR_PROFILE, tonic) for tonic in range(12)]
+    )
+
+    # Pearson correlation with every profile as one matrix product
+    chroma = chroma - chroma.mean(axis=1, keepdims=True)
+    profiles = profiles - profiles.mean(axis=1, keepdims=True)
+    chroma /= np.maximum(np.linalg.norm(chroma, axis=1, keepdims=True), 1e-12)
+    profiles /= np.linalg.norm(profiles, axis=1, keepdims=True)
+    best = np.argmax(chroma @ profiles.T, axis=1)
+    return best % 12, (best < 12).astype(np.int64)
+
+
+# Map keys onto the Camelot wheel
+def camelot(tonics, modes):
+    """
+    Convert keys to Camelot wheel positions.
+
+    Args:
+        tonics (ndarray): Tonic pitch classes (0 = C).
+        modes (ndarray): 1 for major ('B' keys), 0 for minor ('A' keys).
+
+    Returns:
+        ndarray: Camelot numbers from 1 to 12 (C major and A minor are 8).
+    """
+    # Minor keys share the number of their relative major, three semitones up
+    relative_major = np.where(modes == 1, tonics, (tonics + 3) % 12)
+    return (7 * relative_major + 7) % 12 + 1
+
+
+# Pairwise cost of mixing from one track into another
+def transition_costs(tempo, energy, numbers, modes, weights=None, block_size=512):
+    """
+    Build the matrix of transition costs between every pair of tracks.
+
+    Each term is computed with broadcasting over blocks of rows, so even a
+    5,000-track library needs no Python loop per pair and the temporaries
+    stay at block_size rows.
+
+    Tempo cost is the distance in octaves to the nearest of half, equal or
+    double tempo, so 70 and 140 bpm mix freely. Key cost is the number of
+    steps around the Camelot wheel, plus one to switch between major and
+    minor. Energy cost is the absolute energy difference.
+
+    Args:
+        tempo (ndarray): Tempo per track in beats per minute.
+        energy (ndarray): Energy per track, scaled to 0-1.
+        numbers (ndarray): Camelot number per track.
+        modes (ndarray): Camelot mode per track (1 major, 0 minor).
+        weights (dict): Weights of the 'tempo', 'key' and 'energy' terms.
+        block_size (int): Rows computed at a time.
+
+    Returns:
+        ndarray: float32 matrix of shape (N, N); entry [i, j] is the cost of playing j after i.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    log_tempo = np.log2(np.maximum(np.asarray(tempo, dtype=np.float32), 1.0))
+    energy = np.asarray(energy, dtype=np.float32)
+    numbers = np.asarray(numbers)
+    modes = np.asarray(modes)
+
+    count = len(log_tempo)
+    costs = np.empty((count, count), dtype=np.float32)
+    for start in range(0, count, block_size):
+        rows = slice(start, min(start + block_size, count))
+        block = costs[rows]
+
+        # Tempo, folded so half and double time count as a match
+        octaves = log_tempo[np.newaxis, :] - log_tempo[rows, np.newaxis]
+        octaves -= np.round(octaves)
+        np.abs(octaves, out=octaves)
+        np.multiply(octaves, weights["tempo"] / TEMPO_SCALE, out=block)
+
+        # Key, steps around the Camelot wheel plus a step to change mode
+        steps = np.abs(numbers[np.newaxis, :] - numbers[rows, np.newaxis])
+        steps = np.minimum(steps, 12 - steps) + (modes[np.newaxis, :] != modes[rows, np.newaxis])
+        block += steps * np.float32(weights["key"] / 7.0)
+
+        # Energy
+        block += np.abs(energy[np.newaxis, :] - energy[rows, np.newaxis]) * np.float32(weights["energy"])
+
+    np.fill_diagonal(costs, np.inf)
+    return costs
+
+
+# Target position of every slot of the set on the energy arc
+def energy_arc(length, start=0.2, peak=1.0, end=0.6, peak_position=0.7):
+    """
+    Warm-up, peak and cool-down curve of a set.
+
+    Args:
+        length (int): Number of tracks in the set.
+        start (float): Target level of the first track.
+        peak (float): Target level at the peak.
+        end (float): Target level of the last track.
+        peak_position (float): Where the peak falls, as a fraction of the set.
+
+    Returns:
+        ndarray: Target level (0-1) per slot.
+    """
+    positions = np.linspace(0.0, 1.0, length)
+    return np.interp(positions, [0.0, peak_position, 1.0], [start, peak, end])
+
+
+# Order tracks along the energy arc with a beam search over the cost matrix
+def order_set(costs, levels, beam_width=8, weights=None, arc=None):
+    """
+    Find a set order with low transition costs that follows the energy arc.
+
+    A beam search keeps the ``beam_width`` cheapest partial sets. At every
+    step each of them is extended with its cheapest unused tracks, scored by
+    the transition cost plus the distance to the arc's target level, and the
+    best extensions form the next beam. All candidates of a step are scored
+    with one vectorised operation over the beam.
+
+    Args:
+        costs (ndarray): Transition cost matrix, see transition_costs.
+        levels (ndarray): Level of every track on the arc's scale (0-1), e.g. party score percentiles.
+        beam_width (int): Number of partial sets kept at each step.
+        weights (dict): Weight of the 'arc' term.
+        arc (ndarray): Target level per slot (defaults to energy_arc).
+
+    Returns:
+        tuple: (track indices in play order, total cost).
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    levels = np.asarray(levels, dtype=np.float32)
+    count = len(levels)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), 0.0
+    arc = energy_arc(count) if arc is None else np.asarray(arc)
+    arc_weight = np.float32(weights["arc"])
+
+    # First slot: the tracks closest to the start of the arc
+    first_costs = arc_weight * np.abs(levels - arc[0])
+    width = min(beam_width, count)
+    starts = np.argpartition(first_costs, width - 1)[:width]
+    paths = np.zeros((width, count), dtype=np.int64)
+    paths[:, 0] = starts
+    totals = first_costs[starts].astype(np.float64)
+    used = np.zeros((width, count), dtype=bool)
+    used[np.arange(width), starts] = True
+
+    for step in range(1, count):
+        # Cost of every (beam, track) extension
+        candidates = costs[paths[:, step - 1]] + arc_weight * np.abs(levels - arc[step])
+        candidates[used] = np.inf
+        scores = totals[:, np.newaxis] + candidates
+
+        # Keep the best extensions over the whole beam
+        width = min(beam_width, scores.size)
+        flat = np.argpartition(scores, width - 1, axis=None)[:width]
+        flat = flat[np.isfinite(scores.flat[flat])]
+        beams, tracks = np.unravel_index(flat, scores.shape)
+
+        paths = paths[beams]
+        paths[:, step] = tracks
+        totals = scores[beams, tracks]
+        used = used[beams]
+        used[np.arange(len(beams)), tracks] = True
+
+    best = int(np.argmin(totals))
+    return paths[best], float(totals[best])
+
+
+# Order the songs of a folder from their cached features
+def order_folder(folder_path, cache=None, analysis=None, beam_width=8, weights=None):
+    """
+    Suggest a play order for every song in a folder.
+
+    Tempo and energy come from the feature cache and the mean chroma from a
+    cache entry of its own, so a song is decoded at most once for ordering
+    and scoring never pays for the chroma. The arc follows the party score
+    percentiles.
+
+    Args:
+        folder_path (str): Path to the folder containing audio files.
+        cache (FeatureCache): Feature cache to read from and write to (optional).
+        analysis (dict): Windowed analysis settings, see get_song_features (optional).
+        beam_width (int): Beam width of the search.
+        weights (dict): Weights of the cost terms, see DEFAULT_WEIGHTS.
+
+    Returns:
+        list: Song filenames in suggested play order.
+    """
+    names, tempos, energies, chromas = [], [], [], []
+    for filename in sorted(os.listdir(folder_path)):
+        if not filename.endswith(".mp3"):
+            continue
+        try:
+            features = get_song_features(os.path.join(folder_path, filename), cache, analysis, extra=("chroma",))
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+            continue
+        names.append(filename)
+        tempos.append(float(features["tempo"]))
+        energies.append(float(features["energy"]))
+        chromas.append(features["chroma"])
+    if not names:
+        return []
+
+    tempos = np.array(tempos)
+    energies = np.array(energies)
+    party_scores = np.array([score_from_features(tempo, energy) for tempo, energy in zip(tempos, energies)])
+    levels = np.argsort(np.argsort(party_scores)) / max(len(names) - 1, 1)
+
+    energy_range = np.ptp(energies)
+    scaled_energy = (energies - energies.min()) / energy_range if energy_range > 0 else np.zeros(len(names))
+    tonics, modes = estimate_keys(np.array(chromas))
+    costs = transition_costs(tempos, scaled_energy, camelot(tonics, modes), modes, weights)
+    order, _ = order_set(costs, levels, beam_width, weights)
+    return [names[index] for index in order]
+
+
+if __name__ == "__main__":
+    for position, name in enumerate(order_folder("./playlist", cache=default_feature_cache()), start=1):
+        print(f"{position:3d}. {name}")
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+
+DEFAULT_BASE_URL = "https://api.spotify.com/v1"
+
+# Default location of the response cache, next to the playlist folder
+DEFAULT_CACHE_DIR = ".spotify_cache"
+
+# Seconds a cached response is used without asking the API again
+DEFAULT_TTL = 600
+
+# Default size budget of the response cache (64 MB)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Seconds an unused response is kept before it is evicted (30 days)
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# Largest page or batch each endpoint accepts
+PLAYLIST_PAGE_SIZE = 100
+TRACKS_BATCH_SIZE = 50
+AUDIO_FEATURES_BATCH_SIZE = 100
+
+
+class SpotifyAPIError(Exception):
+    """
+    Custom exception for Spotify API errors.
+    """
+    pass
+
+
+# Get the playlist ID from a playlist link, URI or bare ID
+def playlist_id_from_url(url):
+    """
+    Extract the playlist ID from a Spotify playlist URL or URI.
+
+    Args:
+        url (str): URL such as https://open.spotify.com/playlist/<id>?si=..., a
+            spotify:playlist:<id> URI or the ID itself.
+
+    Returns:
+        str: The playlist ID.
+    """
+    if "playlist/" in url:
+        url = url.split("playlist/", 1)[1]
+    elif url.startswith("spotify:playlist:"):
+        url = url[len("spotify:playlist:"):]
+    return url.split("?", 1)[0].strip("/")
+
+
+# Default transport: one GET request with urllib
+def urllib_transport(url, headers):
+    """
+    Send a GET request.
+
+    Args:
+        url (str): Request URL.
+        headers (dict): Request headers.
+
+    Returns:
+        tuple: (status code, response headers with lower-case names, body bytes).
+    """
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, {k.lower(): v for k, v in response.headers.items()}, response.read()
+    except urllib.error.HTTPError as e:
+        # Error statuses (and 304 Not Modified) still carry headers and a body
+        return e.code, {k.lower(): v for k, v in e.headers.items()}, e.read()
+
+
+class ResponseCache:
+    """
+    On-disk cache of API responses, one JSON file per request URL.
+
+    A response younger than the TTL is used as-is. An older one is
+    revalidated with its ETag, so an unchanged resource costs a 304 reply
+    instead of the whole body. Entries unused for ``max_age`` seconds are
+    dropped, and when the total size goes over ``max_bytes`` the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._total_bytes = None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key):
+        """
+        Get a cached response.
+
+        Args:
+            key (str): Cache key, normally the request URL.
+
+        Returns:
+            dict: Entry with 'body', 'etag' and 'fetched_at', or None if nothing is cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file_in:
+                entry = json.load(file_in)
+        except (OSError, ValueError):
+            return None
+
+        # Mark the entry as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def fresh(self, entry, ttl=None):
+        """
+        Whether an entry is young enough to use without revalidating it.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() - entry["fetched_at"] < ttl
+
+    def put(self, key, body, etag=None):
+        """
+        Store a response.
+
+        Args:
+            key (str): Cache key, normally the request URL.
+            body: Parsed JSON body.
+            etag (str): ETag the API sent with the response (optional).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file_out:
+                json.dump({"key": key, "etag": etag, "fetched_at": time.time(), "body": body}, file_out)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # The first write of a session also sweeps out entries past max_age
+        if self._total_bytes is None:
+            self.evict()
+            return
+        self._total_bytes += os.path.getsize(path) - replaced
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def total_bytes(self):
+        """
+        Total size of the cached responses in bytes.
+        """
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    def evict(self, max_bytes=None, max_age=None):
+        """
+        Remove entries unused for max_age seconds, then the least recently used
+        ones until the cache fits in max_bytes.
+
+        Args:
+            max_bytes (int): Size budget, defaults to the cache's max_bytes.
+            max_age (float): Age limit in seconds, defaults to the cache's max_age.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        oldest = time.time() - max_age
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for used_at, size, name in entries:
+            if total <= max_bytes and used_at >= oldest:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        return removed
+
+
+class SpotifyClient:
+    """
+    Read-only Spotify Web API client built for bulk metadata fetches.
+
+    Once the first page of a playlist gives its length, the remaining pages
+    are fetched concurrently. Track and audio feature lookups are sent in
+    batches of the largest size the API accepts. Responses can be cached on
+    disk; playlist pages are cached under the playlist's snapshot ID, so
+    re-syncing an unchanged playlist costs a single request.
+
+    The HTTP transport and base URL are pluggable, so the client can run
+    against a local fake server without network access.
+    """
+
+    def __init__(self, auth_manager=None, base_url=DEFAULT_BASE_URL, transport=urllib_transport, cache=None,
+                 workers=8, max_retries=5):
+        """
+        Args:
+            auth_manager: Object with get_access_token(as_dict=False), e.g. spotipy's
+                SpotifyClientCredentials (None sends no Authorization header).
+            base_url (str): API root URL.
+            transport (callable): transport(url, headers) -> (status, headers, body), see urllib_transport.
+            cache (ResponseCache): Response cache (optional).
+            workers (int): Maximum concurrent requests.
+            max_retries (int): Retries of a request the API rate-limited (status 429).
+        """
+        self.auth_manager = auth_manager
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport
+        self.cache = cache
+        self.workers = workers
+        self.max_retries = max_retries
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def _headers(self):
+        headers = {"Accept": "application/json"}
+        if self.auth_manager is not None:
+            headers["Authorization"] = f"Bearer {self.auth_manager.get_access_token(as_dict=False)}"
+        return headers
+
+    def _send(self, url, headers):
+        # One request, waiting out rate limits
+        for attempt in range(self.max_retries + 1):
+            with self._count_lock:
+                self.request_count += 1
+            status, response_headers, body = self.transport(url, headers)
+            if status != 429 or attempt == self.max_retries:
+                return status, response_headers, body
+            time.sleep(float(response_headers.get("retry-after", 1)))
+
+    # GET an endpoint, through the cache if there is one
+    def get(self, path, params=None, cache_key=None, ttl=None):
+        """
+        Fetch one API resource.
+
+        Args:
+            path (str): Endpoint path relative to the base URL, e.g. "tracks".
+            params (dict): Query parameters (optional).
+            cache_key (str): Key to cache the response under (defaults to the URL).
+            ttl (float): Seconds the cached response stays fresh (defaults to the cache's TTL).
+
+        Returns:
+            dict: The parsed JSON response.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        if params:
+            url += "?" + urlencode(params)
+        cache_key = cache_key or url
+
+        entry = self.cache.get(cache_key) if self.cache is not None else None
+        if entry is not None and self.cache.fresh(entry, ttl):
+            return entry["body"]
+
+        headers = self._headers()
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        status, response_headers, body = self._send(url, headers)
+
+        if status == 304 and entry is not None:
+            self.cache.put(cache_key, entry["body"], entry.get("etag"))
+            return entry["body"]
+        if status != 200:
+            raise SpotifyAPIError(f"GET {url} failed with status {status}: {body[:200]!r}")
+        data = json.loads(body)
+        if self.cache is not None:
+            self.cache.put(cache_key, data, response_headers.get("etag"))
+        return data
+
+    def _map(self, function, values):
+        # Apply function to every value, concurrently, keeping the order
+        values = list(values)
+        if self.workers <= 1 or len(values) <= 1:
+            return [function(value) for value in values]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(values))) as pool:
+            return list(pool.map(function, values))
+
+    # Playlist name, snapshot and length
+    def playlist(self, playlist_id):
+        """
+        Get a playlist's metadata.
+
+        Args:
+            playlist_id (str): Playlist ID, URL or URI.
+
+        Returns:
+            dict: Playlist with 'name', 'snapshot_id' and 'tracks' ({'total': ...}).
+        """
+        playlist_id = playlist_id_from_url(playlist_id)
+        return self.get(f"playlists/{playlist_id}", {"fields": "name,snapshot_id,tracks.total"})
+
+    # Every item of a playlist, pages fetched concurrently
+    def playlist_items(self, playlist_id, snapshot_id=None):
+        """
+        Get every item of a playlist.
+
+        Args:
+            playlist_id (str): Playlist ID, URL or URI.
+            snapshot_id (str): Playlist version from playlist(). Pages are then cached
+                for as long as the playlist keeps this snapshot.
+
+        Returns:
+            list: Playlist items (each holding a 'track'), in playlist order.
+        """
+        playlist_id = playlist_id_from_url(playlist_id)
+
+        def page(offset):
+            params = {"limit": PLAYLIST_PAGE_SIZE, "offset": offset}
+            if snapshot_id is None:
+                return self.get(f"playlists/{playlist_id}/tracks", params)
+            key = f"playlists/{playlist_id}/tracks@{snapshot_id}?offset={offset}"
+            return self.get(f"playlists/{playlist_id}/tracks", params, cache_key=key, ttl=float("inf"))
+
+        first = page(0)
+        pages = self._map(page, range(PLAYLIST_PAGE_SIZE, first["total"], PLAYLIST_PAGE_SIZE))
+        return first["items"] + [item for rest in pages for item in rest["items"]]
+
+    def _batched(self, path, key, ids, batch_size):
+        # Look up IDs in batches of batch_size, concurrently
+        ids = list(ids)
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+        responses = self._map(lambda batch: self.get(path, {"ids": ",".join(batch)}), batches)
+        return [value for response in responses for value in response[key]]
+
+    # Full track objects
+    def tracks(self, track_ids):
+        """
+        Get track objects in batches of 50.
+
+        Args:
+            track_ids (iterable): Spotify track IDs.
+
+        Returns:
+            list: Track objects in the same order (None for unknown IDs).
+        """
+        return self._batched("tracks", "tracks", track_ids, TRACKS_BATCH_SIZE)
+
+    # Danceability, energy, tempo and the other audio features
+    def audio_features(self, track_ids):
+        """
+        Get audio features in batches of 100.
+
+        Args:
+            track_ids (iterable): Spotify track IDs.
+
+        Returns:
+            list: Audio feature objects in the same order (None where Spotify has none).
+        """
+        return self._batched("audio-features", "audio_features", track_ids, AUDIO_FEATURES_BATCH_SIZE)
@@ -0,0 +1,128 @@
+import sys
+
+import numpy as np
+import soundfile as sf
+
+
+def _match_channels(block, channels):
+    """
+    Up- or down-mix a (frames, channels) block to the requested channel count.
+    """
+    if block.shape[1] == channels:
+        return block
+    if block.shape[1] == 1:
+        return np.repeat(block, channels, axis=1)
+    mono = block.mean(axis=1, keepdims=True, dtype=np.float32)
+    return mono if channels == 1 else np.repeat(mono, channels, axis=1)
+
+
+def copy_blocks(source, sink, frames, channels, blocksize=65536):
+    """
+    Copy frames from one open sound file to another in fixed-size blocks.
+
+    Parameters:
+    -----------
+    source : sf.SoundFile
+        File to read from, positioned at the first frame to copy
+    sink : sf.SoundFile
+        File to write to
+    frames : int
+        Number of frames to copy (-1 copies to the end of the source)
+    channels : int
+        Channel count of the sink
+    blocksize : int
+        Frames per block
+
+    Returns:
+    --------
+    int
+        Number of frames copied
+    """
+    copied = 0
+    while frames < 0 or copied < frames:
+        count = blocksize if frames < 0 else min(blocksize, frames - copied)
+        block = source.read(count, dtype='float32', always_2d=True)
+        if len(block) == 0:
+            break
+        sink.write(_match_channels(block, channels))
+        copied += len(block)
+    return copied
+
+
+def stream_crossfade(path_1, path_2, output_path, crossfade_duration=2.0, transition_point=None,
+                     blocksize=65536):
+    """
+    Render a crossfade between two files without loading either one fully.
+
+    The first song is copied to the output block by block up to the
+    transition, only the crossfade window of both songs is held in memory and
+    mixed, and the rest of the second song is streamed through. Peak memory is
+    bounded by the crossfade length and block size, not the track lengths.
+
+    Parameters:
+    -----------
+    path_1 : str
+        First audio file (played up to the transition)
+    path_2 : str
+        Second audio file (transitioned into)
+    output_path : str
+        Output file; the format follows the extension (wav, flac, ogg, mp3)
+    crossfade_duration : float, optional
+        Duration of the crossfade between tracks in seconds
+    transition_point : float, optional
+        Start of the crossfade in seconds into the first song.
+        Defaults to crossfade_duration before its end, like create_full_transition.
+    blocksize : int, optional
+        Frames per block for the streamed parts
+
+    Returns:
+    --------
+    int
+        Number of frames written
+    """
+    with sf.SoundFile(path_1) as song_1, sf.SoundFile(path_2) as song_2:
+        if song_1.samplerate != song_2.samplerate:
+            raise ValueError(
+                f"Sample rates differ ({song_1.samplerate} Hz vs {song_2.samplerate} Hz); "
+                "resample one of the files first."
+            )
+        fs = song_1.samplerate
+        channels = max(song_1.channels, song_2.channels)
+
+        crossfade_samples = int(crossfade_duration * fs)
+        if transition_point is None:
+            transition_start = song_1.frames - crossfade_samples
+        else:
+            transition_start = int(transition_point * fs)
+        if transition_start < 0:
+            raise ValueError("First audio signal is too short for the specified crossfade duration.")
+        crossfade_samples = min(crossfade_samples, song_1.frames - transition_start, song_2.frames)
+
+        with sf.SoundFile(output_path, 'w', samplerate=fs, channels=channels) as output:
+            # First song up to the transition
+            written = copy_blocks(song_1, output, transition_start, channels, blocksize)
+
+            # Crossfade window, the only part that is mixed
+            outro = _match_channels(song_1.read(crossfade_samples, dtype='float32', always_2d=True), channels)
+            intro = _match_channels(song_2.read(crossfade_samples, dtype='float32', always_2d=True), channels)
+            fade_in = np.linspace(0, 1, crossfade_samples, dtype=np.float32)[:, np.newaxis]
+            # outro * (1 - fade) + intro * fade, computed in place in the intro buffer
+            intro -= outro
+            intro *= fade_in
+            intro += outro
+            output.write(intro)
+            written += len(intro)
+
+            # Rest of the second song
+            written += copy_blocks(song_2, output, -1, channels, blocksize)
+
+    return written
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python stream_render.py first.mp3 second.mp3 output.wav [crossfade_seconds]")
+        sys.exit(1)
+    crossfade = float(sys.argv[4]) if len(sys.argv) > 4 else 2.0
+    frames = stream_crossfade(sys.argv[1], sys.argv[2], sys.argv[3], crossfade_duration=crossfade)
+    print(f"Done! Wrote {frames} frames to '{sys.argv[3]}'")
@@ -2,6 +2,13 @@ import numpy as np
 import librosa
 import soundfile as sf
 import matplotlib.pyplot as plt
+from feature_store import default_store
+from mixkernels import mix_into, ramp
+from segment_loader import native_rate, read_frames, stream_frames, track_frames
+from timewarp import warp_audio
+
+# Seconds at the end of the first song and the start of the second that are aligned and mixed
+TRANSITION_WINDOW = 30.0
 
 def warp_audio_with_dtw(x, wp, fs, hop_length=512):
     """
@@ -10,9 +17,9 @@ def warp_audio_with_dtw(x, wp, fs, hop_length=512):
     Parameters:
     -----------
     x : np.ndarray
-        Audio signal to be warped
+        Audio signal to be warped (the second sequence of the DTW)
     wp : np.ndarray
-        Warping path
+        Warping path, as returned by librosa (end to start) or in increasing order
     fs : int
         Sampling rate
     hop_length : int, optional
@@ -21,15 +28,9 @@ def warp_audio_with_dtw(x, wp, fs, hop_length=512):
     Returns:
     --------
     np.ndarray
-        Warped audio signal
+        Warped audio signal on the timeline of the first sequence
     """
-    # Map frame indices to time
-    time_warped = librosa.frames_to_samples(wp[:, 1], hop_length=hop_length) / fs
-    audio_time = np.arange(len(x)) / fs
-
-    # Interpolate audio signal to align with the warped timeline
-    warped_audio = np.interp(audio_time, time_warped, x)
-    return warped_audio
+    return warp_audio(x, wp, hop_length=hop_length)
 
 def create_full_transition(x_1, x_2, wp_s, fs, crossfade_duration=1.0):
     """
@@ -51,7 +52,7 @@ def create_full_transition(x_1, x_2, wp_s, fs, crossfade_duration=1.0):
     Returns:
     --------
     np.ndarray
-        The complete audio signal with transition
+        The complete float32 audio signal with transition
     """
     # Convert crossfade duration to samples
     crossfade_samples = int(crossfade_duration * fs)
@@ -63,56 +64,61 @@ def create_full_transition(x_1, x_2, wp_s, fs, crossfade_duration=1.0):
     
     total_length = len(x_1) + len(x_2) - crossfade_samples
     
-    # Create output array
-    output = np.zeros(total_length)
+    # Create output array (every sample is written below)
+    output = np.empty(total_length, dtype=np.float32)
+    transition_end = transition_start + crossfade_samples
     
     # Copy the first signal
-    output[:len(x_1)] = x_1
-    
-    # Create crossfade weights
-    fade_out = np.linspace(1, 0, crossfade_samples)
-    fade_in = np.linspace(0, 1, crossfade_samples)
+    output[:transition_start] = x_1[:transition_start]
     
-    # Apply crossfade
-    output[transition_start:transition_start + crossfade_samples] = (
-        x_1[transition_start:transition_start + crossfade_samples] * fade_out +
-        x_2[:crossfade_samples] * fade_in
-    )
+    # Apply crossfade, fading and summing both signals in one pass
+    mix_into(output[transition_start:transition_end], x_1[transition_start:], 1.0,
+             ramp(crossfade_samples, False), accumulate=False)
+    mix_into(output[transition_start:transition_end], x_2[:crossfade_samples], 1.0, ramp(crossfade_samples, True))
     
     # Add the rest of x_2
-    output[transition_start + crossfade_samples:] = x_2[crossfade_samples:]
+    output[transition_end:] = x_2[crossfade_samples:]
     
     return output
 
-def main():
+def main(song_1='bunny.mp3', song_2='music.mp3', output='full_transition.wav', window=TRANSITION_WINDOW):
     try:
-        # Load audio files
-        print("Loading audio files...")
-        x_1, fs = librosa.load('bunny.mp3', sr=None, duration=200)
-        x_2, fs = librosa.load('music.mp3', sr=None, duration=200)
+        # Only the end of the first song and the start of the second are decoded for the transition
+        print("Loading transition windows...")
+        fs = native_rate(song_1)
+        frames_1, frames_2 = track_frames(song_1, fs), track_frames(song_2, fs)
+        tail_start = max(frames_1 - int(window * fs), 0)
+        head_end = min(int(window * fs), frames_2)
+        x_1, _ = read_frames(song_1, tail_start, frames_1, sr=fs)
+        x_2, _ = read_frames(song_2, 0, head_end, sr=fs)
 
         print("Calculating chroma features...")
-        # Calculate chroma features
+        # Calculate chroma features of the windows (sliced from the store if the whole track is there)
         hop_length = 1024
-        x_1_chroma = librosa.feature.chroma_cqt(y=x_1, sr=fs, hop_length=hop_length)
-        x_2_chroma = librosa.feature.chroma_cqt(y=x_2, sr=fs, hop_length=hop_length)
+        x_1_chroma = default_store.get_window(song_1, 'chroma', tail_start / fs, len(x_1) / fs, sr=fs,
+                                              hop_length=hop_length, y=x_1)
+        x_2_chroma = default_store.get_window(song_2, 'chroma', 0.0, len(x_2) / fs, sr=fs,
+                                              hop_length=hop_length, y=x_2)
 
         print("Computing DTW...")
         # Compute DTW
         D, wp = librosa.sequence.dtw(X=x_1_chroma, Y=x_2_chroma, metric='cosine')
 
         print("Warping second audio signal...")
-        # Warp the second audio signal
+        # Warp the start of the second song onto the end of the first
         x2_warped = warp_audio_with_dtw(x_2, wp, fs, hop_length=hop_length)
 
         print("Creating transition...")
-        # Create full audio with transition
-        full_audio = create_full_transition(x_1, x2_warped, wp, fs, crossfade_duration=2.0)
+        # Create the transition between the windows
+        transition_audio = create_full_transition(x_1, x2_warped, wp, fs, crossfade_duration=2.0)
 
         print("Saving output file...")
-        # Save the result
-        sf.write('full_transition.wav', full_audio, fs)
-        print("Done! Output saved as 'full_transition.wav'")
+        # Stream the rest of both songs around the transition
+        with sf.SoundFile(output, 'w', samplerate=fs, channels=1) as sink:
+            stream_frames(sink, song_1, 0, tail_start, fs)
+            sink.write(transition_audio)
+            stream_frames(sink, song_2, head_end, frames_2, fs)
+        print(f"Done! Output saved as '{output}'")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
@@ -0,0 +1,185 @@
+import numpy as np
+
+INTERPOLATORS = ("linear", "cubic")
+
+
+def monotonic_path(wp):
+    """
+    Put a DTW warping path in increasing order and make it monotonic.
+
+    librosa returns paths from the end back to the start; those are
+    reversed. Any remaining backward step is clamped with a running maximum,
+    so both columns never decrease.
+
+    Parameters:
+    -----------
+    wp : np.ndarray
+        Warping path as (L x 2) frame pairs, in either order
+
+    Returns:
+    --------
+    np.ndarray
+        Warping path with non-decreasing columns
+    """
+    wp = np.asarray(wp)
+    if wp.ndim != 2 or wp.shape[1] != 2 or len(wp) == 0:
+        raise ValueError("Warping path must be a non-empty (L x 2) array.")
+    if wp[0].sum() > wp[-1].sum():
+        wp = wp[::-1]
+    return np.maximum.accumulate(wp, axis=0)
+
+
+def _collapse_runs(keys, values):
+    """
+    Merge pairs with equal keys (keys sorted) into one pair with the mean value.
+    """
+    unique_keys, starts = np.unique(keys, return_index=True)
+    counts = np.diff(np.append(starts, len(keys)))
+    return unique_keys.astype(np.float64), np.add.reduceat(values.astype(np.float64), starts) / counts
+
+
+class TimeMap:
+    """
+    Sample-level map from the reference timeline to the warped signal.
+
+    The warping path gives one anchor per frame pair. Horizontal and vertical
+    runs of the path (a frame of one sequence matched to several frames of
+    the other) are collapsed to their mean, so the map has no flat steps or
+    jumps. Between anchors positions are interpolated linearly, before the
+    first and after the last anchor they advance in real time. Positions are
+    computed per range of samples, so the map never holds the whole timeline.
+    """
+
+    def __init__(self, wp, hop_length=512):
+        wp = monotonic_path(wp)
+        reference_frames, source_frames = _collapse_runs(wp[:, 0], wp[:, 1])
+        source_frames, reference_frames = _collapse_runs(source_frames, reference_frames)
+
+        self.hop_length = hop_length
+        self.reference = reference_frames * hop_length
+        self.source = source_frames * hop_length
+        self.length = int(wp[-1, 0] + 1) * hop_length
+
+    def positions(self, start, stop):
+        """
+        Positions in the warped signal of reference samples start to stop.
+
+        Parameters:
+        -----------
+        start, stop : int
+            Range of reference samples
+
+        Returns:
+        --------
+        np.ndarray
+            Fractional sample positions (float64)
+        """
+        samples = np.arange(start, stop, dtype=np.float64)
+        positions = np.interp(samples, self.reference, self.source)
+        before = samples < self.reference[0]
+        positions[before] = self.source[0] + samples[before] - self.reference[0]
+        after = samples > self.reference[-1]
+        positions[after] = self.source[-1] + samples[after] - self.reference[-1]
+        return positions
+
+
+def resample_at(x, positions, kind="cubic"):
+    """
+    Read a signal at fractional sample positions.
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        Signal, time on the last axis
+    positions : np.ndarray
+        Fractional sample positions; positions outside the signal read silence
+    kind : str
+        'linear' or 'cubic' (Catmull-Rom)
+
+    Returns:
+    --------
+    np.ndarray
+        float32 samples, one per position
+    """
+    if kind not in INTERPOLATORS:
+        raise ValueError(f"Unknown interpolator '{kind}', expected one of {INTERPOLATORS}")
+    last = x.shape[-1] - 1
+    index = np.floor(positions).astype(np.int64)
+    fraction = (positions - index).astype(np.float32)
+
+    x_0 = x[..., np.clip(index, 0, last)].astype(np.float32, copy=False)
+    x_1 = x[..., np.clip(index + 1, 0, last)].astype(np.float32, copy=False)
+    if kind == "linear":
+        result = x_0 + fraction * (x_1 - x_0)
+    else:
+        x_m1 = x[..., np.clip(index - 1, 0, last)].astype(np.float32, copy=False)
+        x_2 = x[..., np.clip(index + 2, 0, last)].astype(np.float32, copy=False)
+        result = x_0 + 0.5 * fraction * (
+            x_1 - x_m1 + fraction * (
+                2.0 * x_m1 - 5.0 * x_0 + 4.0 * x_1 - x_2 + fraction * (3.0 * (x_0 - x_1) + x_2 - x_m1)
+            )
+        )
+
+    result[..., (positions < 0) | (positions > last)] = 0.0
+    return result
+
+
+def iter_warped_chunks(x, time_map, length=None, kind="cubic", chunk_size=65536):
+    """
+    Warp a signal onto the reference timeline one chunk at a time.
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        Signal to warp, time on the last axis
+    time_map : TimeMap
+        Map from reference samples to positions in x
+    length : int, optional
+        Number of output samples (defaults to the end of the last reference frame)
+    kind : str
+        Interpolator, see resample_at
+    chunk_size : int
+        Output samples per chunk; working memory scales with this
+
+    Yields:
+    -------
+    np.ndarray
+        Consecutive float32 chunks of the warped signal
+    """
+    length = time_map.length if length is None else length
+    for start in range(0, length, chunk_size):
+        yield resample_at(x, time_map.positions(start, min(start + chunk_size, length)), kind)
+
+
+def warp_audio(x, wp, hop_length=512, length=None, kind="cubic", chunk_size=65536):
+    """
+    Warp an audio signal along a DTW path so it lines up with the reference.
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        Audio signal to warp (the second column of the path), time on the last axis
+    wp : np.ndarray
+        Warping path of (reference_frame, x_frame) pairs, in either order
+    hop_length : int, optional
+        Hop length used for feature extraction
+    length : int, optional
+        Number of output samples (defaults to the end of the last reference frame)
+    kind : str, optional
+        'linear' or 'cubic' interpolation
+    chunk_size : int, optional
+        Samples resampled at a time
+
+    Returns:
+    --------
+    np.ndarray
+        Warped float32 audio signal on the reference timeline
+    """
+    time_map = TimeMap(wp, hop_length)
+    length = time_map.length if length is None else length
+    warped = np.empty(x.shape[:-1] + (length,), dtype=np.float32)
+    start = 0
+    for chunk in iter_warped_chunks(x, time_map, length, kind, chunk_size):
+        warped[..., start:start + chunk.shape[-1]] = chunk
+        start += chunk.shape[-1]
+    return warped
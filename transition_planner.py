@@ -0,0 +1,190 @@
+import sys
+
+import librosa
+import numpy as np
+
+from feature_store import default_store
+from transitions import BeatMatchedTransition
+
+# Frame settings of the party score's beat tracker
+BEAT_SR = 22050
+BEAT_HOP_LENGTH = 512
+
+
+def beat_grid(path, beats_per_bar=4, store=default_store):
+    """
+    Beats, tempo and downbeats of a track, from the feature store.
+
+    Beat frames come from partyscore's beat tracker and are cached with the
+    onset envelope, so only the first call for a track decodes it. The
+    downbeat phase is the one whose beats have the strongest mean onset.
+
+    Parameters:
+    -----------
+    path : str
+        Audio file
+    beats_per_bar : int
+        Beats per bar
+    store : FeatureStore
+        Store holding the beat frames and onset envelopes
+
+    Returns:
+    --------
+    dict
+        'beat_times' and 'downbeats' in seconds, 'tempo' in bpm and 'duration' in seconds
+    """
+    features = store.get_many(path, ["onset", "beats"], sr=BEAT_SR, hop_length=BEAT_HOP_LENGTH)
+    beat_frames = np.asarray(features["beats"])
+    beat_times = librosa.frames_to_time(beat_frames, sr=BEAT_SR, hop_length=BEAT_HOP_LENGTH)
+    onset_env = features["onset"]
+    duration = float(librosa.frames_to_time(len(onset_env) - 1, sr=BEAT_SR, hop_length=BEAT_HOP_LENGTH))
+
+    if len(beat_frames) < 2:
+        return {"beat_times": beat_times, "downbeats": np.zeros(1), "tempo": None, "duration": duration}
+
+    strength = onset_env[np.minimum(beat_frames, len(onset_env) - 1)]
+    phases = min(beats_per_bar, len(beat_frames))
+    phase = int(np.argmax([strength[p::beats_per_bar].mean() for p in range(phases)]))
+    return {
+        "beat_times": beat_times,
+        "downbeats": beat_times[phase::beats_per_bar],
+        "tempo": 60.0 / float(np.median(np.diff(beat_times))),
+        "duration": duration,
+    }
+
+
+def stretch_rate(tempo_1, tempo_2, max_stretch=0.12):
+    """
+    Rate that brings song 2 to song 1's tempo, allowing half and double time.
+
+    Parameters:
+    -----------
+    tempo_1, tempo_2 : float
+        Tempos in bpm (None if unknown)
+    max_stretch : float
+        Largest relative change of speed; beyond it song 2 is left unstretched
+
+    Returns:
+    --------
+    float
+        Rate for librosa.effects.time_stretch (1.0 means no stretch)
+    """
+    if not tempo_1 or not tempo_2:
+        return 1.0
+    rate = min((tempo_1 / (tempo_2 * factor) for factor in (0.5, 1.0, 2.0)), key=lambda r: abs(np.log(r)))
+    return float(rate) if abs(rate - 1.0) <= max_stretch else 1.0
+
+
+def plan_transition(grid_1, grid_2, bars=8, beats_per_bar=4, transition_point_ratio=0.75, max_stretch=0.12):
+    """
+    Pick downbeat-aligned exit and entry points and the crossfade length in bars.
+
+    Song 1 exits on the downbeat closest to transition_point_ratio of its
+    length that leaves room for the crossfade. Song 2 enters on its first
+    downbeat. The crossfade lasts `bars` bars at song 1's tempo, and song 2's
+    overlap is stretched to that tempo.
+
+    Parameters:
+    -----------
+    grid_1, grid_2 : dict
+        Beat grids of both songs, see beat_grid
+    bars : int
+        Length of the crossfade in bars
+    beats_per_bar : int
+        Beats per bar
+    transition_point_ratio : float
+        Preferred exit point as a fraction of song 1
+    max_stretch : float
+        Largest relative tempo change, see stretch_rate
+
+    Returns:
+    --------
+    dict
+        'exit_time', 'entry_time', 'overlap_duration' (seconds), 'rate',
+        'tempo_1', 'tempo_2' and 'bars'
+    """
+    tempo_1, tempo_2 = grid_1["tempo"], grid_2["tempo"]
+    beat_duration = 60.0 / (tempo_1 or 120.0)
+    overlap_duration = bars * beats_per_bar * beat_duration
+    rate = stretch_rate(tempo_1, tempo_2, max_stretch)
+
+    # Exit downbeats that leave room for the whole crossfade
+    downbeats = grid_1["downbeats"]
+    fitting = downbeats[downbeats + overlap_duration <= grid_1["duration"]]
+    target = transition_point_ratio * grid_1["duration"]
+    if len(fitting):
+        exit_time = float(fitting[np.argmin(np.abs(fitting - target))])
+    else:
+        exit_time = max(grid_1["duration"] - overlap_duration, 0.0)
+
+    return {
+        "exit_time": exit_time,
+        "entry_time": float(grid_2["downbeats"][0]),
+        "overlap_duration": overlap_duration,
+        "rate": rate,
+        "tempo_1": tempo_1,
+        "tempo_2": tempo_2,
+        "bars": bars,
+    }
+
+
+def plan_set(paths, bars=8, beats_per_bar=4, transition_point_ratio=0.75, max_stretch=0.12, store=default_store):
+    """
+    Plan the transitions between consecutive tracks of a set.
+
+    Each track's beat grid is read once, so after the first analysis of a
+    track planning costs a feature store lookup per pair.
+
+    Parameters:
+    -----------
+    paths : list
+        Audio files in play order
+    bars, beats_per_bar, transition_point_ratio, max_stretch
+        See plan_transition
+    store : FeatureStore
+        Store holding the beat frames
+
+    Returns:
+    --------
+    list
+        One plan per pair of consecutive tracks, see plan_transition
+    """
+    grids = [beat_grid(path, beats_per_bar, store) for path in paths]
+    return [
+        plan_transition(grid_1, grid_2, bars, beats_per_bar, transition_point_ratio, max_stretch)
+        for grid_1, grid_2 in zip(grids, grids[1:])
+    ]
+
+
+def plan_to_transition(plan):
+    """
+    Transition strategy that renders a plan.
+    """
+    return BeatMatchedTransition(
+        exit_time=plan["exit_time"],
+        entry_time=plan["entry_time"],
+        overlap_duration=plan["overlap_duration"],
+        rate=plan["rate"],
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python transition_planner.py first.mp3 second.mp3 [output.wav]")
+        sys.exit(1)
+    plan = plan_set(sys.argv[1:3])[0]
+    tempo_1 = f"{plan['tempo_1']:.1f}" if plan["tempo_1"] else "?"
+    tempo_2 = f"{plan['tempo_2']:.1f}" if plan["tempo_2"] else "?"
+    print(f"Tempo {tempo_1} -> {tempo_2} bpm, stretch rate {plan['rate']:.3f}")
+    print(f"Exit at {plan['exit_time']:.2f}s, enter at {plan['entry_time']:.2f}s, "
+          f"{plan['bars']} bars ({plan['overlap_duration']:.2f}s) of crossfade")
+
+    if len(sys.argv) > 3:
+        import soundfile as sf
+
+        from pcm_cache import load_pcm
+
+        x_1, fs = load_pcm(sys.argv[1], sr=None)
+        x_2, _ = load_pcm(sys.argv[2], sr=fs)
+        sf.write(sys.argv[3], plan_to_transition(plan).render(x_1, x_2, fs), fs)
+        print(f"Done! Output saved as '{sys.argv[3]}'")
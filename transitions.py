@@ -0,0 +1,466 @@
+import numpy as np
+
+from asset_bank import get_effect
+from mixkernels import mean_square, mix_into, peak, ramp
+from reverb import reverb_tail
+
+
+def create_reverb_tail(audio, sr=22050, room_size=0.8, damping=0.4, decay=3.0, seed=0):
+    """
+    Create a more pronounced reverb tail for smooth transition
+
+    The impulse response is seeded and cached, and applied with partitioned
+    convolution (see reverb.py), so the same input always gives the same tail.
+
+    Parameters:
+    -----------
+    audio : np.ndarray
+        Segment to reverberate
+    sr : int
+        Sampling rate
+    room_size : float
+        Larger rooms decay more slowly
+    damping : float
+        How much the impulse response is attenuated towards its end (0-1)
+    decay : float
+        Length of the reverb tail in seconds
+    seed : int
+        Seed of the impulse response noise
+
+    Returns:
+    --------
+    np.ndarray
+        Reverberated segment followed by its tail (len(audio) + decay * sr - 1 samples)
+    """
+    return reverb_tail(audio, sr=sr, room_size=room_size, damping=damping, decay=decay, seed=seed)
+
+
+def load_scratch_sample(fs, duration=None):
+    """
+    Get the disc scratch sample at the given sampling rate from the shared asset bank.
+
+    Parameters:
+    -----------
+    fs : int
+        Sampling rate to resample the sample to
+    duration : float, optional
+        Only keep the first `duration` seconds
+
+    Returns:
+    --------
+    np.ndarray
+        Read-only mono scratch sample
+    """
+    return get_effect("scratch", sr=fs, duration=duration)
+
+
+def _nonzero(level):
+    return level if level > 0 else 1.0
+
+
+def _peak(x):
+    return _nonzero(peak(x))
+
+
+def _stats(x):
+    return peak(x), float(np.sqrt(mean_square(x)))
+
+
+def _as_mono(x):
+    # Accept (samples,), (samples, channels) or librosa's (channels, samples)
+    if x.ndim == 1:
+        return x
+    return np.mean(x, axis=int(np.argmin(x.shape)))
+
+
+class Transition:
+    """
+    Common interface of the transition strategies.
+
+    A strategy only decides what happens around the transition point: its
+    `window` method returns where the mixed block starts in song 1, the mixed
+    block itself, and how many samples of song 2 it used. `render` places song
+    1 before the block and the rest of song 2 after it into one preallocated
+    float32 buffer. Input arrays are never modified. `span` says how much of
+    each song `window` reads, so the window can also be mixed from decoded
+    segments of the files (see segment_loader.transition_window).
+    """
+
+    name = None
+    output_peak = 0.95  # Peak level of the rendered output, None leaves the level alone
+
+    def __init__(self, transition_point_ratio=0.75):
+        self.transition_point_ratio = transition_point_ratio
+
+    def transition_point(self, x_1, fs):
+        """
+        Sample in song 1 where the transition happens.
+        """
+        return self.transition_sample(len(x_1), fs)
+
+    def transition_sample(self, length, fs):
+        """
+        Transition point of a song 1 that is `length` samples long, so it can
+        be placed without decoding the song.
+        """
+        return int(length * self.transition_point_ratio)
+
+    def span(self, fs):
+        """
+        Parts of the songs `window` reads.
+
+        Returns:
+        --------
+        tuple
+            (before, after, intro): samples of song 1 before and after the
+            transition point, and samples from the start of song 2
+        """
+        raise NotImplementedError
+
+    def input_gains(self, x_1, x_2):
+        """
+        Gains applied to song 1 and song 2, from the whole signals.
+        """
+        return self.track_gains(_stats(x_1), _stats(x_2))
+
+    def track_gains(self, stats_1, stats_2):
+        """
+        Gains applied to song 1 and song 2 from each song's (peak, rms) level
+        (peak normalization by default), so files can be measured block by
+        block instead of decoded whole (see segment_loader.track_stats).
+        """
+        return 1.0 / _nonzero(stats_1[0]), 1.0 / _nonzero(stats_2[0])
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        """
+        Mix the transition region.
+
+        Parameters:
+        -----------
+        x_1 : np.ndarray
+            First audio signal (mono)
+        x_2 : np.ndarray
+            Second audio signal (mono)
+        fs : int
+            Sampling rate
+        transition_point : int
+            Sample in x_1 where the transition happens
+        gain_1, gain_2 : float
+            Gains to apply to x_1 and x_2
+
+        Returns:
+        --------
+        tuple
+            (mix_start, mixed, consumed): sample in x_1 where the mixed block
+            starts, the float32 mixed block, and the number of samples of x_2
+            it contains
+        """
+        raise NotImplementedError
+
+    def render(self, x_1, x_2, fs):
+        """
+        Render song 1, the transition and song 2 into one signal.
+
+        Parameters:
+        -----------
+        x_1 : np.ndarray
+            First audio signal
+        x_2 : np.ndarray
+            Second audio signal
+        fs : int
+            Sampling rate of both signals
+
+        Returns:
+        --------
+        np.ndarray
+            The complete float32 audio signal with transition
+        """
+        x_1 = _as_mono(x_1)
+        x_2 = _as_mono(x_2)
+        gain_1, gain_2 = self.input_gains(x_1, x_2)
+        transition_point = self.transition_point(x_1, fs)
+        mix_start, mixed, consumed = self.window(x_1, x_2, fs, transition_point, gain_1, gain_2)
+
+        # The output peak is measured while each part is written, so normalising is one more pass
+        mix_end = mix_start + len(mixed)
+        output = np.empty(mix_end + max(len(x_2) - consumed, 0), dtype=np.float32)
+        level = mix_into(output[:mix_start], x_1[:mix_start], gain_1, accumulate=False)
+        level = max(level, mix_into(output[mix_start:mix_end], mixed, accumulate=False))
+        level = max(level, mix_into(output[mix_end:], x_2[consumed:], gain_2, accumulate=False))
+
+        if self.output_peak is not None and level > 0:
+            output *= self.output_peak / level
+        return output
+
+
+class CrossfadeTransition(Transition):
+    """
+    Plain linear crossfade, as in test.py's create_full_transition.
+
+    By default the crossfade covers the last `crossfade_duration` seconds of
+    song 1 and the levels are left untouched.
+    """
+
+    name = "crossfade"
+    output_peak = None
+
+    def __init__(self, crossfade_duration=1.0, transition_point_ratio=None):
+        super().__init__(transition_point_ratio)
+        self.crossfade_duration = crossfade_duration
+
+    def transition_sample(self, length, fs):
+        if self.transition_point_ratio is None:
+            transition_point = length - int(self.crossfade_duration * fs)
+            if transition_point < 0:
+                raise ValueError("First audio signal is too short for the specified crossfade duration.")
+            return transition_point
+        return super().transition_sample(length, fs)
+
+    def span(self, fs):
+        length = int(self.crossfade_duration * fs)
+        return 0, length, length
+
+    def input_gains(self, x_1, x_2):
+        return 1.0, 1.0
+
+    def track_gains(self, stats_1, stats_2):
+        return 1.0, 1.0
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        length = min(int(self.crossfade_duration * fs), len(x_1) - transition_point, len(x_2))
+        mixed = np.empty(length, dtype=np.float32)
+        mix_into(mixed, x_1[transition_point:transition_point + length], gain_1, ramp(length, False), accumulate=False)
+        mix_into(mixed, x_2[:length], gain_2, ramp(length, True))
+        return transition_point, mixed, length
+
+
+class ReverbTransition(Transition):
+    """
+    Song 1's last seconds ring out through a reverb tail while song 2 fades in.
+    """
+
+    name = "reverb"
+
+    def __init__(self, transition_duration=5.0, room_size=0.8, damping=0.4, decay=3.0, seed=0,
+                 transition_point_ratio=0.75):
+        super().__init__(transition_point_ratio)
+        self.transition_duration = transition_duration
+        self.room_size = room_size
+        self.damping = damping
+        self.decay = decay
+        self.seed = seed
+
+    def track_gains(self, stats_1, stats_2):
+        # Peak-normalize song 1 and match song 2's RMS to it
+        (peak_1, rms_1), (peak_2, rms_2) = stats_1, stats_2
+        gain_1 = 1.0 / _nonzero(peak_1)
+        gain_2 = gain_1 * rms_1 / rms_2 if rms_2 > 0 else 1.0 / _nonzero(peak_2)
+        return gain_1, gain_2
+
+    def span(self, fs):
+        # Song 2 plays under the segment and its reverb tail
+        before = int(self.transition_duration * fs)
+        return before, 0, before + int(self.decay * fs)
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        mix_start = max(transition_point - int(self.transition_duration * fs), 0)
+        segment = np.multiply(x_1[mix_start:transition_point], gain_1, dtype=np.float32)
+        reverb_tail = create_reverb_tail(segment, sr=fs, room_size=self.room_size,
+                                         damping=self.damping, decay=self.decay, seed=self.seed)
+
+        # Song 1 then silence, faded out together with its reverb tail
+        length = len(reverb_tail)
+        fade_out = ramp(length, False, 1.5)
+        mixed = np.empty(length, dtype=np.float32)
+        mix_into(mixed, reverb_tail, 0.85, fade_out, accumulate=False)
+        mix_into(mixed[:len(segment)], segment, 1.0, fade_out)
+
+        # Song 2 fades in across the same window
+        consumed = min(length, len(x_2))
+        mix_into(mixed[:consumed], x_2[:consumed], 0.95 * gain_2, ramp(length, True, 1.5))
+        return mix_start, mixed, consumed
+
+
+class ScratchCutTransition(Transition):
+    """
+    Song 1 fades out quickly, a disc scratch plays, then song 2 fades in.
+    """
+
+    name = "scratch"
+    output_peak = 1.0
+
+    def __init__(self, x_disc=None, disc_duration=3.0, fade_duration=0.1, transition_point_ratio=0.75):
+        super().__init__(transition_point_ratio)
+        self.x_disc = x_disc
+        self.disc_duration = disc_duration
+        self.fade_duration = fade_duration
+
+    def span(self, fs):
+        fade_samples = int(self.fade_duration * fs)
+        return fade_samples, 0, fade_samples
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        x_disc = self.x_disc if self.x_disc is not None else load_scratch_sample(fs, self.disc_duration)
+        x_disc = _as_mono(x_disc)[:int(fs * self.disc_duration)]
+
+        fade_samples = int(self.fade_duration * fs)
+        mix_start = max(transition_point - fade_samples, 0)
+        fade_out_length = transition_point - mix_start
+        consumed = min(fade_samples, len(x_2))
+
+        disc_end = fade_out_length + len(x_disc)
+        mixed = np.empty(disc_end + consumed, dtype=np.float32)
+        mix_into(mixed[:fade_out_length], x_1[mix_start:transition_point], gain_1,
+                 ramp(fade_samples, False, offset=fade_samples - fade_out_length), accumulate=False)
+        mix_into(mixed[fade_out_length:disc_end], x_disc, 1.0 / _peak(x_disc), accumulate=False)
+        mix_into(mixed[disc_end:], x_2[:consumed], gain_2, ramp(fade_samples, True), accumulate=False)
+        return mix_start, mixed, consumed
+
+
+class ScratchCrossfadeTransition(Transition):
+    """
+    Songs crossfade while a disc scratch plays over the overlap.
+    """
+
+    name = "scratch_crossfade"
+
+    def __init__(self, x_disc=None, overlap_duration=1.0, disc_level=0.8, transition_point_ratio=0.75):
+        super().__init__(transition_point_ratio)
+        self.x_disc = x_disc
+        self.overlap_duration = overlap_duration
+        self.disc_level = disc_level
+
+    def span(self, fs):
+        x_disc = self.x_disc if self.x_disc is not None else load_scratch_sample(fs)
+        overlap_samples = int(self.overlap_duration * fs)
+        return 0, overlap_samples, max(overlap_samples, int(overlap_samples * 0.3) + len(_as_mono(x_disc)))
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        x_disc = self.x_disc if self.x_disc is not None else load_scratch_sample(fs)
+        x_disc = _as_mono(x_disc)
+
+        overlap_samples = int(self.overlap_duration * fs)
+        disc_start = int(overlap_samples * 0.3)
+        disc_duration = len(x_disc)
+        length = max(overlap_samples, disc_start + disc_duration)
+        mixed = np.zeros(length, dtype=np.float32)
+
+        # Crossfade, cut short if song 1 ends first
+        actual_overlap = min(overlap_samples, len(x_1) - transition_point)
+        mix_into(mixed[:actual_overlap], x_1[transition_point:transition_point + actual_overlap], gain_1,
+                 ramp(overlap_samples, False, 1.5), accumulate=False)
+
+        consumed = min(length, len(x_2))
+        faded = min(actual_overlap, consumed)
+        mix_into(mixed[:faded], x_2[:faded], gain_2, ramp(overlap_samples, True, 1.5))
+        mix_into(mixed[faded:consumed], x_2[faded:consumed], gain_2)
+
+        # Disc scratch with a 10% fade in and out
+        if disc_duration > 0:
+            ramp_length = int(disc_duration * 0.1)
+            disc_gain = self.disc_level / _peak(x_disc)
+            disc = mixed[disc_start:disc_start + disc_duration]
+            middle = disc_duration - ramp_length
+            mix_into(disc[:ramp_length], x_disc[:ramp_length], disc_gain, ramp(ramp_length, True))
+            mix_into(disc[ramp_length:middle], x_disc[ramp_length:middle], disc_gain)
+            mix_into(disc[middle:], x_disc[middle:], disc_gain, ramp(ramp_length, False))
+
+        return transition_point, mixed, consumed
+
+
+class BeatMatchedTransition(Transition):
+    """
+    Crossfade between two downbeats with song 2 stretched to song 1's tempo.
+
+    The exit and entry points, the overlap and the stretch rate usually come
+    from transition_planner.plan_transition. Only the overlap of song 2 is
+    time-stretched; it continues at its own tempo afterwards.
+    """
+
+    name = "beatmatch"
+
+    def __init__(self, exit_time, entry_time=0.0, overlap_duration=8.0, rate=1.0):
+        super().__init__(None)
+        self.exit_time = exit_time
+        self.entry_time = entry_time
+        self.overlap_duration = overlap_duration
+        self.rate = rate
+
+    def transition_sample(self, length, fs):
+        return min(int(self.exit_time * fs), length)
+
+    def span(self, fs):
+        length = int(self.overlap_duration * fs)
+        return 0, length, int(self.entry_time * fs) + int(round(length * self.rate))
+
+    def window(self, x_1, x_2, fs, transition_point, gain_1=1.0, gain_2=1.0):
+        import librosa
+
+        entry = min(int(self.entry_time * fs), len(x_2))
+        length = min(int(self.overlap_duration * fs), len(x_1) - transition_point)
+        consumed = min(entry + int(round(length * self.rate)), len(x_2))
+        intro = np.asarray(x_2[entry:consumed], dtype=np.float32)
+        if self.rate != 1.0 and len(intro):
+            intro = librosa.effects.time_stretch(intro, rate=self.rate)
+        intro = librosa.util.fix_length(intro, size=length)
+
+        mixed = np.empty(length, dtype=np.float32)
+        mix_into(mixed, x_1[transition_point:transition_point + length], gain_1, ramp(length, False), accumulate=False)
+        mix_into(mixed, intro, gain_2, ramp(length, True))
+        return transition_point, mixed, consumed
+
+
+# Transition name -> strategy class
+TRANSITIONS = {
+    cls.name: cls
+    for cls in (CrossfadeTransition, ReverbTransition, ScratchCutTransition, ScratchCrossfadeTransition,
+                BeatMatchedTransition)
+}
+
+
+def get_transition(kind, **params):
+    """
+    Create a transition strategy by name.
+
+    Parameters:
+    -----------
+    kind : str
+        One of 'crossfade', 'reverb', 'scratch', 'scratch_crossfade' or 'beatmatch'
+    **params
+        Strategy settings (e.g. overlap_duration, transition_point_ratio)
+
+    Returns:
+    --------
+    Transition
+        The transition strategy
+    """
+    try:
+        cls = TRANSITIONS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown transition '{kind}', expected one of {sorted(TRANSITIONS)}") from None
+    return cls(**params)
+
+
+def render_transition(kind, x_1, x_2, fs, **params):
+    """
+    Render two songs joined by the named transition.
+
+    Parameters:
+    -----------
+    kind : str
+        Transition name, see get_transition
+    x_1 : np.ndarray
+        First audio signal
+    x_2 : np.ndarray
+        Second audio signal
+    fs : int
+        Sampling rate of both signals
+    **params
+        Strategy settings
+
+    Returns:
+    --------
+    np.ndarray
+        The complete float32 audio signal with transition
+    """
+    return get_transition(kind, **params).render(x_1, x_2, fs)